@@ -38,11 +38,24 @@ def create_app(config_name=None):
     
     # 注册错误处理器
     register_error_handlers(app)
+
+    # 设置存储与变更订阅
+    register_settings_store(app)
+
+    # Ollama 模型目录后台刷新
+    register_model_catalog(app)
+
+    # 课程文件热更新
+    register_knowledge_watcher(app)
+    register_course_versioning(app)
+
+    # 命令行命令
+    register_cli_commands(app)
     
     # 导入模型以确保它们被注册
     with app.app_context():
         # 注册User模型
-        from models.user import get_user_model
+        from models.user import get_user_model, UserPreference
         User = get_user_model()
 
         # 导入其他模型
@@ -63,6 +76,93 @@ def register_blueprints(app):
         app.logger.error(f"导入蓝图失败: {e}")
         raise
 
+def register_settings_store(app):
+    """配置进程级设置存储，并订阅设置变化（包括其他工作进程写入的变化）"""
+    from services.settings_service import SettingsStore, AI_SETTINGS_SAVED_KEY
+    store = SettingsStore()
+    # 首次启动（还没有设置文件）时以应用配置为准，避免环境变量中的 Ollama 地址和模型被内置默认值覆盖
+    store.configure(app.config.get('SETTINGS_REVALIDATE_INTERVAL'), defaults={
+        'ollama_api_url': app.config.get('OLLAMA_API_URL'),
+        'ollama_model': app.config.get('OLLAMA_MODEL'),
+    })
+
+    def on_ai_settings_changed(old, new):
+        # AI 客户端每次请求读取应用配置，同步后立即生效；
+        # 只应用在设置页面保存过的设置，否则以应用配置（环境变量）为准
+        if not new.get(AI_SETTINGS_SAVED_KEY):
+            return
+        keys = ('ollama_api_url', 'ollama_model', AI_SETTINGS_SAVED_KEY)
+        if [old.get(key) for key in keys] == [new.get(key) for key in keys]:
+            return
+        if new.get('ollama_api_url'):
+            app.config['OLLAMA_API_URL'] = new['ollama_api_url']
+        if new.get('ollama_model'):
+            app.config['OLLAMA_MODEL'] = new['ollama_model']
+        if app.config.get('MODEL_CATALOG_ENABLED', True):
+            from services.model_catalog import ModelCatalog
+            ModelCatalog().set_api_url(app.config['OLLAMA_API_URL'])
+
+    def on_course_changed(old, new):
+        if new.get('current_course') == old.get('current_course'):
+            return
+        if not app.config.get('COURSE_WARMUP_ENABLED', True):
+            return
+        from services.course_warmup import CourseWarmupService
+        with app.app_context():
+            CourseWarmupService().start(new['current_course'])
+
+    store.subscribe('ai_client', on_ai_settings_changed)
+    store.subscribe('course_warmup', on_course_changed)
+
+    # 订阅者只在设置变化时调用：新启动（或被回收后重启）的进程按设置页面保存过的设置初始化 AI 客户端配置
+    on_ai_settings_changed({}, store.get())
+
+def register_model_catalog(app):
+    """在每个进程处理第一个请求时启动模型目录刷新线程（兼容 gunicorn fork）"""
+    if not app.config.get('MODEL_CATALOG_ENABLED', True):
+        return
+
+    from services.model_catalog import ModelCatalog
+    catalog = ModelCatalog()
+
+    @app.before_request
+    def ensure_model_catalog():
+        catalog.ensure_started(app.config['OLLAMA_API_URL'], app.config.get('MODEL_CATALOG_INTERVAL'))
+
+def register_knowledge_watcher(app):
+    """在每个进程处理第一个请求时启动知识库文件监视线程（兼容 gunicorn fork）"""
+    if not app.config.get('KNOWLEDGE_WATCH_ENABLED', True):
+        return
+
+    from models.knowledge import KnowledgeBaseWatcher
+    watcher = KnowledgeBaseWatcher()
+
+    @app.before_request
+    def ensure_knowledge_watcher():
+        watcher.ensure_started(app.config.get('KNOWLEDGE_WATCH_INTERVAL'))
+
+def register_course_versioning(app):
+    """课程文件（重新）加载后与上一版本比较，按差异迁移或失效讲解缓存"""
+    if not app.config.get('COURSE_VERSIONING_ENABLED', True):
+        return
+
+    from models.knowledge import KnowledgeBaseCache
+
+    def on_knowledge_loaded(path, knowledge_base):
+        from services.course_versions import CourseVersionService
+        with app.app_context():
+            CourseVersionService().sync_file(path, knowledge_base)
+
+    KnowledgeBaseCache().add_listener('course_versioning', on_knowledge_loaded)
+
+def register_cli_commands(app):
+    """注册 flask 命令行命令"""
+    @app.cli.command('migrate-courses')
+    def migrate_courses():
+        """把工作目录下旧版本的 course_*.json 迁移到 data/courses"""
+        from models.course import migrate_legacy_course_files
+        print(f"已迁移 {migrate_legacy_course_files()} 个课程文件")
+
 def register_error_handlers(app):
     """注册错误处理器"""
     @app.errorhandler(404)
@@ -22,10 +22,60 @@ class Config:
     # Ollama API配置
     OLLAMA_API_URL = os.environ.get('OLLAMA_API_URL') or 'http://127.0.0.1:11434/api/chat'
     OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL') or 'qwen2.5:14b'
+    OLLAMA_EMBED_MODEL = os.environ.get('OLLAMA_EMBED_MODEL') or 'bge-m3'
+    # 备选模型（逗号分隔）：首选模型未加载而备选模型已加载时改用备选模型，避免冷启动
+    OLLAMA_FALLBACK_MODELS = [name.strip() for name in os.environ.get('OLLAMA_FALLBACK_MODELS', '').split(',')
+                              if name.strip()]
+
+    # Ollama 模型目录后台刷新（/api/tags 与 /api/ps，秒）
+    MODEL_CATALOG_ENABLED = True
+    MODEL_CATALOG_INTERVAL = 60.0
     
     # 数据文件路径
     KNOWLEDGE_BASE_FILE = 'kownlgebase.json'
     TEST_MODEL_FILE = 'testmodel.json'
+
+    # 课程文件热更新（每个 worker 的监视线程轮询间隔，秒）
+    KNOWLEDGE_WATCH_ENABLED = True
+    KNOWLEDGE_WATCH_INTERVAL = 1.0
+
+    # 重复概念共享讲解（跨课程共享会使用规范条目所属课程的讲解风格）
+    CONCEPT_DEDUP_ENABLED = True
+    CONCEPT_DEDUP_CROSS_COURSE = False
+
+    # 课程版本管理：课程文件变化时按差异迁移讲解缓存，并为新增知识点排队生成讲解
+    COURSE_VERSIONING_ENABLED = True
+    COURSE_REGENERATE_NEW_ITEMS = True
+
+    # 设置文件最多每隔多少秒检查一次变化（其他工作进程写入后据此重新加载）
+    SETTINGS_REVALIDATE_INTERVAL = 0.5
+
+    # 用户偏好（当前课程等）的进程内缓存时间（秒），其他工作进程的修改最迟在此时间后可见
+    USER_PREFERENCE_CACHE_TTL = 2.0
+
+    # 切换课程后在后台预热该课程的进程内缓存（最常访问的讲解数量）
+    COURSE_WARMUP_ENABLED = True
+    COURSE_WARMUP_EXPLANATIONS = 50
+
+    # 任务进度 SSE 推送：单次连接最长保持时间（需小于 gunicorn 超时，到时由浏览器自动重连）、
+    # 检查其他进程事件的间隔、保活注释间隔（秒）
+    SSE_MAX_DURATION = 55.0
+    SSE_POLL_INTERVAL = 1.0
+    SSE_KEEPALIVE_INTERVAL = 15.0
+
+    # 后台任务执行方式：'thread' 在 Web 进程的线程池中执行；'worker' 只入队，
+    # 由独立 worker 进程（python -m worker）领取执行
+    TASK_EXECUTION_MODE = os.environ.get('TASK_EXECUTION_MODE') or 'thread'
+    # worker 进程同时执行的任务数、队列为空时的轮询间隔、退出时等待执行中任务完成的最长时间（秒）
+    WORKER_CONCURRENCY = int(os.environ.get('WORKER_CONCURRENCY') or 2)
+    WORKER_POLL_INTERVAL = 1.0
+    WORKER_DRAIN_TIMEOUT = float(os.environ.get('WORKER_DRAIN_TIMEOUT') or 300)
+    # 任务存储中已结束任务的数量上限与结果（汇总与明细）总字节数上限，超出时提前删除最早结束的任务
+    TASK_MAX_FINISHED = 500
+    TASK_RESULT_MAX_BYTES = 20 * 1024 * 1024
+    # 用户提交任务的上限：等待执行的任务总数、每个用户未结束的任务数；超出时返回 429 并给出 Retry-After
+    TASK_QUEUE_MAX = int(os.environ.get('TASK_QUEUE_MAX') or 50)
+    TASK_QUEUE_MAX_PER_USER = int(os.environ.get('TASK_QUEUE_MAX_PER_USER') or 5)
     
     # 会话配置
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
@@ -53,6 +103,9 @@ class TestingConfig(Config):
     """测试环境配置"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    KNOWLEDGE_WATCH_ENABLED = False
+    COURSE_REGENERATE_NEW_ITEMS = False
+    MODEL_CATALOG_ENABLED = False
     WTF_CSRF_ENABLED = False
 
 # 配置字典
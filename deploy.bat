@@ -58,6 +58,7 @@ echo.
 echo [4/6] Creating necessary directories...
 if not exist "data" mkdir data
 if not exist "data\explanations" mkdir data\explanations
+if not exist "data\courses" mkdir data\courses
 if not exist "static\uploads" mkdir static\uploads
 if not exist "logs" mkdir logs
 
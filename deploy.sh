@@ -47,6 +47,7 @@ echo "✅ 依赖安装完成"
 # 创建必要的目录
 echo "📁 创建必要的目录..."
 mkdir -p data/explanations
+mkdir -p data/courses
 mkdir -p static/uploads
 mkdir -p logs
 
@@ -60,6 +61,8 @@ app = create_app()
 with app.app_context():
     db.create_all()
     print('数据库初始化完成')
+    from models.course import migrate_legacy_course_files
+    print(f'已迁移 {migrate_legacy_course_files()} 个课程文件到 data/courses')
 "
 
 echo "✅ 数据库初始化完成"
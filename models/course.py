@@ -3,18 +3,28 @@
 """
 import os
 import json
-import glob
+import time
+import shutil
+import threading
 from datetime import datetime, timezone
 from flask import current_app
 
+DEFAULT_COURSE_NAME = '数据库原理'
+DEFAULT_COURSE_FILE = 'kownlgebase.json'
+# 课程文件放在 data 目录下，Web 服务与独立 worker 进程（容器）共享同一份课程文件
+COURSES_DIR = 'data/courses'
+
 class Course:
     """课程模型"""
     
-    def __init__(self, name=None, description=None, filename=None, created_at=None):
+    def __init__(self, name=None, description=None, filename=None, created_at=None,
+                 chapter_count=None, concept_count=None):
         self.name = name
         self.description = description
         self.filename = filename
         self.created_at = created_at or datetime.now(timezone.utc)
+        self.chapter_count = chapter_count
+        self.concept_count = concept_count
     
     def __repr__(self):
         return f'<Course {self.name}>'
@@ -25,58 +35,46 @@ class Course:
             'name': self.name,
             'description': self.description,
             'filename': self.filename,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'chapter_count': self.chapter_count,
+            'concept_count': self.concept_count
         }
+
+    @staticmethod
+    def from_manifest_entry(entry):
+        """由课程清单条目创建课程对象"""
+        return Course(
+            name=entry['name'],
+            description=entry['description'],
+            filename=entry['file'],
+            created_at=datetime.fromtimestamp(entry['mtime_ns'] / 1e9, timezone.utc),
+            chapter_count=entry['chapter_count'],
+            concept_count=entry['concept_count']
+        )
     
     @staticmethod
     def get_all_courses():
         """获取所有课程"""
-        courses = []
-        
-        # 添加默认的数据库课程
-        if os.path.exists('kownlgebase.json'):
-            courses.append(Course(
-                name='数据库原理',
-                description='数据库系统基础理论与应用',
-                filename='kownlgebase.json',
-                created_at=datetime.now(timezone.utc)
-            ))
-        
-        # 扫描其他课程文件
-        course_files = glob.glob('course_*.json')
-        for file_path in course_files:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    course_name = data.get('科目', os.path.basename(file_path).replace('course_', '').replace('.json', ''))
-                    courses.append(Course(
-                        name=course_name,
-                        description=f'{course_name}课程',
-                        filename=file_path,
-                        created_at=datetime.now(timezone.utc)
-                    ))
-            except Exception as e:
-                print(f"加载课程文件 {file_path} 失败: {e}")
-                continue
-        
-        return courses
+        return [Course.from_manifest_entry(entry) for entry in CourseRegistry().list_entries()]
     
     @staticmethod
     def get_course_by_name(name):
         """根据名称获取课程"""
-        courses = Course.get_all_courses()
-        for course in courses:
-            if course.name == name:
-                return course
-        return None
+        entry = CourseRegistry().get_entry(name)
+        return Course.from_manifest_entry(entry) if entry else None
     
+    @staticmethod
+    def get_course_filename(name):
+        """根据课程名称生成课程文件路径（位于 COURSES_DIR）"""
+        safe_name = name.replace(' ', '_').replace('/', '_').replace('\\', '_')
+        return os.path.join(COURSES_DIR, f'course_{safe_name}.json')
+
     @staticmethod
     def create_course(name, description, knowledge_data):
         """创建新课程"""
         try:
             # 生成文件名
-            safe_name = name.replace(' ', '_').replace('/', '_').replace('\\', '_')
-            filename = f'course_{safe_name}.json'
+            filename = Course.get_course_filename(name)
             
             # 确保知识库数据格式正确
             if not isinstance(knowledge_data, dict) or '科目' not in knowledge_data:
@@ -85,9 +83,14 @@ class Course:
                     '章节': knowledge_data.get('章节', {}) if isinstance(knowledge_data, dict) else {}
                 }
             
-            # 保存到文件
-            with open(filename, 'w', encoding='utf-8') as f:
+            # 先写临时文件再替换，其他进程不会读到写了一半的课程文件
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            temp_file = f"{filename}.{os.getpid()}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
                 json.dump(knowledge_data, f, ensure_ascii=False, indent=2)
+            os.replace(temp_file, filename)
+
+            CourseRegistry().refresh(force=True)
             
             return Course(
                 name=name,
@@ -103,7 +106,7 @@ class Course:
         """删除课程"""
         try:
             # 不允许删除默认的数据库课程
-            if name == '数据库原理':
+            if name == DEFAULT_COURSE_NAME:
                 raise Exception("不能删除默认的数据库原理课程")
             
             course = Course.get_course_by_name(name)
@@ -111,9 +114,10 @@ class Course:
                 raise Exception("课程不存在")
             
             # 删除文件
-            if course.filename and course.filename != 'kownlgebase.json':
+            if course.filename and course.filename != DEFAULT_COURSE_FILE:
                 if os.path.exists(course.filename):
                     os.remove(course.filename)
+                    CourseRegistry().refresh(force=True)
                     return True
             
             return False
@@ -136,8 +140,234 @@ class Course:
     def get_default_course():
         """获取默认课程"""
         return Course(
-            name='数据库原理',
+            name=DEFAULT_COURSE_NAME,
             description='数据库系统基础理论与应用',
-            filename='kownlgebase.json',
+            filename=DEFAULT_COURSE_FILE,
             created_at=datetime.now(timezone.utc)
         )
+
+
+class CourseRegistry:
+    """课程注册表（进程级单例）
+
+    维护一份课程清单（名称、文件、大小、mtime、章节/概念数量），持久化到
+    data/course_manifest.json。刷新时只对课程文件做 stat，只有新增或变化的
+    文件才会被解析，名称查找为 O(1)。
+
+    课程文件位于 COURSES_DIR；旧版本放在工作目录下的 course_*.json 需要通过
+    migrate_legacy_course_files 显式迁移（flask migrate-courses）。
+    """
+
+    MANIFEST_FILE = 'data/course_manifest.json'
+    SCAN_INTERVAL = 1.0  # 两次目录扫描的最小间隔（秒）
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(CourseRegistry, cls).__new__(cls)
+                cls._instance._initialized = False
+            return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.entries = {}   # {文件名: 清单条目}
+        self.by_name = {}   # {课程名称: 清单条目}
+        self.ordered = []   # 课程列表顺序（默认课程在前）
+        self._last_scan = 0.0
+        self._refresh_lock = threading.Lock()
+        self._load_manifest()
+        self._initialized = True
+
+    def list_entries(self):
+        """获取所有课程的清单条目"""
+        self.refresh()
+        return list(self.ordered)
+
+    def get_entry(self, name):
+        """根据课程名称获取清单条目"""
+        self.refresh()
+        return self.by_name.get(name)
+
+    def refresh(self, force=False):
+        """按 stat 信息增量刷新课程清单"""
+        if not force and time.monotonic() - self._last_scan < self.SCAN_INTERVAL:
+            return
+
+        with self._refresh_lock:
+            if not force and time.monotonic() - self._last_scan < self.SCAN_INTERVAL:
+                return
+
+            entries = {}
+            changed = False
+            for filename in self._scan_course_files():
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    continue
+
+                entry = self.entries.get(filename)
+                if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                    entries[filename] = entry
+                    continue
+
+                new_entry = self._build_entry(filename, stat)
+                if new_entry:
+                    entries[filename] = new_entry
+                    changed = True
+                elif entry:
+                    # 文件正在写入或内容无效：保留旧条目，等待下次扫描
+                    entries[filename] = entry
+
+            if changed or entries.keys() != self.entries.keys():
+                self._apply(entries)
+                self._save_manifest()
+
+            self._last_scan = time.monotonic()
+
+    @staticmethod
+    def _list_course_files(directory):
+        """列出目录下的 course_*.json 文件名（目录不存在时为空）"""
+        try:
+            with os.scandir(directory) as it:
+                return sorted(
+                    entry.name for entry in it
+                    if entry.name.startswith('course_') and entry.name.endswith('.json') and entry.is_file()
+                )
+        except FileNotFoundError:
+            return []
+
+    def _scan_course_files(self):
+        """列出课程文件（默认课程 + COURSES_DIR 下的 course_*.json）"""
+        files = [DEFAULT_COURSE_FILE] if os.path.exists(DEFAULT_COURSE_FILE) else []
+        files.extend(os.path.join(COURSES_DIR, name) for name in self._list_course_files(COURSES_DIR))
+        return files
+
+    def _build_entry(self, filename, stat):
+        """解析课程文件生成清单条目"""
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"加载课程文件 {filename} 失败: {e}")
+            return None
+
+        if not isinstance(data, dict):
+            print(f"课程文件 {filename} 格式无效（顶层不是对象），已跳过")
+            return None
+
+        if filename == DEFAULT_COURSE_FILE:
+            name = DEFAULT_COURSE_NAME
+            description = '数据库系统基础理论与应用'
+        else:
+            name = data.get('科目', os.path.basename(filename).replace('course_', '').replace('.json', ''))
+            description = f'{name}课程'
+
+        chapters = data.get('章节')
+        if not isinstance(chapters, dict):
+            chapters = {}
+        concept_count = 0
+        for chapter_data in chapters.values():
+            if isinstance(chapter_data, dict):
+                concept_count += len(chapter_data.get('mainConcepts', []))
+                concept_count += len(chapter_data.get('mainContents', []))
+
+        return {
+            'name': name,
+            'description': description,
+            'file': filename,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'chapter_count': len(chapters),
+            'concept_count': concept_count
+        }
+
+    def register(self, filename, name, chapter_count, concept_count):
+        """登记刚写入的课程文件（写入方已统计章节/知识点数量，无需重新解析）"""
+        stat = os.stat(filename)
+        entry = {
+            'name': name,
+            'description': f'{name}课程' if filename != DEFAULT_COURSE_FILE else '数据库系统基础理论与应用',
+            'file': filename,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'chapter_count': chapter_count,
+            'concept_count': concept_count
+        }
+        with self._refresh_lock:
+            entries = dict(self.entries)
+            entries[filename] = entry
+            # 与目录扫描顺序一致：默认课程在前，其余按文件名排序
+            self._apply({key: entries[key] for key in sorted(entries, key=lambda key: (key != DEFAULT_COURSE_FILE, key))})
+            self._save_manifest()
+        return entry
+
+    def _apply(self, entries):
+        """原子替换内存中的清单"""
+        ordered = list(entries.values())
+        by_name = {}
+        for entry in ordered:
+            # 同名课程以先出现的为准（与原先的线性查找一致）
+            by_name.setdefault(entry['name'], entry)
+
+        self.entries = entries
+        self.ordered = ordered
+        self.by_name = by_name
+
+    def _load_manifest(self):
+        """加载持久化的清单，未变化的文件无需重新解析"""
+        try:
+            with open(self.MANIFEST_FILE, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            self._apply({entry['file']: entry for entry in manifest.get('courses', [])})
+        except (OSError, ValueError, KeyError, TypeError):
+            self._apply({})
+
+    def _save_manifest(self):
+        """持久化清单"""
+        try:
+            os.makedirs(os.path.dirname(self.MANIFEST_FILE), exist_ok=True)
+            temp_file = f"{self.MANIFEST_FILE}.{os.getpid()}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'updated_at': datetime.now(timezone.utc).isoformat(),
+                    'courses': self.ordered
+                }, f, ensure_ascii=False, indent=2)
+            os.replace(temp_file, self.MANIFEST_FILE)
+        except OSError as e:
+            print(f"保存课程清单失败: {e}")
+
+
+def migrate_legacy_course_files(source_dir='.'):
+    """把旧版本放在 source_dir 下的 course_*.json 迁移到 COURSES_DIR，返回迁移的文件数（需要应用上下文）
+
+    只应在部署/启动时显式执行一次（flask migrate-courses、run.py 或 worker --migrate-courses），
+    不要在每个工作进程中执行。目标文件已存在时保留目标文件，旧文件不动。
+    source_dir 与 COURSES_DIR 可能在不同的文件系统上（如容器挂载的数据卷），
+    因此先复制到临时文件再原子替换，最后删除旧文件。
+    """
+    migrated = 0
+    for name in CourseRegistry._list_course_files(source_dir):
+        source = os.path.join(source_dir, name)
+        target = os.path.join(COURSES_DIR, name)
+        if os.path.exists(target):
+            current_app.logger.warning(f"课程文件 {target} 已存在，未迁移 {source}")
+            continue
+        try:
+            os.makedirs(COURSES_DIR, exist_ok=True)
+            temp_file = f"{target}.{os.getpid()}.tmp"
+            shutil.copy2(source, temp_file)
+            os.replace(temp_file, target)
+            os.remove(source)
+            migrated += 1
+            current_app.logger.info(f"已迁移课程文件 {source} -> {target}")
+        except OSError as e:
+            current_app.logger.error(f"迁移课程文件 {source} 失败: {e}")
+
+    if migrated:
+        CourseRegistry().refresh(force=True)
+    return migrated
@@ -1,11 +1,33 @@
 """
 考试模型
 """
+import os
 import json
 import uuid
+import threading
 from datetime import datetime, timezone
 from flask import current_app
 
+# 已解析的考试配置 {文件路径: ((mtime_ns, size), 配置)}，文件变化后重新解析
+_config_cache = {}
+_config_lock = threading.Lock()
+
+
+def _load_config_file(file_path):
+    """读取并缓存考试配置文件"""
+    st = os.stat(file_path)
+    stat = (st.st_mtime_ns, st.st_size)
+    cached = _config_cache.get(file_path)
+    if cached is not None and cached[0] == stat:
+        return cached[1], True
+
+    with _config_lock:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            config_data = json.load(f)
+        _config_cache[file_path] = (stat, config_data)
+    return config_data, False
+
+
 class ExamModel:
     """考试模型管理类"""
     
@@ -23,8 +45,12 @@ class ExamModel:
                 # 应用上下文不可用时使用默认路径
                 file_path = 'testmodel.json'
 
-            with open(file_path, 'r', encoding='utf-8') as f:
-                self.config_data = json.load(f)
+            try:
+                self.config_data, cached = _load_config_file(file_path)
+            except OSError:
+                raise FileNotFoundError(file_path)
+            if cached:
+                return
 
             # 安全地记录日志
             try:
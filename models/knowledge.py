@@ -3,14 +3,133 @@
 """
 import json
 import os
+import sys
+import time
+import threading
+from types import MappingProxyType
 from flask import current_app
 
+DEFAULT_SUBJECT = "数据库原理"
+
+
+def _freeze(value):
+    """将解析出的JSON转换为只读结构，便于在线程间共享"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _intern(value):
+    """驻留字符串，多门课程及重复加载之间共享同一个对象"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def validate_knowledge_data(data):
+    """校验知识库结构：{"科目": str, "章节": {章节名: {"mainConcepts": [...], "mainContents": [...]}}}"""
+    if not isinstance(data, dict) or '科目' not in data or '章节' not in data:
+        return False
+
+    chapters = data['章节']
+    if not isinstance(chapters, dict):
+        return False
+
+    for chapter_data in chapters.values():
+        if not isinstance(chapter_data, dict):
+            return False
+        if 'mainConcepts' not in chapter_data or 'mainContents' not in chapter_data:
+            return False
+        if not isinstance(chapter_data['mainConcepts'], list) or \
+           not isinstance(chapter_data['mainContents'], list):
+            return False
+
+    return True
+
+
+class ChapterRecord:
+    """章节记录：概念与内容以驻留字符串元组保存，知识点字典列表首次访问时构建后复用"""
+
+    __slots__ = ('name', 'concepts', 'contents', 'extra', '_item_dicts')
+
+    def __init__(self, name, chapter_data):
+        self.name = _intern(name)
+        self.concepts = tuple(_intern(text) for text in chapter_data.get('mainConcepts', ()))
+        self.contents = tuple(_intern(text) for text in chapter_data.get('mainContents', ()))
+        # 除 mainConcepts/mainContents 外的字段原样保留（通常为空）
+        extra = {key: value for key, value in chapter_data.items()
+                 if key not in ('mainConcepts', 'mainContents')}
+        self.extra = _freeze(extra) if extra else None
+        self._item_dicts = None
+
+    def to_dict(self):
+        data = dict(self.extra) if self.extra else {}
+        data['mainConcepts'] = list(self.concepts)
+        data['mainContents'] = list(self.contents)
+        return data
+
+    def item_dicts(self):
+        """知识点字典列表（概念在前，内容在后），返回共享的只读元组，调用方不得修改其中的字典"""
+        if self._item_dicts is None:
+            self._item_dicts = tuple(
+                [{'type': 'concept', 'text': text} for text in self.concepts] +
+                [{'type': 'content', 'text': text} for text in self.contents]
+            )
+        return self._item_dicts
+
+
 class KnowledgeBase:
-    """知识库管理类"""
-    
-    def __init__(self):
-        self.data = None
-        self.load_from_json()
+    """知识库管理类
+
+    加载后只保留紧凑的只读结构（驻留字符串、__slots__ 章节记录、预计算的章节列表），
+    不再保存 json.load 得到的原始嵌套字典；查询方法返回共享的元组，调用方不应修改。
+    """
+
+    __slots__ = ('file_path', 'version', 'subject', 'chapters', 'chapter_names', '_concept_chapters')
+
+    def __init__(self, data=None, file_path=None, version=None):
+        self.file_path = file_path
+        self.version = version
+        if data is None:
+            self.load_from_json()
+        else:
+            self._build(data)
+
+    @classmethod
+    def from_file(cls, file_path, version=None):
+        """从指定文件加载知识库，解析失败时抛出异常"""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data=data, file_path=file_path, version=version)
+
+    def _build(self, data):
+        """由原始JSON数据构建紧凑结构"""
+        self.subject = _intern(data.get("科目", DEFAULT_SUBJECT))
+        self.chapters = {}
+        for chapter_name, chapter_data in data.get("章节", {}).items():
+            record = ChapterRecord(chapter_name, chapter_data)
+            self.chapters[record.name] = record
+        self.chapter_names = tuple(self.chapters)
+        self._concept_chapters = None
+
+    @property
+    def version_tag(self):
+        """供客户端做缓存校验的版本号（文件 mtime_ns-大小，各进程一致）"""
+        if isinstance(self.version, tuple):
+            return f"{self.version[0]}-{self.version[1]}"
+        return str(self.version or 0)
+
+    @property
+    def data(self):
+        """原始结构的只读视图（按需重建，兼容旧代码）"""
+        return _freeze(self.to_dict())
+
+    def to_dict(self):
+        """导出为与课程JSON文件相同结构的字典"""
+        return {
+            "科目": self.subject,
+            "章节": {name: record.to_dict() for name, record in self.chapters.items()}
+        }
     
     def load_from_json(self):
         """从JSON文件加载知识库"""
@@ -23,7 +142,8 @@ class KnowledgeBase:
                 file_path = 'kownlgebase.json'
 
             with open(file_path, 'r', encoding='utf-8') as f:
-                self.data = json.load(f)
+                self._build(json.load(f))
+            self.file_path = file_path
 
             # 安全地记录日志
             try:
@@ -36,86 +156,349 @@ class KnowledgeBase:
                 current_app.logger.error(f"知识库文件未找到: {file_path}")
             except (RuntimeError, NameError):
                 print(f"知识库文件未找到: kownlgebase.json")
-            self.data = {"科目": "数据库原理", "章节": {}}
+            self._build({"科目": DEFAULT_SUBJECT, "章节": {}})
         except json.JSONDecodeError as e:
             try:
                 current_app.logger.error(f"知识库JSON解析错误: {e}")
             except RuntimeError:
                 print(f"知识库JSON解析错误: {e}")
-            self.data = {"科目": "数据库原理", "章节": {}}
+            self._build({"科目": DEFAULT_SUBJECT, "章节": {}})
     
     def get_subject(self):
         """获取科目名称"""
-        return self.data.get("科目", "数据库原理")
+        return self.subject
     
     def get_chapters(self):
         """获取所有章节"""
-        chapters = self.data.get("章节", {})
-        return list(chapters.keys())
+        return self.chapter_names
     
     def get_chapter_data(self, chapter_name):
         """获取指定章节的完整数据"""
-        chapters = self.data.get("章节", {})
-        return chapters.get(chapter_name, {})
+        record = self.chapters.get(chapter_name)
+        return record.to_dict() if record else {}
     
     def get_concepts(self, chapter_name):
         """获取章节的主要概念"""
-        chapter_data = self.get_chapter_data(chapter_name)
-        return chapter_data.get("mainConcepts", [])
+        record = self.chapters.get(chapter_name)
+        return record.concepts if record else ()
     
     def get_contents(self, chapter_name):
         """获取章节的主要内容"""
-        chapter_data = self.get_chapter_data(chapter_name)
-        return chapter_data.get("mainContents", [])
+        record = self.chapters.get(chapter_name)
+        return record.contents if record else ()
+
+    def get_concept_chapters(self, text):
+        """获取包含指定概念/内容的章节（映射首次调用时构建）"""
+        if self._concept_chapters is None:
+            # 绝大多数知识点只属于一个章节，值直接保存章节名，出现在多个章节时才用元组
+            concept_chapters = {}
+            for record in self.chapters.values():
+                for item_text in record.concepts + record.contents:
+                    existing = concept_chapters.get(item_text)
+                    if existing is None:
+                        concept_chapters[item_text] = record.name
+                    elif isinstance(existing, str):
+                        if existing != record.name:
+                            concept_chapters[item_text] = (existing, record.name)
+                    elif record.name not in existing:
+                        concept_chapters[item_text] = existing + (record.name,)
+            self._concept_chapters = concept_chapters
+
+        chapters = self._concept_chapters.get(text, ())
+        return (chapters,) if isinstance(chapters, str) else chapters
+
+    def has_chapter(self, chapter_name):
+        """判断章节是否存在"""
+        return chapter_name in self.chapters
     
     def search_knowledge(self, keyword):
         """搜索知识点"""
         results = []
-        chapters = self.data.get("章节", {})
-        
-        for chapter_name, chapter_data in chapters.items():
-            # 搜索概念
-            concepts = chapter_data.get("mainConcepts", [])
-            for concept in concepts:
-                if keyword.lower() in concept.lower():
-                    results.append({
-                        'type': 'concept',
-                        'chapter': chapter_name,
-                        'content': concept
-                    })
-            
-            # 搜索内容
-            contents = chapter_data.get("mainContents", [])
-            for content in contents:
-                if keyword.lower() in content.lower():
-                    results.append({
-                        'type': 'content',
-                        'chapter': chapter_name,
-                        'content': content
-                    })
+        keyword = keyword.lower()
+
+        for record in self.chapters.values():
+            for item_type, texts in (('concept', record.concepts), ('content', record.contents)):
+                for text in texts:
+                    if keyword in text.lower():
+                        results.append({
+                            'type': item_type,
+                            'chapter': record.name,
+                            'content': text
+                        })
         
         return results
     
     def get_all_concepts_and_contents(self, chapter_name):
-        """获取章节的所有概念和内容"""
-        concepts = self.get_concepts(chapter_name)
-        contents = self.get_contents(chapter_name)
-        
-        items = []
-        for concept in concepts:
-            items.append({'type': 'concept', 'text': concept})
-        for content in contents:
-            items.append({'type': 'content', 'text': content})
-        
-        return items
+        """获取章节的所有概念和内容（共享元组，需要修改时调用方自行复制）"""
+        record = self.chapters.get(chapter_name)
+        return record.item_dicts() if record else ()
 
     def get_chapter_content(self, chapter_name):
         """获取章节内容（用于批量生成）"""
-        chapter_data = self.get_chapter_data(chapter_name)
-        if not chapter_data:
+        record = self.chapters.get(chapter_name)
+        if not record:
             return None
 
         return {
-            'mainConcepts': chapter_data.get('mainConcepts', []),
-            'mainContents': chapter_data.get('mainContents', [])
+            'mainConcepts': list(record.concepts),
+            'mainContents': list(record.contents)
+        }
+
+
+class KnowledgeBaseCache:
+    """进程级知识库缓存，按 (路径, mtime, 大小) 判断文件是否变化
+
+    缓存中的 KnowledgeBase 为只读对象，可被多个请求线程共享。
+    文件监视线程运行时，已缓存的知识库不再在请求中检查和重新解析，
+    而是由监视线程解析、校验新版本后原子替换。
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(KnowledgeBaseCache, cls).__new__(cls)
+                cls._instance._initialized = False
+            return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.entries = {}  # {绝对路径: ((mtime_ns, size), KnowledgeBase)}
+        self.version = 0   # 任意课程文件重新加载后递增，供派生缓存判断是否需要重建
+        self.watching = False  # 文件监视线程是否在运行
+        self.listeners = {}    # {名称: listener(绝对路径, KnowledgeBase)}，文件（重新）加载后调用
+        self._entries_lock = threading.Lock()
+        self._path_locks = {}
+        self.metrics = {
+            'hits': 0,
+            'misses': 0,
+            'loads': 0,
+            'load_errors': 0,
+            'load_time_ms_total': 0.0,
+            'last_load_ms': 0.0,
+            'reloads': 0,
+            'reload_errors': 0,
+            'last_reload_error': None
         }
+        self._initialized = True
+
+    def get(self, file_path):
+        """获取知识库；文件未变化时直接返回缓存实例"""
+        path = os.path.abspath(file_path)
+
+        if self.watching:
+            # 变化由监视线程处理，请求路径上不做 stat
+            entry = self.entries.get(path)
+            if entry:
+                self.metrics['hits'] += 1
+                return entry[1]
+
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+
+        entry = self.entries.get(path)
+        if entry and entry[0] == key:
+            self.metrics['hits'] += 1
+            return entry[1]
+
+        # 同一文件只由一个线程解析，其余线程等待结果
+        with self._get_path_lock(path):
+            entry = self.entries.get(path)
+            if entry and entry[0] == key:
+                self.metrics['hits'] += 1
+                return entry[1]
+
+            self.metrics['misses'] += 1
+            try:
+                knowledge_base = self._load(path, key)
+            except Exception:
+                self.metrics['load_errors'] += 1
+                raise
+
+        self._notify(path, knowledge_base)
+        return knowledge_base
+
+    def add_listener(self, name, listener):
+        """注册文件加载回调（在加载线程中、释放文件锁后调用），同名回调会被替换"""
+        self.listeners[name] = listener
+
+    def _notify(self, path, knowledge_base):
+        for listener in list(self.listeners.values()):
+            try:
+                listener(path, knowledge_base)
+            except Exception as e:
+                _log('error', f"知识库加载回调失败: {path}: {e}")
+
+    def reload(self, file_path, key):
+        """解析并校验文件的新版本，成功后原子替换缓存；失败时保留旧版本
+
+        返回是否替换成功。解析期间文件再次变化时放弃本次结果，等待下次检查。
+        """
+        path = os.path.abspath(file_path)
+        with self._get_path_lock(path):
+            try:
+                knowledge_base = self._load(path, key)
+            except Exception as e:
+                self.metrics['reload_errors'] += 1
+                self.metrics['last_reload_error'] = f"{os.path.basename(path)}: {e}"
+                _log('error', f"知识库重新加载失败，继续使用旧版本: {path}: {e}")
+                return False
+
+            self.metrics['reloads'] += 1
+            _log('info', f"知识库已热更新: {path} (版本 {knowledge_base.version_tag})")
+
+        self._notify(path, knowledge_base)
+        return True
+
+    def _load(self, path, key):
+        """读取、校验并构建知识库，写入缓存"""
+        start = time.perf_counter()
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not validate_knowledge_data(data):
+            raise ValueError("知识库结构无效")
+
+        stat = os.stat(path)
+        if (stat.st_mtime_ns, stat.st_size) != key:
+            raise ValueError("文件在读取期间被修改")
+
+        knowledge_base = KnowledgeBase(data=data, file_path=path, version=key)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._entries_lock:
+            self.entries[path] = (key, knowledge_base)
+            self.version += 1
+            self.metrics['loads'] += 1
+            self.metrics['load_time_ms_total'] += elapsed_ms
+            self.metrics['last_load_ms'] = elapsed_ms
+
+        _log('info', f"知识库已加载: {path} ({elapsed_ms:.1f}ms)")
+        return knowledge_base
+
+    def cached_keys(self):
+        """已缓存文件的 {绝对路径: (mtime_ns, size)}"""
+        with self._entries_lock:
+            return {path: entry[0] for path, entry in self.entries.items()}
+
+    def invalidate(self, file_path=None):
+        """使指定文件（或全部）的缓存失效"""
+        with self._entries_lock:
+            if file_path is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(os.path.abspath(file_path), None)
+            self.version += 1
+
+    def stats(self):
+        """获取缓存统计信息"""
+        stats = dict(self.metrics)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['entries'] = len(self.entries)
+        stats['version'] = self.version
+        stats['watching'] = self.watching
+        stats['load_time_ms_total'] = round(stats['load_time_ms_total'], 2)
+        stats['last_load_ms'] = round(stats['last_load_ms'], 2)
+        return stats
+
+    def _get_path_lock(self, path):
+        with self._entries_lock:
+            lock = self._path_locks.get(path)
+            if lock is None:
+                lock = self._path_locks[path] = threading.Lock()
+            return lock
+
+
+class KnowledgeBaseWatcher:
+    """知识库文件监视线程（每个进程一个）
+
+    定期对已缓存的课程文件做 stat，发现变化后等待文件稳定（连续两次检查 stat 相同），
+    再由 KnowledgeBaseCache.reload 在后台解析、校验并替换。gunicorn 的每个 worker
+    各自运行监视线程，通过共享的文件系统得知变化，各进程计算出的版本号一致。
+    """
+
+    POLL_INTERVAL = 1.0
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(KnowledgeBaseWatcher, cls).__new__(cls)
+                cls._instance._initialized = False
+            return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.cache = KnowledgeBaseCache()
+        self.interval = self.POLL_INTERVAL
+        self.thread = None
+        self._pid = None
+        self._pending = {}  # {路径: 最近一次观察到的新 stat}
+        self._failed = {}   # {路径: 校验失败的 stat}，文件再次变化前不重复解析
+        self._initialized = True
+
+    def ensure_started(self, interval=None):
+        """启动监视线程；fork 后的子进程中会重新启动"""
+        if self.thread is not None and self.thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self.thread is not None and self.thread.is_alive() and self._pid == os.getpid():
+                return
+            if interval:
+                self.interval = interval
+            self._pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name='knowledge-watcher', daemon=True)
+            self.thread.start()
+            self.cache.watching = True
+
+    def _run(self):
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                print(f"知识库文件监视出错: {e}")
+            time.sleep(self.interval)
+
+    def check(self):
+        """检查一轮已缓存的文件"""
+        for path, cached_key in self.cache.cached_keys().items():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # 文件被删除：移出缓存，下次访问按常规路径处理
+                self.cache.invalidate(path)
+                self._pending.pop(path, None)
+                continue
+            except OSError:
+                continue
+
+            key = (stat.st_mtime_ns, stat.st_size)
+            if key == cached_key or key == self._failed.get(path):
+                self._pending.pop(path, None)
+                continue
+
+            if self._pending.get(path) != key:
+                # 首次观察到变化，等下一轮确认文件已写完
+                self._pending[path] = key
+                continue
+
+            self._pending.pop(path, None)
+            if self.cache.reload(path, key):
+                self._failed.pop(path, None)
+            else:
+                self._failed[path] = key
+
+
+def _log(level, message):
+    """在应用上下文中写日志，否则打印"""
+    try:
+        getattr(current_app.logger, level)(message)
+    except RuntimeError:
+        print(message)
@@ -52,6 +52,29 @@ class User(db.Model):
             # 不返回临时对象,而是抛出异常让调用者处理
             raise
 
+class UserPreference(db.Model):
+    """用户偏好（每个用户每个键一行，值为 JSON）"""
+    __tablename__ = 'user_preferences'
+    __table_args__ = (db.UniqueConstraint('user_id', 'key', name='uq_user_preference_key'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    key = db.Column(db.String(50), nullable=False)
+    value = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<UserPreference {self.user_id}: {self.key}>'
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'key': self.key,
+            'value': self.value,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
 def get_user_model():
     """获取User模型类"""
     return User
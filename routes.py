@@ -1,11 +1,18 @@
 """
 路由定义 - 数据库学习系统
 """
-from flask import Blueprint, render_template, request, jsonify, session, send_file
+from flask import Blueprint, render_template, request, jsonify, session, send_file, current_app, \
+    Response, stream_with_context
 from services import LearningService, ExamService, ReviewService, SettingsService, CourseService
-from services.task_service import TaskService
+from services.task_service import TaskService, public_task
+from services.task_store import TERMINAL_STATUSES, QueueFull
+from services.course_warmup import CourseWarmupService
+from services.model_catalog import ModelCatalog
 from datetime import datetime
 import os
+import json
+import time
+import zlib
 
 # 创建蓝图
 main_bp = Blueprint('main', __name__)
@@ -55,6 +62,15 @@ def get_task_service():
         task_service = TaskService()
     return task_service
 
+def versioned_response(payload, knowledge_base):
+    """附带知识库版本号的响应，支持 If-None-Match 条件请求"""
+    payload['version'] = knowledge_base.version_tag
+    response = jsonify(payload)
+    path_hash = zlib.crc32((knowledge_base.file_path or '').encode('utf-8'))
+    response.set_etag(f"{path_hash:08x}-{knowledge_base.version_tag}")
+    response.headers['X-Knowledge-Version'] = knowledge_base.version_tag
+    return response.make_conditional(request)
+
 # ==================== 主页面路由 ====================
 
 @main_bp.route('/')
@@ -101,16 +117,23 @@ def settings_page():
 
         # 获取当前设置
         current_settings = settings_service.load_settings()
+        current_course = settings_service.get_current_course()
+        # 显示实际生效的 AI 设置（未在设置页面保存过时为环境变量/应用配置中的值）
+        current_settings['ollama_api_url'] = current_app.config['OLLAMA_API_URL']
+        current_settings['ollama_model'] = current_app.config['OLLAMA_MODEL']
 
-        # 获取可用模型
+        # 获取可用模型（读取内存中的模型目录，不请求Ollama）
         available_models = settings_service.get_available_models()
+        model_labels = {model['name']: model['label'] for model in ModelCatalog().list_models()}
 
         # 获取所有课程
         all_courses = course_service.get_all_courses()
 
         return render_template('settings.html',
                              settings=current_settings,
+                             current_course=current_course,
                              available_models=available_models,
+                             model_labels=model_labels,
                              courses=all_courses)
     except Exception as e:
         return render_template('settings.html',
@@ -127,11 +150,11 @@ def get_chapters():
         learning_service = get_learning_service()
         knowledge_base = learning_service.get_current_knowledge_base()
         chapters = knowledge_base.get_chapters()
-        return jsonify({
+        return versioned_response({
             'success': True,
             'chapters': chapters,
             'subject': knowledge_base.get_subject()
-        })
+        }, knowledge_base)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -140,9 +163,10 @@ def get_chapter_content(chapter_name):
     """获取章节内容"""
     try:
         learning_service = get_learning_service()
+        knowledge_base = learning_service.get_current_knowledge_base()
         content = learning_service.get_chapter_content(chapter_name)
         if content:
-            return jsonify({'success': True, 'content': content})
+            return versioned_response({'success': True, 'content': content}, knowledge_base)
         else:
             return jsonify({'success': False, 'error': '章节不存在'}), 404
     except Exception as e:
@@ -179,21 +203,15 @@ def batch_explain_chapter():
         if not chapter:
             return jsonify({'success': False, 'error': '章节参数不能为空'}), 400
 
-        learning_service = get_learning_service()
-        task_service = get_task_service()
-
         # 提交异步任务
-        task_id = task_service.submit_task(
-            learning_service.batch_explain_chapter,
-            username, 
-            chapter
+        # 后台任务中没有会话，提交时确定用户的当前课程
+        return _submit_job(
+            'batch_explain_chapter',
+            username,
+            chapter,
+            get_settings_service().get_current_course(),
+            message='批量生成任务已提交'
         )
-        
-        return jsonify({
-            'success': True, 
-            'task_id': task_id,
-            'message': '批量生成任务已提交'
-        })
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -203,20 +221,14 @@ def batch_explain_all():
     """批量生成全部讲解 (异步)"""
     try:
         username = session.get('username', 'anonymous')
-        learning_service = get_learning_service()
-        task_service = get_task_service()
-
         # 提交异步任务
-        task_id = task_service.submit_task(
-            learning_service.batch_explain_all,
-            username
+        # 后台任务中没有会话，提交时确定用户的当前课程
+        return _submit_job(
+            'batch_explain_all',
+            username,
+            get_settings_service().get_current_course(),
+            message='批量生成全部任务已提交'
         )
-        
-        return jsonify({
-            'success': True, 
-            'task_id': task_id,
-            'message': '批量生成全部任务已提交'
-        })
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -229,13 +241,177 @@ def get_task_status(task_id):
         task = task_service.get_task(task_id)
         
         if task:
-            return jsonify({'success': True, 'task': task})
+            return jsonify({'success': True, 'task': public_task(task)})
         else:
             return jsonify({'success': False, 'error': '任务不存在'}), 404
             
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+
+@api_bp.route('/tasks/<task_id>/results')
+def get_task_results(task_id):
+    """分页获取任务结果明细（任务状态中的结果只含汇总），可用 status 参数筛选条目状态"""
+    try:
+        try:
+            page = max(int(request.args.get('page', 1)), 1)
+            page_size = min(max(int(request.args.get('page_size', 50)), 1), 200)
+        except ValueError:
+            return jsonify({'success': False, 'error': '分页参数无效'}), 400
+
+        task_service = get_task_service()
+        if not task_service.get_task(task_id):
+            return jsonify({'success': False, 'error': '任务不存在'}), 404
+        status = request.args.get('status', '').strip() or None
+        return jsonify({'success': True, **task_service.get_results(task_id, page, page_size, status)})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def _submit_job(kind, *args, message):
+    """提交后台任务并去重，返回响应
+
+    客户端可以通过 Idempotency-Key 请求头（或请求参数 idempotency_key）提供幂等键，
+    否则按任务类型的去重键（课程、章节等）与正在执行的任务去重。
+    任务队列已满或用户未结束的任务过多时返回 429，Retry-After 头给出建议的重试秒数。
+    """
+    data = request.get_json(silent=True) or {}
+    key = request.headers.get('Idempotency-Key') or data.get('idempotency_key') or request.form.get('idempotency_key')
+    try:
+        submitted = get_task_service().enqueue_job(kind, args, idempotency_key=key or None, from_user=True)
+    except QueueFull as e:
+        response = jsonify({'success': False, 'error': str(e), 'retry_after': e.retry_after})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    return jsonify({
+        'success': True,
+        'task_id': submitted['task_id'],
+        'duplicate': not submitted['created'],
+        'message': message if submitted['created'] else '相同的任务已在执行，已返回该任务'
+    })
+
+
+@api_bp.route('/tasks/<task_id>/<action>', methods=['POST'])
+def control_task(task_id, action):
+    """取消、暂停或继续任务（在处理下一个条目之前生效，已完成的部分会保留）"""
+    if action not in ('cancel', 'pause', 'resume'):
+        return jsonify({'success': False, 'error': '不支持的操作'}), 404
+    try:
+        task_service = get_task_service()
+        task = task_service.get_task(task_id)
+        if not task:
+            return jsonify({'success': False, 'error': '任务不存在'}), 404
+        if task.get('username') and task['username'] != session.get('username', 'anonymous'):
+            return jsonify({'success': False, 'error': '只能操作自己提交的任务'}), 403
+
+        result = task_service.control_task(task_id, action)
+        if 'task' in result:
+            result['task'] = public_task(result['task'])
+        return jsonify(result), (200 if result['success'] else 409)
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def _sse_message(data, event=None, event_id=None):
+    """格式化一条 SSE 消息"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False, default=str)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _last_event_id():
+    """断线重连时浏览器携带的 Last-Event-ID（也接受 last_event_id 查询参数）"""
+    value = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def _task_snapshot(task):
+    """任务快照（不含结果，结果就绪时通过 has_result 通知客户端再取）"""
+    snapshot = {key: task.get(key) for key in ('kind', 'status', 'progress', 'message', 'details', 'error', 'queue')}
+    snapshot['has_result'] = task.get('result') is not None
+    return snapshot
+
+
+def _event_stream(task_service, task_id=None, username=None, after_id=0, snapshot=None):
+    """SSE 响应：先发送快照（如有），再推送增量事件，空闲时发送保活注释"""
+    config = current_app.config
+    keepalive = config.get('SSE_KEEPALIVE_INTERVAL', 15.0)
+    events = task_service.stream_events(
+        task_id=task_id, username=username, after_id=after_id,
+        max_duration=config.get('SSE_MAX_DURATION', 55.0),
+        poll_interval=config.get('SSE_POLL_INTERVAL', 1.0)
+    )
+
+    def generate():
+        yield 'retry: 2000\n\n'
+        if snapshot is not None:
+            yield _sse_message({'task_id': task_id, **snapshot}, event='snapshot', event_id=after_id)
+            if snapshot['status'] in TERMINAL_STATUSES:
+                yield _sse_message({'task_id': task_id, 'status': snapshot['status']}, event='end')
+                return
+        last_sent = time.monotonic()
+        for item in events:
+            if item is None:
+                if time.monotonic() - last_sent >= keepalive:
+                    last_sent = time.monotonic()
+                    yield ': keepalive\n\n'
+                continue
+            event_id, event_task_id, data = item
+            last_sent = time.monotonic()
+            yield _sse_message({'task_id': event_task_id, **data}, event='progress', event_id=event_id)
+            if task_id is not None and data.get('status') in TERMINAL_STATUSES:
+                yield _sse_message({'task_id': task_id, 'status': data['status']}, event='end')
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 禁止反向代理缓冲
+    return response
+
+
+@api_bp.route('/tasks/<task_id>/events')
+def stream_task_events(task_id):
+    """单个任务的进度推送（SSE），只推送变化的字段"""
+    task_service = get_task_service()
+    # 先读取最新事件 id 再读取任务：两次读取之间的变化（包括任务结束）仍会作为事件推送，不会丢失
+    last_id = task_service.store.last_event_id(task_id=task_id)
+    task = task_service.get_task(task_id)
+    if not task:
+        return jsonify({'success': False, 'error': '任务不存在'}), 404
+
+    after_id = _last_event_id()
+    snapshot = None
+    if after_id is None:
+        # 首次连接：以当前状态作为快照，之后从快照前的最新事件续传
+        after_id = last_id
+        snapshot = _task_snapshot(task)
+    elif task['status'] in TERMINAL_STATUSES and after_id >= last_id:
+        # 重连时任务已结束且没有未送达的事件
+        snapshot = _task_snapshot(task)
+    return _event_stream(task_service, task_id=task_id, after_id=after_id, snapshot=snapshot)
+
+
+@api_bp.route('/tasks/events')
+def stream_user_task_events():
+    """当前用户全部任务的进度推送（SSE）；首次连接只推送此后的变化"""
+    username = session.get('username', 'anonymous')
+    if username == 'anonymous':
+        return jsonify({'success': False, 'error': '请先设置用户名'}), 400
+
+    task_service = get_task_service()
+    after_id = _last_event_id()
+    if after_id is None:
+        after_id = task_service.store.last_event_id(username=username)
+    return _event_stream(task_service, username=username, after_id=after_id)
+
 @api_bp.route('/regenerate-explain', methods=['POST'])
 def regenerate_explain():
     """重新生成讲解"""
@@ -264,13 +440,134 @@ def search_knowledge():
         if not keyword:
             return jsonify({'success': False, 'error': '搜索关键词不能为空'}), 400
         
+        course = request.args.get('course', '').strip()
+        all_courses = course in ('all', '*')
+        try:
+            page = max(int(request.args.get('page', 1)), 1)
+            page_size = min(max(int(request.args.get('page_size', 20)), 1), 100)
+        except ValueError:
+            return jsonify({'success': False, 'error': '分页参数无效'}), 400
+
         learning_service = get_learning_service()
-        results = learning_service.search_knowledge(keyword)
-        return jsonify({'success': True, 'results': results})
+        result = learning_service.search_knowledge(
+            keyword,
+            course=None if all_courses else (course or None),
+            all_courses=all_courses,
+            page=page,
+            page_size=page_size
+        )
+        return jsonify({'success': True, **result})
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@api_bp.route('/suggest')
+def suggest_knowledge():
+    """搜索框输入联想"""
+    try:
+        prefix = request.args.get('q', '').strip()
+        if not prefix:
+            return jsonify({'success': True, 'suggestions': []})
+
+        course = request.args.get('course', '').strip()
+        all_courses = course in ('all', '*')
+        try:
+            limit = min(max(int(request.args.get('limit', 10)), 1), 20)
+        except ValueError:
+            return jsonify({'success': False, 'error': '参数无效'}), 400
+
+        learning_service = get_learning_service()
+        suggestions = learning_service.suggest(
+            prefix,
+            course=None if all_courses else (course or None),
+            all_courses=all_courses,
+            limit=limit
+        )
+        return jsonify({'success': True, 'suggestions': suggestions})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/search/fulltext')
+def search_explanations():
+    """全文检索讲解正文（本地讲解缓存及已挂载课程包中的讲解）"""
+    try:
+        keyword = request.args.get('keyword', '').strip()
+        if not keyword:
+            return jsonify({'success': False, 'error': '搜索关键词不能为空'}), 400
+
+        course = request.args.get('course', '').strip()
+        all_courses = course in ('all', '*')
+        try:
+            page = max(int(request.args.get('page', 1)), 1)
+            page_size = min(max(int(request.args.get('page_size', 20)), 1), 100)
+        except ValueError:
+            return jsonify({'success': False, 'error': '分页参数无效'}), 400
+
+        learning_service = get_learning_service()
+        result = learning_service.search_explanations(
+            keyword,
+            course=None if all_courses else (course or None),
+            all_courses=all_courses,
+            page=page,
+            page_size=page_size
+        )
+        if result.get('error'):
+            return jsonify({'success': False, 'error': result['error']}), 503
+        return jsonify({'success': True, **result})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/concepts/duplicates')
+def get_duplicate_concepts():
+    """重复概念报告（共享讲解的概念组与节省的AI调用次数）"""
+    try:
+        learning_service = get_learning_service()
+        report = learning_service.get_duplicate_concepts(request.args.get('course', '').strip() or None)
+        return jsonify({'success': True, **report})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/related')
+def get_related_concepts():
+    """获取相关知识点（预计算的嵌入近邻）"""
+    try:
+        chapter = request.args.get('chapter', '').strip()
+        concept = request.args.get('concept', '').strip()
+        if not chapter or not concept:
+            return jsonify({'success': False, 'error': '缺少章节或概念参数'}), 400
+
+        try:
+            k = min(max(int(request.args.get('k', 8)), 1), 20)
+        except ValueError:
+            return jsonify({'success': False, 'error': '参数无效'}), 400
+
+        learning_service = get_learning_service()
+        result = learning_service.get_related_concepts(
+            chapter, concept, course=request.args.get('course', '').strip() or None, k=k
+        )
+        return jsonify({'success': True, **result})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/recommend')
+def recommend_content():
+    """推荐下一步学习内容"""
+    try:
+        learning_service = get_learning_service()
+        recommendation = learning_service.recommend_content(
+            session.get('username', 'anonymous'),
+            chapter=request.args.get('chapter', '').strip() or None,
+            concept=request.args.get('concept', '').strip() or None
+        )
+        return jsonify({'success': True, 'recommendation': recommendation})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @api_bp.route('/progress')
 def get_progress():
     """获取学习进度"""
@@ -296,6 +593,13 @@ def generate_exam():
         
         if not chapters:
             return jsonify({'success': False, 'error': '请选择至少一个章节'}), 400
+
+        if data.get('async'):
+            # 作为后台任务生成，结果通过任务状态获取
+            # 后台任务中没有会话，提交时确定用户的当前课程
+            return _submit_job('generate_exam', username, chapters, question_types, use_ai,
+                               get_settings_service().get_current_course(),
+                               message='试卷生成任务已提交')
         
         # 创建考试
         exam_service = get_exam_service()
@@ -401,6 +705,11 @@ def review_exam():
         if not record_id:
             return jsonify({'success': False, 'error': '记录ID不能为空'}), 400
 
+        if data.get('async'):
+            # 作为后台任务批改，结果通过任务状态获取
+            return _submit_job('review_exam', record_id, session.get('username', 'anonymous'),
+                               message='批改任务已提交')
+
         review_service = get_review_service()
         result = review_service.review_exam(record_id)
         return jsonify(result)
@@ -447,11 +756,18 @@ def get_username():
 
 @api_bp.route('/settings/ollama/models')
 def get_ollama_models():
-    """获取可用的Ollama模型"""
+    """获取可用的Ollama模型（refresh=1 时立即刷新模型目录）"""
     try:
         settings_service = get_settings_service()
-        models = settings_service.get_available_models()
-        return jsonify({'success': True, 'models': models})
+        refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+        models = settings_service.get_available_models(refresh=refresh)
+        catalog = ModelCatalog()
+        return jsonify({
+            'success': True,
+            'models': models,
+            'catalog': catalog.list_models(),
+            'status': catalog.stats()
+        })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -511,12 +827,72 @@ def create_course():
         data = request.get_json()
         course_name = data.get('name', '').strip()
         description = data.get('description', '').strip()
+        pregenerate = bool(data.get('pregenerate', False))
 
         if not course_name:
             return jsonify({'success': False, 'error': '课程名称不能为空'}), 400
 
         course_service = get_course_service()
-        result = course_service.create_course_with_ai(course_name, description)
+        if course_service.get_course_by_name(course_name):
+            return jsonify({'success': False, 'error': f'课程 "{course_name}" 已存在'}), 400
+
+        # 提交异步任务：大纲 + 并发章节生成（可选预生成讲解）
+        return _submit_job(
+            'generate_course',
+            course_name,
+            description,
+            pregenerate,
+            message='课程生成任务已提交'
+        )
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/courses/<course_name>/embeddings', methods=['POST'])
+def build_course_embeddings(course_name):
+    """提交课程相关知识点索引的离线构建任务"""
+    try:
+        data = request.get_json(silent=True) or {}
+        include_explanations = bool(data.get('include_explanations', False))
+
+        course_service = get_course_service()
+        if not course_service.get_course_by_name(course_name):
+            return jsonify({'success': False, 'error': '课程不存在'}), 404
+
+        return _submit_job(
+            'build_related_index',
+            course_name,
+            include_explanations,
+            message='相关知识点索引构建任务已提交'
+        )
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/courses/<course_name>/versions')
+def get_course_versions(course_name):
+    """获取课程版本历史（每次变化的新增/删除/重命名/移动知识点）"""
+    try:
+        course_service = get_course_service()
+        result = course_service.get_course_versions(course_name)
+        return jsonify(result), 200 if result['success'] else 404
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/courses/<course_name>/versions/sync', methods=['POST'])
+def sync_course_version(course_name):
+    """立即比较课程文件与上一版本并迁移讲解缓存"""
+    try:
+        data = request.get_json(silent=True) or {}
+        regenerate = data.get('regenerate')
+
+        course_service = get_course_service()
+        result = course_service.sync_course_version(
+            course_name, regenerate=None if regenerate is None else bool(regenerate)
+        )
+        if not result['success']:
+            return jsonify(result), 404 if result.get('error') == '课程不存在' else 500
         return jsonify(result)
 
     except Exception as e:
@@ -533,6 +909,104 @@ def delete_course(course_name):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@api_bp.route('/courses/<course_name>/export')
+def export_course_pack(course_name):
+    """导出课程包"""
+    try:
+        from utils.course_pack import pack_filename
+
+        export_dir = os.path.join('data', 'exports')
+        os.makedirs(export_dir, exist_ok=True)
+        filename = pack_filename(course_name)
+
+        course_service = get_course_service()
+        result = course_service.export_course_pack(course_name, os.path.join(export_dir, filename))
+        if not result['success']:
+            return jsonify(result), 404 if result.get('error') == '课程不存在' else 500
+
+        return send_file(
+            os.path.abspath(result['file_path']),
+            as_attachment=True,
+            download_name=filename,
+            mimetype='application/octet-stream'
+        )
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/courses/import', methods=['POST'])
+def import_course_pack():
+    """导入课程包"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({'success': False, 'error': '没有文件'}), 400
+
+        file = request.files['file']
+        overwrite = request.form.get('overwrite', 'false').lower() == 'true'
+
+        import tempfile
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = os.path.join(temp_dir, 'upload.cpk')
+            file.save(temp_path)
+
+            course_service = get_course_service()
+            result = course_service.import_course_pack(temp_path, overwrite=overwrite)
+
+        return jsonify(result), 200 if result['success'] else 400
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/courses/import-syllabus', methods=['POST'])
+def import_course_syllabus():
+    """流式导入 CSV / JSON Lines 课程大纲（每行：章节, 类型, 文本）"""
+    try:
+        from services.course_import import detect_format
+
+        if 'file' not in request.files:
+            return jsonify({'success': False, 'error': '没有文件'}), 400
+
+        file = request.files['file']
+        course_name = request.form.get('name', '').strip()
+        overwrite = request.form.get('overwrite', 'false').lower() == 'true'
+        fmt = request.form.get('format', '').strip().lower() or detect_format(file.filename)
+
+        if not course_name:
+            return jsonify({'success': False, 'error': '课程名称不能为空'}), 400
+        if fmt not in ('csv', 'jsonl'):
+            return jsonify({'success': False, 'error': '仅支持 CSV 或 JSON Lines (.jsonl) 文件'}), 400
+
+        course_service = get_course_service()
+        if course_service.get_course_by_name(course_name) and not overwrite:
+            return jsonify({'success': False, 'error': f'课程 "{course_name}" 已存在'}), 400
+
+        # 上传内容先落盘（上传目录，独立 worker 进程也能读取），由后台任务逐行读取，完成后删除
+        import tempfile
+        fd, temp_path = tempfile.mkstemp(suffix=f'.{fmt}', prefix='import_',
+                                         dir=os.path.abspath(current_app.config['UPLOAD_FOLDER']))
+        os.close(fd)
+        try:
+            file.save(temp_path)
+            submitted = _submit_job(
+                'import_syllabus',
+                temp_path,
+                course_name,
+                fmt,
+                overwrite,
+                message='课程大纲导入任务已提交'
+            )
+        except Exception:
+            # 保存或提交失败时没有任务接管该文件
+            os.remove(temp_path)
+            raise
+        if submitted.status_code != 200 or submitted.get_json()['duplicate']:
+            # 队列已满，或同名课程的导入任务正在执行，本次上传的文件不会被读取
+            os.remove(temp_path)
+        return submitted
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @api_bp.route('/health')
 def health_check():
     """健康检查端点 - 用于Docker健康检查"""
@@ -562,6 +1036,12 @@ def health_check():
         if not os.path.exists(data_dir):
             os.makedirs(data_dir, exist_ok=True)
 
+        from models.knowledge import KnowledgeBaseCache
+        from services.search_index import SearchIndex
+        from services.explanation_search import ExplanationSearchIndex
+        from services.related_index import RelatedIndex
+        from services.explanation_cache import ExplanationCache
+
         status = {
             'status': 'healthy',
             'database': 'connected',
@@ -569,6 +1049,17 @@ def health_check():
                 'missing': missing_files,
                 'status': 'ok' if not missing_files else 'warning'
             },
+            'caches': {
+                'knowledge_base': KnowledgeBaseCache().stats(),
+                'search_index': SearchIndex().stats(),
+                'explanation_search': ExplanationSearchIndex.default().stats(),
+                'related_index': RelatedIndex().stats(),
+                'explanation_memory': ExplanationCache.memory.stats(),
+                'model_catalog': ModelCatalog().stats(),
+                'tasks': {**TaskService().store.stats(),
+                          'queue': TaskService().store.queue_metrics(),
+                          'execution_mode': current_app.config.get('TASK_EXECUTION_MODE', 'thread')}
+            },
             'timestamp': str(datetime.now())
         }
 
@@ -583,31 +1074,56 @@ def health_check():
 
 @api_bp.route('/courses/current')
 def get_current_course():
-    """获取当前课程"""
+    """获取当前用户的当前课程"""
     try:
         settings_service = get_settings_service()
         current_course = settings_service.get_current_course()
-        return jsonify({'success': True, 'current_course': current_course})
+        knowledge_base = get_learning_service().get_current_knowledge_base()
+        return jsonify({
+            'success': True,
+            'current_course': current_course,
+            'default_course': settings_service.get_default_course(),
+            'version': knowledge_base.version_tag
+        })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @api_bp.route('/courses/current', methods=['POST'])
 def set_current_course():
-    """设置当前课程"""
+    """设置当前课程（scope 为 global 时修改全局默认课程）"""
     try:
         data = request.get_json()
         course_name = data.get('course_name')
+        scope = data.get('scope', 'user')
 
         if not course_name:
             return jsonify({'success': False, 'error': '课程名称不能为空'}), 400
+        if scope not in ('user', 'global'):
+            return jsonify({'success': False, 'error': 'scope 必须是 user 或 global'}), 400
 
         settings_service = get_settings_service()
-        result = settings_service.set_current_course(course_name)
+        result = settings_service.set_current_course(course_name, scope=scope)
 
-        # 更新session
-        session['current_course'] = course_name
+        # 全局默认课程变化时设置订阅者已开始预热；用户课程在此提交预热，
+        # 前端轮询预热状态以提示切换何时完全就绪
+        if result.get('success'):
+            warmup_service = CourseWarmupService()
+            if scope == 'user' and current_app.config.get('COURSE_WARMUP_ENABLED', True):
+                result['warmup'] = warmup_service.start(course_name)
+            else:
+                result['warmup'] = warmup_service.get_status(course_name)
 
         return jsonify(result)
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/courses/current/warmup')
+def get_course_warmup():
+    """获取课程预热状态（默认当前课程；提供 task_id 时按共享任务存储中的预热任务查询）"""
+    try:
+        course_name = request.args.get('course') or get_settings_service().get_current_course()
+        task_id = request.args.get('task_id') or None
+        return jsonify({'success': True, 'warmup': CourseWarmupService().get_status(course_name, task_id)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
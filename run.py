@@ -30,6 +30,16 @@ def main():
     except Exception as e:
         print(f"❌ 应用初始化失败: {e}")
         sys.exit(1)
+
+    # 迁移旧版本放在项目根目录的课程文件（单进程开发服务器，启动前执行一次）
+    try:
+        from models.course import migrate_legacy_course_files
+        with app.app_context():
+            migrated = migrate_legacy_course_files()
+        if migrated:
+            print(f"✅ 已将 {migrated} 个课程文件迁移到 data/courses")
+    except Exception as e:
+        print(f"⚠️  迁移课程文件失败: {e}")
     
     # 显示启动信息
     print("\n🚀 启动信息:")
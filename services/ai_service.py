@@ -5,20 +5,51 @@ import requests
 import json
 import time
 from flask import current_app
+from services.model_catalog import ModelCatalog
+from services.task_service import checkpoint
 
 class AIService:
     """AI服务类"""
     
     def __init__(self):
-        self.api_url = current_app.config['OLLAMA_API_URL']
-        self.model_name = current_app.config['OLLAMA_MODEL']
+        # 未显式指定时每次请求读取应用配置，设置变更后无需重建服务
+        self._api_url = None
+        self._model_name = None
         self.timeout = 60  # 60秒超时
         self.max_retries = 3
     
+    @property
+    def api_url(self):
+        return self._api_url or current_app.config['OLLAMA_API_URL']
+
+    @api_url.setter
+    def api_url(self, value):
+        self._api_url = value
+
+    @property
+    def model_name(self):
+        return self._model_name or current_app.config['OLLAMA_MODEL']
+
+    @model_name.setter
+    def model_name(self, value):
+        self._model_name = value
+
+    def _route_model(self):
+        """选择本次请求使用的模型：显式指定的模型不参与路由，否则避开需要冷启动加载的模型"""
+        if self._model_name:
+            return self._model_name
+        preferred = current_app.config['OLLAMA_MODEL']
+        fallbacks = current_app.config.get('OLLAMA_FALLBACK_MODELS') or []
+        model = ModelCatalog().choose(preferred, fallbacks)
+        if model != preferred:
+            current_app.logger.info(f"模型 {preferred} 未加载，改用已加载的备选模型 {model}")
+        return model
+
     def _make_request(self, prompt, max_tokens=2000):
         """发送请求到Ollama API"""
+        model = self._route_model()
         payload = {
-            "model": self.model_name,
+            "model": model,
             "messages": [
                 {
                     "role": "user",
@@ -50,6 +81,7 @@ class AIService:
                         content = self._clean_ai_content(content)
                         # 额外的安全检查：确保没有可能导致Python执行错误的内容
                         content = self._final_safety_check(content)
+                        ModelCatalog().mark_loaded(model)
                         return content
                     else:
                         current_app.logger.error(f"AI响应格式错误: {result}")
@@ -70,6 +102,46 @@ class AIService:
                 
         return "抱歉，AI服务暂时不可用，请稍后重试。"
 
+    def embed(self, texts):
+        """调用Ollama嵌入接口，返回与 texts 一一对应的向量列表"""
+        embed_url = self.api_url.replace('/api/chat', '/api/embed')
+        payload = {
+            "model": current_app.config.get('OLLAMA_EMBED_MODEL', 'bge-m3'),
+            "input": list(texts)
+        }
+
+        last_error = None
+        for attempt in range(self.max_retries):
+            try:
+                response = requests.post(
+                    embed_url,
+                    json=payload,
+                    timeout=self.timeout,
+                    headers={'Content-Type': 'application/json'}
+                )
+                if response.status_code == 200:
+                    embeddings = response.json().get('embeddings')
+                    if embeddings and len(embeddings) == len(payload['input']):
+                        return embeddings
+                    last_error = "嵌入接口返回的向量数量不匹配"
+                else:
+                    # 如 Ollama 正在加载模型时返回 503
+                    last_error = f"{response.status_code} - {response.text}"
+                current_app.logger.error(f"嵌入API错误: {last_error}")
+            except requests.exceptions.Timeout:
+                last_error = "请求超时"
+                current_app.logger.warning(f"嵌入请求超时 (尝试 {attempt + 1})")
+            except requests.exceptions.ConnectionError:
+                raise RuntimeError("无法连接到Ollama服务，请确保Ollama服务正在运行。")
+            except ValueError as e:
+                last_error = f"响应不是有效的JSON: {e}"
+                current_app.logger.error(f"嵌入API错误: {last_error}")
+
+            if attempt < self.max_retries - 1:
+                time.sleep(2 ** attempt)  # 指数退避
+
+        raise RuntimeError(f"嵌入接口暂时不可用: {last_error}")
+
     def _clean_ai_content(self, content):
         """清理AI返回的内容，移除可能导致问题的字符"""
         if not content:
@@ -431,12 +503,21 @@ JSON格式示例：
 
         return self._make_request(prompt)
 
-    def batch_generate_explanations(self, chapter_concepts, progress_callback=None, course_name="通用课程"):
-        """批量生成讲解"""
+    def batch_generate_explanations(self, chapter_concepts, progress_callback=None, course_name="通用课程",
+                                    on_result=None):
+        """批量生成讲解
+
+        每个条目之前检查任务控制请求：暂停时等待继续，取消时停止并返回已生成的部分。
+        指定 on_result(chapter, concept, concept_type, explanation) 时每生成一条立即交给它保存，
+        结果中不再保留讲解正文。
+        """
         results = {}
         total = len(chapter_concepts)
 
         for i, (chapter, concept, concept_type) in enumerate(chapter_concepts):
+            if checkpoint():
+                current_app.logger.info(f"批量生成已取消，已完成 {i}/{total}")
+                break
             try:
                 current_app.logger.info(f"批量生成 {i+1}/{total}: {chapter} - {concept}")
 
@@ -446,11 +527,14 @@ JSON格式示例：
                 if explanation and not explanation.startswith("抱歉") and not explanation.startswith("无法连接"):
                     results[f"{chapter}_{concept}"] = {
                         'success': True,
-                        'explanation': explanation,
                         'chapter': chapter,
                         'concept': concept,
                         'concept_type': concept_type
                     }
+                    if on_result:
+                        on_result(chapter, concept, concept_type, explanation)
+                    else:
+                        results[f"{chapter}_{concept}"]['explanation'] = explanation
                 else:
                     results[f"{chapter}_{concept}"] = {
                         'success': False,
@@ -0,0 +1,158 @@
+"""
+规范概念注册表 - 检测跨章节（可选跨课程）重复出现的概念/知识点
+
+名称经过全角转半角、统一大小写并去除空白后相同即视为同一概念；
+每组重复条目以首次出现的条目为规范条目，讲解只生成一次并保存在规范条目的缓存文件中，
+其他出现位置直接共享该讲解。
+"""
+import re
+import threading
+from collections import namedtuple
+from models.course import CourseRegistry
+from models.knowledge import KnowledgeBaseCache
+from services.search_index import normalize
+
+_SPACE_RE = re.compile(r'\s+')
+
+Occurrence = namedtuple('Occurrence', ('course', 'chapter', 'name', 'type'))
+
+
+def canonical_key(name):
+    """概念的规范键：NFKC + casefold，并去除全部空白"""
+    return _SPACE_RE.sub('', normalize(name))
+
+
+class ConceptGroups:
+    """一组知识库中的概念分组（按课程顺序、章节顺序排列出现位置）"""
+
+    __slots__ = ('versions', 'groups', 'keys')
+
+    def __init__(self, knowledge_bases, versions=None):
+        self.versions = versions
+        self.groups = {}  # {规范键: [Occurrence]}，第一个为规范条目
+        self.keys = {}    # {(课程, 章节, 名称): 规范键}
+
+        for course_name, knowledge_base in knowledge_bases:
+            for chapter in knowledge_base.get_chapters():
+                for item_type, names in (('concept', knowledge_base.get_concepts(chapter)),
+                                         ('content', knowledge_base.get_contents(chapter))):
+                    for name in names:
+                        if (course_name, chapter, name) in self.keys:
+                            continue
+                        key = canonical_key(name)
+                        self.keys[(course_name, chapter, name)] = key
+                        self.groups.setdefault(key, []).append(
+                            Occurrence(course_name, chapter, name, item_type)
+                        )
+
+    def occurrences(self, course_name, chapter, name):
+        """返回条目所在组的全部出现位置（不在知识库中时返回空列表）"""
+        key = self.keys.get((course_name, chapter, name))
+        return self.groups[key] if key is not None else []
+
+    def canonical(self, course_name, chapter, name):
+        """返回条目的规范条目（不在知识库中时返回 None）"""
+        occurrences = self.occurrences(course_name, chapter, name)
+        return occurrences[0] if occurrences else None
+
+    def duplicate_groups(self):
+        """出现不止一次的概念组"""
+        return [occurrences for occurrences in self.groups.values() if len(occurrences) > 1]
+
+    def plan(self, course_name, items):
+        """为批量生成去重
+
+        items 为 [(章节, 名称, 类型)]；返回 (需要生成的规范条目列表, {条目: 规范条目})，
+        同组条目在批次中只对应一次生成。
+        """
+        unique = []
+        mapping = {}
+        planned = set()
+        for chapter, name, item_type in items:
+            canonical = self.canonical(course_name, chapter, name) or \
+                Occurrence(course_name, chapter, name, item_type)
+            target = (canonical.chapter, canonical.name, canonical.type)
+            mapping[(chapter, name, item_type)] = target
+            if target not in planned:
+                planned.add(target)
+                unique.append(target)
+        return unique, mapping
+
+    def stats(self):
+        duplicates = self.duplicate_groups()
+        return {
+            'concepts': len(self.keys),
+            'unique': len(self.groups),
+            'duplicate_groups': len(duplicates),
+            'duplicate_occurrences': sum(len(occurrences) - 1 for occurrences in duplicates)
+        }
+
+
+class ConceptRegistry:
+    """规范概念注册表（进程级单例），课程文件变化时重建对应分组"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(ConceptRegistry, cls).__new__(cls)
+                cls._instance._initialized = False
+            return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.groups = {}  # {课程名称或 '*': ConceptGroups}
+        self._build_lock = threading.Lock()
+        self.knowledge_cache = KnowledgeBaseCache()
+        self._initialized = True
+
+    def get(self, course_name, cross_course=False):
+        """返回课程（cross_course 为真时为全部课程）的概念分组"""
+        registry = CourseRegistry()
+        if cross_course:
+            # 当前课程排在最前，跨课程重复时优先以当前课程的条目为规范条目
+            entries = sorted(registry.list_entries(), key=lambda entry: entry['name'] != course_name)
+            cache_key = '*'
+        else:
+            entry = registry.get_entry(course_name)
+            entries = [entry] if entry else []
+            cache_key = course_name
+
+        knowledge_bases = []
+        for entry in entries:
+            try:
+                knowledge_bases.append((entry['name'], self.knowledge_cache.get(entry['file'])))
+            except Exception as e:
+                print(f"加载课程 {entry['name']} 知识库失败: {e}")
+        versions = tuple((name, knowledge_base.version) for name, knowledge_base in knowledge_bases)
+
+        groups = self.groups.get(cache_key)
+        if groups is None or groups.versions != versions:
+            with self._build_lock:
+                groups = self.groups.get(cache_key)
+                if groups is None or groups.versions != versions:
+                    groups = ConceptGroups(knowledge_bases, versions)
+                    self.groups[cache_key] = groups
+        return groups
+
+
+def lookup_order(groups, course_name, chapter, name, item_type):
+    """讲解查找顺序：规范条目、条目自身、组内其他条目（按 (章节, 名称) 去重）"""
+    order = [(chapter, name, item_type)]
+    if groups is not None:
+        occurrences = groups.occurrences(course_name, chapter, name)
+        if occurrences:
+            order = [(occurrence.chapter, occurrence.name, occurrence.type) for occurrence in occurrences]
+            order.insert(1, (chapter, name, item_type))
+
+    seen = set()
+    result = []
+    for item in order:
+        if item[:2] not in seen:
+            seen.add(item[:2])
+            result.append(item)
+    return result
@@ -0,0 +1,266 @@
+"""
+课程大纲流式导入 - 从 CSV 或 JSON Lines（章节, 类型, 文本）逐行导入大型课程
+
+逐行读取、校验并增量写出课程 JSON 文件，内存中只保留当前章节的条目；
+同一遍读取中同时构建搜索索引并统计课程清单所需的章节/知识点数量，
+写完后原子替换课程文件，直接登记到课程清单和搜索索引，无需再次解析。
+输入需按章节分组排列（同一章节的行连续出现）。
+"""
+import os
+import csv
+import json
+import threading
+from models.course import Course, CourseRegistry
+from services.search_index import CourseIndex, SearchIndex
+
+SUPPORTED_FORMATS = ('csv', 'jsonl')
+MAX_TEXT_LENGTH = 200
+MAX_ERRORS = 100           # 无效行超过该数量时放弃导入
+MAX_REPORTED_ERRORS = 20   # 结果中最多列出的无效行
+PROGRESS_INTERVAL = 500    # 每处理多少行报告一次进度
+
+# 列名/字段名（中英文均可）
+FIELD_ALIASES = {
+    'chapter': ('chapter', '章节'),
+    'type': ('type', '类型'),
+    'text': ('text', '内容', '名称', 'name')
+}
+TYPE_ALIASES = {
+    'concept': 'concept', '概念': 'concept', 'mainconcepts': 'concept', '主要概念': 'concept',
+    'content': 'content', '知识点': 'content', 'maincontents': 'content', '主要知识点': 'content'
+}
+
+
+class SyllabusImportError(ValueError):
+    """导入失败（格式错误、章节未分组或无效行过多）"""
+
+
+def detect_format(filename):
+    """根据扩展名判断格式"""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    return None
+
+
+class _ByteCountingLines:
+    """逐行读取二进制文件并解码，同时统计已读取字节数（用于进度）"""
+
+    def __init__(self, f):
+        self.f = f
+        self.bytes_read = 0
+        self.line_no = 0
+
+    def __iter__(self):
+        for raw in self.f:
+            self.bytes_read += len(raw)
+            self.line_no += 1
+            line = raw.decode('utf-8')
+            if self.line_no == 1:
+                line = line.lstrip('\ufeff')
+            yield line
+
+
+def _resolve_field(mapping, field):
+    for alias in FIELD_ALIASES[field]:
+        if alias in mapping:
+            return mapping[alias]
+    return None
+
+
+def iter_rows(lines, fmt):
+    """逐行解析，产出 (行号, 章节, 类型, 文本) 或 (行号, None, None, 错误信息)"""
+    if fmt == 'csv':
+        reader = csv.reader(lines)
+        columns = None
+        for row in reader:
+            line_no = lines.line_no
+            if not row or not any(cell.strip() for cell in row):
+                continue
+            if columns is None:
+                header = [cell.strip().lower() for cell in row]
+                columns = {field: _resolve_field({name: i for i, name in enumerate(header)}, field)
+                           for field in FIELD_ALIASES}
+                if all(index is not None for index in columns.values()):
+                    continue  # 表头行
+                columns = {'chapter': 0, 'type': 1, 'text': 2}
+            try:
+                yield line_no, row[columns['chapter']], row[columns['type']], row[columns['text']]
+            except IndexError:
+                yield line_no, None, None, '列数不足（需要 章节, 类型, 文本）'
+    else:
+        for line in lines:
+            line_no = lines.line_no
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, None, f'JSON 解析失败: {e}'
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, None, '每行必须是 JSON 对象'
+                continue
+            chapter = _resolve_field(record, 'chapter')
+            item_type = _resolve_field(record, 'type')
+            text = _resolve_field(record, 'text')
+            if not all(isinstance(value, str) for value in (chapter, item_type, text)):
+                yield line_no, None, None, '缺少 chapter/type/text 字段'
+                continue
+            yield line_no, chapter, item_type, text
+
+
+class CourseFileWriter:
+    """增量写出课程 JSON 文件，只在内存中保留当前章节"""
+
+    def __init__(self, path, subject):
+        self.path = path
+        self.temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.f = open(self.temp_file, 'w', encoding='utf-8')
+        self.f.write('{\n  "科目": %s,\n  "章节": {' % json.dumps(subject, ensure_ascii=False))
+        self.chapter = None
+        self.concepts = []
+        self.contents = []
+        self.chapter_count = 0
+
+    def begin_chapter(self, chapter):
+        self._flush_chapter()
+        self.chapter = chapter
+
+    def add(self, item_type, text):
+        (self.concepts if item_type == 'concept' else self.contents).append(text)
+
+    def _flush_chapter(self):
+        if self.chapter is None:
+            return
+        separator = ',' if self.chapter_count else ''
+        self.f.write('%s\n    %s: %s' % (
+            separator,
+            json.dumps(self.chapter, ensure_ascii=False),
+            json.dumps({'mainConcepts': self.concepts, 'mainContents': self.contents}, ensure_ascii=False)
+        ))
+        self.chapter_count += 1
+        self.chapter = None
+        self.concepts = []
+        self.contents = []
+
+    def commit(self):
+        """写完最后一个章节并原子替换课程文件"""
+        self._flush_chapter()
+        self.f.write('\n  }\n}\n')
+        self.f.close()
+        os.replace(self.temp_file, self.path)
+
+    def abort(self):
+        if not self.f.closed:
+            self.f.close()
+        if os.path.exists(self.temp_file):
+            os.remove(self.temp_file)
+
+
+def import_syllabus(source_path, course_name, fmt, overwrite=False, progress_callback=None):
+    """流式导入课程大纲，返回导入统计"""
+    if fmt not in SUPPORTED_FORMATS:
+        raise SyllabusImportError(f'不支持的格式: {fmt}（支持 CSV 与 JSON Lines）')
+
+    default_course = Course.get_default_course()
+    course_file = default_course.filename if course_name == default_course.name \
+        else Course.get_course_filename(course_name)
+    if os.path.exists(course_file) and not overwrite:
+        raise SyllabusImportError(f'课程 "{course_name}" 已存在，如需覆盖请使用 overwrite')
+
+    total_bytes = os.path.getsize(source_path) or 1
+    writer = CourseFileWriter(course_file, course_name)
+    index = CourseIndex(course_name)
+    seen_chapters = set()
+    chapter_items = set()
+    counts = {'rows': 0, 'concepts': 0, 'contents': 0, 'duplicates': 0}
+    errors = []
+    error_count = 0
+
+    def reject(line_no, message):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'line': line_no, 'error': message})
+        if error_count > MAX_ERRORS:
+            raise SyllabusImportError(f'无效行超过 {MAX_ERRORS} 行，已放弃导入')
+
+    try:
+        with open(source_path, 'rb') as f:
+            lines = _ByteCountingLines(f)
+            for line_no, chapter, item_type, text in iter_rows(lines, fmt):
+                counts['rows'] += 1
+                if chapter is None:
+                    reject(line_no, text)
+                    continue
+
+                chapter = chapter.strip()
+                text = text.strip()
+                item_type = TYPE_ALIASES.get(item_type.strip().lower())
+                if not chapter or not text:
+                    reject(line_no, '章节或文本为空')
+                    continue
+                if item_type is None:
+                    reject(line_no, '类型必须是 concept/概念 或 content/知识点')
+                    continue
+                if len(text) > MAX_TEXT_LENGTH or len(chapter) > MAX_TEXT_LENGTH:
+                    reject(line_no, f'文本超过 {MAX_TEXT_LENGTH} 个字符')
+                    continue
+
+                if chapter != writer.chapter:
+                    if chapter in seen_chapters:
+                        raise SyllabusImportError(
+                            f'第 {line_no} 行：章节 "{chapter}" 前面已出现过，请按章节分组排列后再导入'
+                        )
+                    seen_chapters.add(chapter)
+                    writer.begin_chapter(chapter)
+                    chapter_items = set()
+
+                if (item_type, text) in chapter_items:
+                    counts['duplicates'] += 1
+                    continue
+                chapter_items.add((item_type, text))
+                writer.add(item_type, text)
+                index.add(item_type, chapter, text, len(seen_chapters) - 1)
+                counts['concepts' if item_type == 'concept' else 'contents'] += 1
+
+                if progress_callback and counts['rows'] % PROGRESS_INTERVAL == 0:
+                    progress_callback({
+                        'percentage': min(int(lines.bytes_read * 95 / total_bytes), 95),
+                        'message': f"已导入 {counts['rows']} 行，{len(seen_chapters)} 个章节",
+                        'rows': counts['rows']
+                    })
+
+        if not seen_chapters:
+            raise SyllabusImportError('没有可导入的有效行')
+
+        writer.commit()
+    except UnicodeDecodeError:
+        writer.abort()
+        raise SyllabusImportError('文件必须是 UTF-8 编码')
+    except Exception:
+        writer.abort()
+        raise
+
+    # 课程清单与搜索索引在同一遍中已统计/构建，直接登记
+    registry = CourseRegistry()
+    entry = registry.register(course_file, course_name, len(seen_chapters), counts['concepts'] + counts['contents'])
+    index.finish((entry['mtime_ns'], entry['size']))
+    SearchIndex().install(index)
+
+    if progress_callback:
+        progress_callback({'percentage': 100, 'message': '导入完成', 'rows': counts['rows']})
+
+    return {
+        'success': True,
+        'course_name': course_name,
+        'course_file': course_file,
+        'chapters': len(seen_chapters),
+        **counts,
+        'error_count': error_count,
+        'errors': errors
+    }
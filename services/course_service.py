@@ -1,16 +1,38 @@
 """
 课程服务
 """
+import os
+import re
 import json
-from models.course import Course
+import shutil
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from models.course import Course, CourseRegistry
+from models.knowledge import KnowledgeBase, KnowledgeBaseCache, validate_knowledge_data
 from services.ai_service import AIService
+from services.explanation_cache import ExplanationCache
+from services.concept_registry import ConceptGroups, ConceptRegistry, lookup_order
+from services.course_versions import CourseVersionService
+from services.course_import import import_syllabus, SyllabusImportError
+from services.task_service import exclusive, cancelled
+from utils.course_pack import (CoursePack, CoursePackWriter, CoursePackRegistry, CoursePackError,
+                               PACKS_DIR, KNOWLEDGE_ENTRY, QUESTION_BANK_ENTRY, EXPLANATION_PREFIX,
+                               pack_filename)
 from flask import current_app
 
 class CourseService:
     """课程服务类"""
+
+    OUTLINE_MAX_TOKENS = 800
+    CHAPTER_MAX_TOKENS = 1200
+    CHAPTER_WORKERS = 4       # 并发生成章节的线程数
+    GENERATION_ATTEMPTS = 2   # 大纲/章节格式无效时的尝试次数
+    MAX_CHAPTERS = 12
+    MAX_ITEMS = 8
     
     def __init__(self):
         self.ai_service = AIService()
+        self.explanation_cache = ExplanationCache()
     
     def get_all_courses(self):
         """获取所有课程"""
@@ -29,145 +51,248 @@ class CourseService:
             return None
     
     def create_course_with_ai(self, course_name, description=""):
-        """使用AI创建课程知识库"""
+        """使用AI创建课程知识库（同步执行两阶段生成）"""
+        return self.generate_course(course_name, description)
+
+    def generate_course(self, course_name, description="", pregenerate=False, progress_callback=None):
+        """两阶段生成课程知识库，可在后台任务中执行
+
+        先用一次简短调用生成章节大纲，再并发为每个章节生成 mainConcepts/mainContents，
+        每完成一个章节即校验并合并、上报进度；pregenerate 为真时继续为新课程预生成讲解。
+        """
+        def report(percentage, message, **details):
+            if progress_callback:
+                progress_callback({'percentage': round(percentage, 1), 'message': message, **details})
+
         try:
+            if Course.get_course_by_name(course_name):
+                return {'success': False, 'error': f'课程 "{course_name}" 已存在'}
+
             current_app.logger.info(f"开始为课程 '{course_name}' 生成知识库")
-            
-            # 构建AI提示词
-            prompt = self._build_knowledge_generation_prompt(course_name, description)
-            
-            # 调用AI生成知识库
-            ai_response = self.ai_service._make_request(prompt, max_tokens=4000)
-            
-            if not ai_response or ai_response.startswith("抱歉") or ai_response.startswith("无法连接"):
-                return {
-                    'success': False,
-                    'error': ai_response or "AI服务暂时不可用"
-                }
-            
-            # 解析AI响应，提取JSON
-            knowledge_data = self._parse_ai_response(ai_response, course_name)
-            
-            if not knowledge_data:
-                return {
-                    'success': False,
-                    'error': "AI生成的知识库格式无效"
-                }
-            
-            # 创建课程
+
+            # 第一阶段：章节大纲
+            report(2, '正在生成章节大纲', stage='outline')
+            outline = self._generate_outline(course_name, description)
+            if not outline:
+                return {'success': False, 'error': 'AI生成的章节大纲格式无效'}
+
+            chapter_weight = 80 if pregenerate else 90
+            report(10, f'大纲已生成，共 {len(outline)} 章', stage='chapters', outline=outline,
+                   completed_chapters=[], failed_chapters=[])
+
+            # 第二阶段：并发生成各章节内容，完成一章合并一章
+            chapters = {}
+            failed_chapters = []
+            app = current_app._get_current_object()
+
+            def generate_in_context(chapter_name):
+                with app.app_context():
+                    return self._generate_chapter(course_name, description, outline, chapter_name)
+
+            with ThreadPoolExecutor(max_workers=self.CHAPTER_WORKERS) as executor:
+                futures = {executor.submit(generate_in_context, name): name for name in outline}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    chapter_name = futures[future]
+                    try:
+                        chapter_data = future.result()
+                    except Exception as e:
+                        current_app.logger.error(f"生成章节失败 {chapter_name}: {e}")
+                        chapter_data = None
+
+                    if chapter_data:
+                        chapters[chapter_name] = chapter_data
+                    else:
+                        failed_chapters.append(chapter_name)
+
+                    report(10 + chapter_weight * done / len(outline),
+                           f'已完成 {done}/{len(outline)} 章: {chapter_name}',
+                           stage='chapters', outline=outline,
+                           completed_chapters=[name for name in outline if name in chapters],
+                           failed_chapters=failed_chapters)
+
+            if not chapters:
+                return {'success': False, 'error': '所有章节生成失败，请检查AI服务后重试'}
+
+            knowledge_data = {
+                '科目': course_name,
+                '章节': {name: chapters[name] for name in outline if name in chapters}
+            }
+            if not self.validate_course_data(knowledge_data):
+                return {'success': False, 'error': 'AI生成的知识库格式无效'}
+
             course = Course.create_course(course_name, description, knowledge_data)
-            
-            return {
+            result = {
                 'success': True,
                 'course': course.to_dict(),
-                'knowledge_data': knowledge_data
+                'knowledge_data': knowledge_data,
+                'failed_chapters': failed_chapters
             }
-            
+
+            if pregenerate:
+                result['explanations'] = self._pregenerate_explanations(
+                    course_name, knowledge_data,
+                    lambda current, total, message: report(
+                        90 + 10 * current / total, message, stage='explanations',
+                        current=current, total=total)
+                )
+
+            report(100, '课程生成完成', stage='done', failed_chapters=failed_chapters)
+            return result
+
         except Exception as e:
             current_app.logger.error(f"创建课程失败: {e}")
             return {
                 'success': False,
                 'error': f"创建课程失败: {str(e)}"
             }
-    
-    def _build_knowledge_generation_prompt(self, course_name, description):
-        """构建知识库生成提示词"""
+
+    def _generate_outline(self, course_name, description):
+        """第一阶段：生成章节大纲，返回章节名称列表"""
         prompt = f"""
-作为一名资深的教育专家和课程设计师，请为"{course_name}"课程生成完整的知识库结构。
+作为一名资深的教育专家和课程设计师，请为"{course_name}"课程设计章节大纲。
 
 课程描述：{description if description else '无'}
 
-请严格按照以下JSON格式生成知识库，确保结构完全一致：
-
-{{
-  "科目": "{course_name}",
-  "章节": {{
-    "第一章 课程名称": {{
-      "mainConcepts": [
-        "概念1",
-        "概念2",
-        "概念3"
-      ],
-      "mainContents": [
-        "知识点1",
-        "知识点2", 
-        "知识点3"
-      ]
-    }},
-    "第二章 课程名称": {{
-      "mainConcepts": [
-        "概念1",
-        "概念2"
-      ],
-      "mainContents": [
-        "知识点1",
-        "知识点2"
-      ]
-    }}
-  }}
-}}
-
 要求：
 1. 生成8-12个章节，章节名称要具体且符合该课程的教学体系
-2. 每个章节包含3-5个主要概念(mainConcepts)
-3. 每个章节包含3-6个主要知识点(mainContents)
-4. 概念应该是理论性的核心概念
-5. 知识点应该是具体的技能或应用点
-6. 内容要准确、全面、符合本科教学水平
-7. 必须返回有效的JSON格式，不要包含任何其他文字说明
-
-注意：生成的概念和知识点将用于AI讲解，AI会为每个概念和知识点生成包含以下元素的详细内容：
-- 文字说明：详细的理论解释
-- 对比表格：特点、优缺点、适用场景等的表格对比
-- 流程图：使用Mermaid语法的操作流程或原理图
-- 实例演示：具体的应用案例
-因此请确保概念和知识点的命名清晰、具体，便于生成丰富的多媒体教学内容。
-
-请直接返回JSON内容：
+2. 章节名称格式为"第一章 章节标题"
+3. 必须返回有效的JSON格式，不要包含任何其他文字说明
+
+请严格按照以下JSON格式返回：
+{{"章节": ["第一章 章节标题", "第二章 章节标题"]}}
 """
-        return prompt
-    
-    def _parse_ai_response(self, ai_response, course_name):
-        """解析AI响应，提取JSON数据"""
+        for _ in range(self.GENERATION_ATTEMPTS):
+            data = self._extract_json(self.ai_service._make_request(prompt, max_tokens=self.OUTLINE_MAX_TOKENS))
+            chapters = data.get('章节') if isinstance(data, dict) else data
+            if isinstance(chapters, dict):
+                chapters = list(chapters.keys())
+            outline = self._clean_names(chapters, max_count=self.MAX_CHAPTERS)
+            if outline:
+                return outline
+            current_app.logger.warning(f"章节大纲格式无效，重试: {course_name}")
+        return None
+
+    def _generate_chapter(self, course_name, description, outline, chapter_name):
+        """第二阶段：生成单个章节的主要概念和知识点，校验失败时重试"""
+        outline_text = '\n'.join(f'- {name}' for name in outline)
+        prompt = f"""
+作为一名资深的教育专家和课程设计师，请为"{course_name}"课程的章节"{chapter_name}"设计知识点。
+
+课程描述：{description if description else '无'}
+
+课程完整大纲（请避免与其他章节内容重复）：
+{outline_text}
+
+要求：
+1. 包含3-5个主要概念(mainConcepts)，概念应该是理论性的核心概念
+2. 包含3-6个主要知识点(mainContents)，知识点应该是具体的技能或应用点
+3. 内容要准确、符合本科教学水平，命名清晰具体，便于生成包含表格、流程图和实例的讲解
+4. 必须返回有效的JSON格式，不要包含任何其他文字说明
+
+请严格按照以下JSON格式返回：
+{{"mainConcepts": ["概念1", "概念2", "概念3"], "mainContents": ["知识点1", "知识点2", "知识点3"]}}
+"""
+        for _ in range(self.GENERATION_ATTEMPTS):
+            data = self._extract_json(self.ai_service._make_request(prompt, max_tokens=self.CHAPTER_MAX_TOKENS))
+            if isinstance(data, dict) and len(data) == 1 and isinstance(next(iter(data.values())), dict):
+                data = next(iter(data.values()))  # 兼容包了一层章节名的返回
+            if isinstance(data, dict):
+                concepts = self._clean_names(data.get('mainConcepts'), max_count=self.MAX_ITEMS)
+                contents = self._clean_names(data.get('mainContents'), max_count=self.MAX_ITEMS)
+                if concepts and contents:
+                    return {'mainConcepts': concepts, 'mainContents': contents}
+            current_app.logger.warning(f"章节内容格式无效，重试: {chapter_name}")
+        return None
+
+    def _pregenerate_explanations(self, course_name, knowledge_data, progress_callback):
+        """为新课程预生成讲解（跳过已有缓存的知识点，重复出现的概念只生成一次）
+
+        与 LearningService 的批量生成共用课程级的锁，同一课程同时只有一个任务生成讲解；
+        在锁内检查缓存，等待期间其他任务已生成的条目会被跳过。
+        """
+        items = []
+        for chapter_name, chapter_data in knowledge_data['章节'].items():
+            for concept_type, key in (('concept', 'mainConcepts'), ('content', 'mainContents')):
+                for concept in chapter_data[key]:
+                    items.append((chapter_name, concept, concept_type))
+
+        groups = None
+        if current_app.config.get('CONCEPT_DEDUP_ENABLED', True):
+            if current_app.config.get('CONCEPT_DEDUP_CROSS_COURSE', False):
+                groups = ConceptRegistry().get(course_name, cross_course=True)
+            else:
+                groups = ConceptGroups([(course_name, KnowledgeBase(knowledge_data))])
+
+        with exclusive(f'explanations:{course_name}', '等待同一课程的其他讲解生成任务完成'):
+            if cancelled():
+                return {'total': 0, 'success_count': 0, 'error_count': 0, 'ai_calls_saved': 0, 'cancelled': True}
+
+            # 组内任一出现位置已有缓存即可共享，无需生成
+            missing = [item for item in items if not any(
+                os.path.exists(self.explanation_cache.get_cache_path(chapter, concept))
+                for chapter, concept, _ in lookup_order(groups, course_name, *item)
+            )]
+            if groups is not None:
+                pending, _ = groups.plan(course_name, missing)
+            else:
+                pending = missing
+            saved = len(missing) - len(pending)
+
+            if not pending:
+                return {'total': 0, 'success_count': 0, 'error_count': 0, 'ai_calls_saved': saved}
+
+            success_count = 0
+            error_count = 0
+
+            def on_progress(current, total, chapter, concept, error=None):
+                progress_callback(current, total, f'正在生成讲解 {current}/{total}: {chapter} - {concept}')
+
+            results = self.ai_service.batch_generate_explanations(pending, on_progress, course_name)
+            for result in results.values():
+                if result['success']:
+                    self.explanation_cache.save(result['chapter'], result['concept'], result['explanation'])
+                    success_count += 1
+                else:
+                    error_count += 1
+
+        return {'total': len(pending), 'success_count': success_count, 'error_count': error_count,
+                'ai_calls_saved': saved}
+
+    @staticmethod
+    def _extract_json(ai_response):
+        """从AI响应中提取JSON，失败时返回 None"""
+        if not ai_response or ai_response.startswith("抱歉") or ai_response.startswith("无法连接"):
+            return None
+        text = ai_response.strip()
+        fence_match = re.search(r'```(?:json)?\s*(.*?)\s*```', text, re.DOTALL | re.IGNORECASE)
+        if fence_match:
+            text = fence_match.group(1)
         try:
-            # 尝试直接解析JSON
-            if ai_response.strip().startswith('{'):
-                return json.loads(ai_response.strip())
-            
-            # 查找JSON块
-            import re
-            json_match = re.search(r'\{.*\}', ai_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                return json.loads(json_str)
-            
-            # 如果找不到有效JSON，返回基础结构
-            current_app.logger.warning("AI响应中未找到有效JSON，使用基础结构")
-            return {
-                "科目": course_name,
-                "章节": {
-                    f"第一章 {course_name}概述": {
-                        "mainConcepts": [
-                            "基本概念",
-                            "发展历史",
-                            "应用领域"
-                        ],
-                        "mainContents": [
-                            "基础知识",
-                            "核心原理",
-                            "实际应用"
-                        ]
-                    }
-                }
-            }
-            
+            return json.loads(text)
         except json.JSONDecodeError as e:
-            current_app.logger.error(f"JSON解析失败: {e}")
-            current_app.logger.error(f"AI响应内容: {ai_response[:500]}...")
-            return None
-        except Exception as e:
-            current_app.logger.error(f"解析AI响应失败: {e}")
-            return None
+            error = e
+        # 响应前后夹杂说明文字时，从第一个能完整解析的对象或数组开始读取
+        decoder = json.JSONDecoder()
+        for match in re.finditer(r'[\[{]', text):
+            try:
+                return decoder.raw_decode(text, match.start())[0]
+            except json.JSONDecodeError:
+                continue
+        current_app.logger.warning(f"JSON解析失败: {error}; 响应内容: {ai_response[:200]}...")
+        return None
+
+    @staticmethod
+    def _clean_names(values, max_count):
+        """清理名称列表：去除空白、非字符串及重复项"""
+        if not isinstance(values, list):
+            return []
+        names = []
+        for value in values:
+            if isinstance(value, str):
+                name = value.strip()
+                if name and name not in names:
+                    names.append(name)
+        return names[:max_count]
     
     def delete_course(self, course_name):
         """删除课程"""
@@ -183,6 +308,49 @@ class CourseService:
                 'error': str(e)
             }
     
+    def import_syllabus(self, source_path, course_name, fmt, overwrite=False, progress_callback=None):
+        """流式导入 CSV/JSON Lines 课程大纲（在后台任务中执行，完成后删除上传的临时文件）"""
+        try:
+            result = import_syllabus(source_path, course_name, fmt, overwrite=overwrite,
+                                     progress_callback=progress_callback)
+            current_app.logger.info(
+                f"课程大纲已导入: {course_name} ({result['chapters']} 章, "
+                f"{result['concepts'] + result['contents']} 个知识点, {result['error_count']} 行无效)"
+            )
+            return result
+        except SyllabusImportError as e:
+            return {'success': False, 'error': str(e)}
+        except Exception as e:
+            current_app.logger.error(f"导入课程大纲失败: {e}")
+            return {'success': False, 'error': f"导入课程大纲失败: {str(e)}"}
+        finally:
+            if os.path.exists(source_path):
+                os.remove(source_path)
+
+    def get_course_versions(self, course_name):
+        """获取课程的版本历史"""
+        if not CourseRegistry().get_entry(course_name):
+            return {'success': False, 'error': '课程不存在'}
+        return {'success': True, 'course_name': course_name, **CourseVersionService().history(course_name)}
+
+    def sync_course_version(self, course_name, regenerate=None):
+        """立即比较课程文件与上一版本（未启用文件监视时使用）"""
+        entry = CourseRegistry().get_entry(course_name)
+        if not entry:
+            return {'success': False, 'error': '课程不存在'}
+        try:
+            # 加载时的回调可能已经处理了本次变化，此时附上最近一次变更记录
+            knowledge_base = KnowledgeBaseCache().get(entry['file'])
+            version_service = CourseVersionService()
+            result = version_service.sync(course_name, knowledge_base, regenerate=regenerate)
+            if not result.get('changed'):
+                history = version_service.history(course_name)['history']
+                result['latest'] = history[-1] if history else None
+            return result
+        except Exception as e:
+            current_app.logger.error(f"同步课程版本失败: {e}")
+            return {'success': False, 'error': f"同步课程版本失败: {str(e)}"}
+
     def get_course_knowledge_base(self, course_name):
         """获取课程知识库"""
         try:
@@ -198,27 +366,135 @@ class CourseService:
     def validate_course_data(self, knowledge_data):
         """验证课程数据格式"""
         try:
-            if not isinstance(knowledge_data, dict):
-                return False
-            
-            if '科目' not in knowledge_data or '章节' not in knowledge_data:
-                return False
-            
-            chapters = knowledge_data['章节']
-            if not isinstance(chapters, dict):
-                return False
-            
-            for chapter_name, chapter_data in chapters.items():
-                if not isinstance(chapter_data, dict):
-                    return False
-                
-                if 'mainConcepts' not in chapter_data or 'mainContents' not in chapter_data:
-                    return False
-                
-                if not isinstance(chapter_data['mainConcepts'], list) or \
-                   not isinstance(chapter_data['mainContents'], list):
-                    return False
-            
-            return True
+            return validate_knowledge_data(knowledge_data)
         except Exception:
             return False
+
+    def export_course_pack(self, course_name, output_path):
+        """导出课程包（知识库、讲解及其渲染HTML、题库及带哈希的清单）"""
+        try:
+            course = Course.get_course_by_name(course_name)
+            if not course:
+                return {'success': False, 'error': '课程不存在'}
+
+            with open(course.filename, 'rb') as f:
+                knowledge_bytes = f.read()
+            knowledge_data = json.loads(knowledge_bytes.decode('utf-8'))
+
+            manifest = {
+                'course_name': course.name,
+                'description': course.description,
+                'source_file': os.path.basename(course.filename),
+                'knowledge_sha256': hashlib.sha256(knowledge_bytes).hexdigest()
+            }
+
+            explanation_count = 0
+            output_dir = os.path.dirname(os.path.abspath(output_path))
+            os.makedirs(output_dir, exist_ok=True)
+
+            with CoursePackWriter(output_path, manifest) as writer:
+                writer.add(KNOWLEDGE_ENTRY, knowledge_bytes)
+
+                question_bank_file = current_app.config.get('TEST_MODEL_FILE', 'testmodel.json')
+                if os.path.exists(question_bank_file):
+                    with open(question_bank_file, 'rb') as f:
+                        writer.add(QUESTION_BANK_ENTRY, f.read())
+
+                for chapter_name, chapter_data in knowledge_data.get('章节', {}).items():
+                    items = chapter_data.get('mainConcepts', []) + chapter_data.get('mainContents', [])
+                    for item in items:
+                        entry_name = EXPLANATION_PREFIX + ExplanationCache.get_cache_filename(chapter_name, item)
+                        if entry_name in writer.entries:
+                            continue
+                        explanation = self.explanation_cache.load(chapter_name, item)
+                        if explanation:
+                            writer.add(entry_name, explanation)
+                            writer.add(EXPLANATION_PREFIX + ExplanationCache.get_html_filename(chapter_name, item),
+                                       self.explanation_cache.load_html(chapter_name, item, explanation))
+                            explanation_count += 1
+
+                writer.manifest['explanation_count'] = explanation_count
+
+            current_app.logger.info(f"课程包已导出: {output_path} ({explanation_count} 个讲解)")
+            return {
+                'success': True,
+                'file_path': output_path,
+                'explanation_count': explanation_count
+            }
+
+        except Exception as e:
+            current_app.logger.error(f"导出课程包失败: {e}")
+            return {
+                'success': False,
+                'error': f"导出课程包失败: {str(e)}"
+            }
+
+    def import_course_pack(self, pack_path, overwrite=False):
+        """导入课程包：校验后挂载到 data/packs，讲解直接从包内读取"""
+        os.makedirs(PACKS_DIR, exist_ok=True)
+        staging_path = os.path.join(PACKS_DIR, f".import_{os.getpid()}_{os.path.basename(pack_path)}.tmp")
+
+        try:
+            shutil.copyfile(pack_path, staging_path)
+
+            with CoursePack(staging_path) as pack:
+                corrupted = pack.verify()
+                if corrupted:
+                    raise CoursePackError(f"课程包校验失败: {', '.join(corrupted[:5])}")
+
+                course_name = pack.course_name
+                knowledge_data = pack.read_json(KNOWLEDGE_ENTRY)
+                if not course_name or not self.validate_course_data(knowledge_data):
+                    raise CoursePackError("课程包中的知识库格式无效")
+
+                # 写入课程文件（默认课程对应 kownlgebase.json）
+                default_course = Course.get_default_course()
+                if course_name == default_course.name:
+                    course_file = default_course.filename
+                else:
+                    course_file = Course.get_course_filename(course_name)
+
+                knowledge_bytes = pack.read(KNOWLEDGE_ENTRY)
+                if os.path.exists(course_file) and not overwrite:
+                    with open(course_file, 'rb') as f:
+                        if f.read() != knowledge_bytes:
+                            raise CoursePackError(f"课程 \"{course_name}\" 已存在，如需覆盖请使用 overwrite")
+                else:
+                    os.makedirs(os.path.dirname(course_file) or '.', exist_ok=True)
+                    temp_file = f"{course_file}.tmp"
+                    with open(temp_file, 'wb') as f:
+                        f.write(knowledge_bytes)
+                    os.replace(temp_file, course_file)
+
+                question_bank_file = current_app.config.get('TEST_MODEL_FILE', 'testmodel.json')
+                question_bank = pack.read(QUESTION_BANK_ENTRY)
+                if question_bank is not None and not os.path.exists(question_bank_file):
+                    with open(question_bank_file, 'wb') as f:
+                        f.write(question_bank)
+
+                explanation_count = len([name for name in pack.names(EXPLANATION_PREFIX)
+                                         if name.endswith('.txt')])
+
+            final_path = os.path.join(PACKS_DIR, pack_filename(course_name))
+            os.replace(staging_path, final_path)
+            CoursePackRegistry().refresh(force=True)
+            CourseRegistry().refresh(force=True)
+
+            current_app.logger.info(f"课程包已导入: {course_name} ({explanation_count} 个讲解)")
+            return {
+                'success': True,
+                'course_name': course_name,
+                'course_file': course_file,
+                'pack_file': final_path,
+                'explanation_count': explanation_count
+            }
+
+        except Exception as e:
+            current_app.logger.error(f"导入课程包失败: {e}")
+            return {
+                'success': False,
+                'error': f"导入课程包失败: {str(e)}"
+            }
+        finally:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
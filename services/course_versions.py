@@ -0,0 +1,359 @@
+"""
+课程版本管理 - 课程知识库变化时按差异迁移或失效讲解缓存
+
+每门课程在 data/course_versions/<课程>/ 下保存最近几个版本的知识库快照和变更历史。
+课程文件（重新）加载后与上一个快照比较，得到新增、删除、重命名和跨章节移动的知识点：
+移动和重命名的讲解迁移到新位置，删除的讲解随之删除，只有真正新增的知识点才排队生成讲解。
+题库文件（testmodel.json）只保存考试题型模板，没有按知识点保存的题目，因此无需迁移。
+"""
+import os
+import json
+import time
+import difflib
+from datetime import datetime, timezone
+from flask import current_app
+from models.course import CourseRegistry
+from models.knowledge import KnowledgeBase, KnowledgeBaseCache
+from services.concept_registry import ConceptGroups, canonical_key, lookup_order
+from services.explanation_cache import ExplanationCache
+
+VERSIONS_DIR = 'data/course_versions'
+STATE_FILE = 'state.json'
+MAX_SNAPSHOTS = 5
+MAX_HISTORY = 20
+CLAIM_TIMEOUT = 300          # 处理中标记超过该时间（秒）视为中断，允许其他进程接管
+RENAME_SIMILARITY = 0.6      # 同章节同类型的删除/新增条目名称相似度达到该值视为重命名
+
+
+def knowledge_items(knowledge_base):
+    """按章节顺序列出知识库条目 [(章节, 名称, 类型)]，同一章节内同名条目只保留一次"""
+    items = []
+    for chapter in knowledge_base.get_chapters():
+        seen = set()
+        for item_type, names in (('concept', knowledge_base.get_concepts(chapter)),
+                                 ('content', knowledge_base.get_contents(chapter))):
+            for name in names:
+                if name not in seen:
+                    seen.add(name)
+                    items.append((chapter, name, item_type))
+    return items
+
+
+def _item_dict(item):
+    return {'chapter': item[0], 'name': item[1], 'type': item[2]}
+
+
+def diff_knowledge(old_kb, new_kb):
+    """比较两个版本的知识库
+
+    返回 {'added', 'removed', 'renamed', 'moved', 'unchanged'}：
+    - moved：规范化名称相同但所在章节变化（包括章节改名），或同章节内仅写法变化；
+    - renamed：同一章节（章节改名时按改名后的章节）、同类型、名称相似的删除/新增条目；
+    - added / removed：其余真正新增或删除的条目。
+    """
+    old_items = knowledge_items(old_kb)
+    new_items = knowledge_items(new_kb)
+    old_keys = {item[:2] for item in old_items}
+    new_keys = {item[:2] for item in new_items}
+
+    removed = [item for item in old_items if item[:2] not in new_keys]
+    added = [item for item in new_items if item[:2] not in old_keys]
+
+    # 规范化名称相同的条目视为移动
+    added_by_key = {}
+    for item in added:
+        added_by_key.setdefault(canonical_key(item[1]), []).append(item)
+    moved = []
+    remaining_removed = []
+    for item in removed:
+        candidates = added_by_key.get(canonical_key(item[1]))
+        if candidates:
+            # 优先匹配同章节（仅写法变化），其次按出现顺序
+            match = next((candidate for candidate in candidates if candidate[0] == item[0]), candidates[0])
+            candidates.remove(match)
+            moved.append((item, match))
+        else:
+            remaining_removed.append(item)
+    moved_targets = {target for _, target in moved}
+    remaining_added = [item for item in added if item not in moved_targets]
+
+    # 章节改名：旧章节已不存在时，按其条目移动到的章节确定新章节
+    chapter_map = {}
+    votes = {}
+    for source, target in moved:
+        if not new_kb.has_chapter(source[0]):
+            votes.setdefault(source[0], {}).setdefault(target[0], 0)
+            votes[source[0]][target[0]] += 1
+    for old_chapter, targets in votes.items():
+        chapter_map[old_chapter] = max(targets, key=targets.get)
+
+    # 同章节同类型、名称相似的删除/新增条目视为重命名，按相似度从高到低贪心配对
+    pairs = []
+    for source in remaining_removed:
+        chapter = chapter_map.get(source[0], source[0])
+        for target in remaining_added:
+            if target[0] == chapter and target[2] == source[2]:
+                ratio = difflib.SequenceMatcher(None, source[1], target[1]).ratio()
+                if ratio >= RENAME_SIMILARITY:
+                    pairs.append((ratio, source, target))
+    pairs.sort(key=lambda pair: -pair[0])
+
+    renamed = []
+    paired_sources = set()
+    paired_targets = set()
+    for _, source, target in pairs:
+        if source in paired_sources or target in paired_targets:
+            continue
+        paired_sources.add(source)
+        paired_targets.add(target)
+        renamed.append((source, target))
+
+    return {
+        'added': [_item_dict(item) for item in remaining_added if item not in paired_targets],
+        'removed': [_item_dict(item) for item in remaining_removed if item not in paired_sources],
+        'renamed': [{'from': _item_dict(source), 'to': _item_dict(target)} for source, target in renamed],
+        'moved': [{'from': _item_dict(source), 'to': _item_dict(target)} for source, target in moved],
+        'unchanged': len(old_keys & new_keys)
+    }
+
+
+def versions_dirname(course_name):
+    """课程版本目录名（替换文件名中的非法字符）"""
+    safe_name = course_name
+    for char in ('/', '\\', ':', '*', '?', '"', '<', '>', '|'):
+        safe_name = safe_name.replace(char, '_')
+    return safe_name
+
+
+class CourseVersionService:
+    """课程版本服务"""
+
+    def __init__(self, versions_dir=None, explanation_cache=None):
+        self.versions_dir = versions_dir or VERSIONS_DIR
+        self.explanation_cache = explanation_cache or ExplanationCache()
+        self.knowledge_cache = KnowledgeBaseCache()
+
+    def sync_file(self, path, knowledge_base):
+        """课程文件加载后的回调：找到对应课程并同步版本"""
+        path = os.path.abspath(path)
+        for entry in CourseRegistry().list_entries():
+            if os.path.abspath(entry['file']) == path:
+                return self.sync(entry['name'], knowledge_base)
+        return None
+
+    def sync(self, course_name, knowledge_base, regenerate=None):
+        """将课程的当前版本与上一个快照比较，迁移或失效受影响的讲解缓存
+
+        regenerate 为 None 时按配置 COURSE_REGENERATE_NEW_ITEMS 决定是否为新增知识点排队生成讲解。
+        """
+        course_dir = os.path.join(self.versions_dir, versions_dirname(course_name))
+        state = self._load_state(course_dir)
+        version = knowledge_base.version_tag
+        if state.get('current') == version:
+            return {'success': True, 'changed': False, 'version': version}
+
+        os.makedirs(course_dir, exist_ok=True)
+        if not self._claim(course_dir, version):
+            # 其他进程正在处理同一版本
+            return {'success': True, 'changed': False, 'version': version, 'pending': True}
+
+        try:
+            # 认领前读取的状态可能已过期：其他进程可能刚处理完同一版本并释放了认领
+            state = self._load_state(course_dir)
+            if state.get('current') == version:
+                return {'success': True, 'changed': False, 'version': version}
+
+            old_knowledge_base = self._load_snapshot(course_dir, state.get('current'))
+            self._save_snapshot(course_dir, version, knowledge_base)
+            now = datetime.now(timezone.utc).isoformat()
+
+            if old_knowledge_base is None:
+                state['current'] = version
+                state.setdefault('history', []).append({'version': version, 'at': now, 'baseline': True})
+                self._save_state(course_dir, state)
+                return {'success': True, 'changed': False, 'version': version, 'baseline': True}
+
+            diff = diff_knowledge(old_knowledge_base, knowledge_base)
+            applied = self._apply_diff(course_name, knowledge_base, diff)
+            pending = self._missing_explanations(course_name, knowledge_base, diff['added'])
+
+            summary = {
+                'added': len(diff['added']),
+                'removed': len(diff['removed']),
+                'renamed': len(diff['renamed']),
+                'moved': len(diff['moved']),
+                'unchanged': diff['unchanged'],
+                **applied,
+                'regenerate': len(pending)
+            }
+            record = {'from': state.get('current'), 'version': version, 'at': now, 'summary': summary, 'diff': diff}
+
+            if regenerate is None:
+                regenerate = current_app.config.get('COURSE_REGENERATE_NEW_ITEMS', True)
+            if regenerate and pending:
+                from services.task_service import TaskService
+                record['task_id'] = TaskService().enqueue('regenerate_course_items', course_name, pending)
+
+            state['current'] = version
+            state['history'] = (state.get('history', []) + [record])[-MAX_HISTORY:]
+            self._save_state(course_dir, state)
+            self._prune_snapshots(course_dir, state)
+
+            current_app.logger.info(f"课程 {course_name} 版本变化 {record['from']} -> {version}: {summary}")
+            return {'success': True, 'changed': True, **record}
+        finally:
+            self._release(course_dir, version)
+
+    def regenerate(self, course_name, items, progress_callback=None):
+        """为新增知识点生成讲解（在后台任务中执行，重复概念只生成一次）"""
+        from services.learning_service import LearningService
+
+        def batch_progress_callback(current, total, chapter_name, concept_name, error=None):
+            if progress_callback:
+                progress_callback({
+                    'current': current,
+                    'total': total,
+                    'chapter': chapter_name,
+                    'concept': concept_name,
+                    'error': error,
+                    'percentage': round((current / total) * 100, 1)
+                })
+
+        return LearningService()._run_batch(course_name, [tuple(item) for item in items], batch_progress_callback)
+
+    def history(self, course_name):
+        """课程的版本历史"""
+        state = self._load_state(os.path.join(self.versions_dir, versions_dirname(course_name)))
+        return {'current': state.get('current'), 'history': state.get('history', [])}
+
+    def _apply_diff(self, course_name, knowledge_base, diff):
+        """迁移移动/重命名条目的讲解，删除已删除条目的讲解
+
+        讲解文件名不区分课程，其他课程仍在使用的文件只复制不删除。
+        """
+        shared = self._other_course_items(course_name)
+        rekeyed = 0
+        invalidated = 0
+
+        for change in diff['moved'] + diff['renamed']:
+            source = (change['from']['chapter'], change['from']['name'])
+            target = (change['to']['chapter'], change['to']['name'])
+            if self._rekey(source, target, shared):
+                rekeyed += 1
+
+        # 删除的条目若仍有同名条目留在课程中，讲解迁移给新的规范条目（去重后共享的讲解不丢失）
+        groups = ConceptGroups([(course_name, knowledge_base)])
+        for item in diff['removed']:
+            source = (item['chapter'], item['name'])
+            occurrences = groups.groups.get(canonical_key(item['name']))
+            if occurrences and self._rekey(source, (occurrences[0].chapter, occurrences[0].name), shared):
+                rekeyed += 1
+            elif source not in shared and self.explanation_cache.delete(*source):
+                invalidated += 1
+
+        return {'rekeyed': rekeyed, 'invalidated': invalidated}
+
+    def _rekey(self, source, target, shared):
+        """把讲解从 source 迁移到 target；target 已有讲解时只删除 source"""
+        explanation = self.explanation_cache.load(*source)
+        if explanation is None:
+            return False
+        if not os.path.exists(self.explanation_cache.get_cache_path(*target)):
+            self.explanation_cache.save(*target, explanation)
+        if source not in shared:
+            self.explanation_cache.delete(*source)
+        return True
+
+    def _missing_explanations(self, course_name, knowledge_base, added):
+        """新增条目中没有任何可共享讲解的条目"""
+        groups = ConceptGroups([(course_name, knowledge_base)])
+        pending = []
+        for item in added:
+            order = lookup_order(groups, course_name, item['chapter'], item['name'], item['type'])
+            if not any(self.explanation_cache.load(chapter, name) for chapter, name, _ in order):
+                pending.append((item['chapter'], item['name'], item['type']))
+        return pending
+
+    def _other_course_items(self, course_name):
+        """其他课程的全部 (章节, 名称)"""
+        items = set()
+        for entry in CourseRegistry().list_entries():
+            if entry['name'] == course_name:
+                continue
+            try:
+                knowledge_base = self.knowledge_cache.get(entry['file'])
+            except Exception as e:
+                current_app.logger.warning(f"加载课程 {entry['name']} 知识库失败: {e}")
+                continue
+            items.update(item[:2] for item in knowledge_items(knowledge_base))
+        return items
+
+    @staticmethod
+    def _claim(course_dir, version):
+        """跨进程认领某个版本的处理（多个 worker 同时发现变化时只处理一次）"""
+        claim_file = os.path.join(course_dir, f"{version}.claim")
+        try:
+            fd = os.open(claim_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(claim_file) < CLAIM_TIMEOUT:
+                    return False
+                os.remove(claim_file)
+                fd = os.open(claim_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError:
+                return False
+        os.close(fd)
+        return True
+
+    @staticmethod
+    def _release(course_dir, version):
+        try:
+            os.remove(os.path.join(course_dir, f"{version}.claim"))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _load_state(course_dir):
+        try:
+            with open(os.path.join(course_dir, STATE_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _save_state(course_dir, state):
+        path = os.path.join(course_dir, STATE_FILE)
+        temp_file = f"{path}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, path)
+
+    @staticmethod
+    def _load_snapshot(course_dir, version):
+        if not version:
+            return None
+        try:
+            with open(os.path.join(course_dir, f"{version}.json"), 'r', encoding='utf-8') as f:
+                return KnowledgeBase(data=json.load(f), version=version)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _save_snapshot(course_dir, version, knowledge_base):
+        path = os.path.join(course_dir, f"{version}.json")
+        temp_file = f"{path}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(knowledge_base.to_dict(), f, ensure_ascii=False)
+        os.replace(temp_file, path)
+
+    @staticmethod
+    def _prune_snapshots(course_dir, state):
+        """只保留最近 MAX_SNAPSHOTS 个版本的快照"""
+        keep = []
+        for record in reversed(state.get('history', [])):
+            if record['version'] not in keep:
+                keep.append(record['version'])
+        keep = set(keep[:MAX_SNAPSHOTS])
+        for filename in os.listdir(course_dir):
+            if filename.endswith('.json') and filename != STATE_FILE and filename[:-len('.json')] not in keep:
+                os.remove(os.path.join(course_dir, filename))
@@ -0,0 +1,195 @@
+"""
+课程预热 - 切换课程后在后台把该课程加载进进程内的各级缓存
+
+依次预热：解析后的知识库与章节列表、搜索索引、输入联想树、规范概念分组、
+相关知识点向量、按访问次数排在前面的讲解（原文与HTML）以及考试模板，
+预热作为系统任务执行，状态保存在共享的任务存储中，前端按任务 id 查询，
+请求落在哪个工作进程都能得到同一状态，据此提示课程切换何时完全就绪。
+缓存是每个工作进程各自持有的，预热只作用于处理切换请求的进程，
+其他工作进程在首次请求该课程时按需加载。
+"""
+import time
+import threading
+from flask import current_app
+from models.course import CourseRegistry
+from models.exam import ExamModel
+from models.knowledge import KnowledgeBaseCache
+from services.concept_registry import ConceptRegistry
+from services.explanation_cache import ExplanationCache
+from services.related_index import RelatedIndex
+from services.search_index import SearchIndex
+from services.suggest_index import SuggestIndex
+from services.task_service import TaskService
+from services.task_store import TERMINAL_STATUSES
+
+STEPS = (
+    ('knowledge_base', '解析课程知识库'),
+    ('search_index', '构建搜索索引'),
+    ('suggest_index', '构建输入联想'),
+    ('concept_registry', '整理重复概念'),
+    ('related_index', '加载相关知识点'),
+    ('explanations', '加载常用讲解'),
+    ('exam_template', '加载考试模板'),
+)
+
+# 任务状态 -> 预热状态
+TASK_STATES = {
+    'pending': 'pending',
+    'running': 'running',
+    'paused': 'running',
+    'completed': 'ready',
+    'failed': 'failed',
+    'cancelled': 'failed',
+}
+
+
+class CourseWarmupService:
+    """课程预热服务（进程级单例）"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(CourseWarmupService, cls).__new__(cls)
+                cls._instance._initialized = False
+            return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.tasks = {}  # {课程名称: 本进程最近一次提交的预热任务 id}
+        self._status_lock = threading.Lock()
+        self._initialized = True
+
+    def start(self, course_name):
+        """提交课程预热任务；本进程中该课程正在预热时直接返回当前状态"""
+        with self._status_lock:
+            task_id = self.tasks.get(course_name)
+            if task_id is not None:
+                status = self.get_status(course_name, task_id)
+                if status['state'] in ('pending', 'running'):
+                    return status
+
+            task_id = TaskService().submit_task(self.warm, course_name)
+            self.tasks[course_name] = task_id
+        return self.get_status(course_name, task_id)
+
+    def get_status(self, course_name, task_id=None):
+        """返回预热状态
+
+        状态来自所有工作进程共享的任务存储，按 task_id 查询时任意进程都能返回同一结果；
+        未指定 task_id 时使用本进程最近一次提交的预热任务。本进程从未预热过该课程时 state 为 idle，
+        任务不存在（已被清理）时为 unknown，二者都不表示课程已就绪。
+        """
+        task_id = task_id or self.tasks.get(course_name)
+        if task_id is None:
+            return {'course': course_name, 'state': 'idle', 'task_id': None, 'steps': {}}
+
+        task = TaskService().get_task(task_id)
+        if task is None or task['kind'] != 'warm':
+            return {'course': course_name, 'state': 'unknown', 'task_id': task_id, 'steps': {}}
+
+        result = task['result'] or {}
+        details = task['details'] or {}
+        return {
+            'course': result.get('course') or details.get('course') or course_name,
+            'state': TASK_STATES.get(task['status'], task['status']),
+            'task_id': task_id,
+            'progress': task['progress'],
+            'message': task['message'],
+            'steps': result.get('steps') or details.get('steps') or {},
+            'started_at': task['created_at'],
+            'finished_at': task['updated_at'] if task['status'] in TERMINAL_STATUSES else None,
+            'duration_ms': result.get('duration_ms'),
+            'error': task['error']
+        }
+
+    def warm(self, course_name, progress_callback=None):
+        """执行预热（在后台任务中运行），返回各步骤的结果与耗时"""
+        steps = {}
+        started = time.perf_counter()
+
+        try:
+            entry = CourseRegistry().get_entry(course_name)
+            if entry is None:
+                raise ValueError(f'课程不存在: {course_name}')
+
+            knowledge_base = None
+            for index, (step, label) in enumerate(STEPS):
+                if progress_callback:
+                    progress_callback({
+                        'percentage': int(index * 100 / len(STEPS)),
+                        'message': f'{label}...',
+                        'course': course_name,
+                        'step': step,
+                        'steps': dict(steps)
+                    })
+
+                step_started = time.perf_counter()
+                if step == 'knowledge_base':
+                    knowledge_base = KnowledgeBaseCache().get(entry['file'])
+                    result = self._warm_knowledge_base(knowledge_base)
+                else:
+                    try:
+                        result = getattr(self, f'_warm_{step}')(course_name, knowledge_base)
+                    except Exception as e:
+                        # 单个缓存预热失败不影响其他缓存，首次请求时仍会按需加载
+                        current_app.logger.warning(f"预热课程 {course_name} 的{label}失败: {e}")
+                        result = {'error': str(e)}
+                result['duration_ms'] = round((time.perf_counter() - step_started) * 1000, 1)
+                steps[step] = result
+        except Exception as e:
+            current_app.logger.error(f"预热课程 {course_name} 失败: {e}")
+            raise
+
+        duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        current_app.logger.info(f"课程 {course_name} 预热完成，用时 {duration_ms}ms")
+        return {'success': True, 'course': course_name, 'duration_ms': duration_ms, 'steps': steps}
+
+    @staticmethod
+    def _warm_knowledge_base(knowledge_base):
+        items = 0
+        for chapter in knowledge_base.get_chapters():
+            items += len(knowledge_base.get_all_concepts_and_contents(chapter))
+        return {'chapters': len(knowledge_base.get_chapters()), 'items': items}
+
+    @staticmethod
+    def _warm_search_index(course_name, knowledge_base):
+        SearchIndex().refresh([course_name])
+        return {}
+
+    @staticmethod
+    def _warm_suggest_index(course_name, knowledge_base):
+        return {'items': SuggestIndex().warm(course_name)}
+
+    @staticmethod
+    def _warm_concept_registry(course_name, knowledge_base):
+        if not current_app.config.get('CONCEPT_DEDUP_ENABLED', True):
+            return {'skipped': True}
+        groups = ConceptRegistry().get(
+            course_name, cross_course=current_app.config.get('CONCEPT_DEDUP_CROSS_COURSE', False)
+        )
+        return {'duplicate_groups': len(groups.duplicate_groups())}
+
+    @staticmethod
+    def _warm_related_index(course_name, knowledge_base):
+        return {'items': RelatedIndex().warm(course_name)}
+
+    @staticmethod
+    def _warm_explanations(course_name, knowledge_base):
+        limit = current_app.config.get('COURSE_WARMUP_EXPLANATIONS', 50)
+        items = [(chapter, name)
+                 for chapter in knowledge_base.get_chapters()
+                 for name in (*knowledge_base.get_concepts(chapter), *knowledge_base.get_contents(chapter))]
+
+        explanation_cache = ExplanationCache()
+        hottest = explanation_cache.hottest(items, limit)
+        warmed = sum(1 for chapter, name in hottest if explanation_cache.warm(chapter, name))
+        return {'candidates': len(hottest), 'warmed': warmed}
+
+    @staticmethod
+    def _warm_exam_template(course_name, knowledge_base):
+        return {'question_types': len(ExamModel().get_question_types())}
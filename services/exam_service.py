@@ -18,8 +18,8 @@ class ExamService:
         self.exam_model = ExamModel()
         self.ai_service = AIService()
     
-    def create_exam(self, username, selected_chapters, selected_types=None):
-        """创建考试"""
+    def create_exam(self, username, selected_chapters, selected_types=None, course_name=None):
+        """创建考试（后台任务中没有会话，需传入提交时的课程名称）"""
         try:
             # 确保在应用上下文中运行
             from flask import current_app
@@ -39,7 +39,7 @@ class ExamService:
             # 获取当前课程名称
             from services.settings_service import SettingsService
             settings_service = SettingsService()
-            current_course = settings_service.get_current_course()
+            current_course = course_name or settings_service.get_current_course(username)
             exam_name = f"{current_course}考试_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
 
             with sqlite3.connect(db_path) as conn:
@@ -94,7 +94,7 @@ class ExamService:
                 'error': f"创建考试失败: {str(e)}"
             }
     
-    def generate_questions(self, exam_id, use_ai=True):
+    def generate_questions(self, exam_id, use_ai=True, course_name=None):
         """生成题目"""
         try:
             # 获取考试记录（使用原生SQL）
@@ -135,7 +135,7 @@ class ExamService:
                 # 获取当前课程名称
                 from services.settings_service import SettingsService
                 settings_service = SettingsService()
-                current_course = settings_service.get_current_course()
+                current_course = course_name or settings_service.get_current_course()
 
                 for section in exam_paper['questions']:
                     current_app.logger.info(f"生成{section['type_name']}题目")
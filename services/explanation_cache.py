@@ -0,0 +1,290 @@
+"""
+讲解缓存服务 - 管理 data/explanations 下的讲解文件及已挂载课程包中的讲解
+
+每个讲解保存为 Markdown 原文(.txt)和写入时预渲染的 HTML(.html)两份，
+并同步更新讲解全文索引。本地讲解文件读取后保存在进程内 LRU 中（按文件 mtime/大小校验），
+讲解访问次数记录在 data/explanation_access.json，供切换课程时预热最常访问的讲解。
+"""
+import os
+import json
+import time
+import atexit
+import threading
+from collections import Counter, OrderedDict
+from flask import current_app
+from utils.course_pack import CoursePackRegistry, EXPLANATION_PREFIX
+from utils.markdown_renderer import render_markdown, is_current_render
+from services.explanation_search import ExplanationSearchIndex
+
+MEMORY_ITEMS = 512          # 进程内最多保留的讲解文件数
+ACCESS_LOG_FILE = 'data/explanation_access.json'
+ACCESS_FLUSH_INTERVAL = 60  # 访问计数写回文件的最小间隔（秒）
+
+
+class _MemoryFiles:
+    """讲解文件的进程内 LRU（进程级共享），文件变化后自动失效"""
+
+    def __init__(self, max_items=MEMORY_ITEMS):
+        self.max_items = max_items
+        self.files = OrderedDict()  # {路径: ((mtime_ns, size, inode), 内容)}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def read(self, path):
+        """读取文件内容；文件不存在时返回 None"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.discard(path)
+            return None
+        # 含 inode：重命名替换进来的文件即使 mtime 与大小相同也能识别
+        stat = (st.st_mtime_ns, st.st_size, st.st_ino)
+
+        with self._lock:
+            cached = self.files.get(path)
+            if cached is not None and cached[0] == stat:
+                self.files.move_to_end(path)
+                self.hits += 1
+                return cached[1]
+
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        with self._lock:
+            self.misses += 1
+            self.files[path] = (stat, content)
+            self.files.move_to_end(path)
+            while len(self.files) > self.max_items:
+                self.files.popitem(last=False)
+        return content
+
+    def contains(self, path):
+        return path in self.files
+
+    def discard(self, path):
+        with self._lock:
+            self.files.pop(path, None)
+
+    def stats(self):
+        return {'items': len(self.files), 'max_items': self.max_items, 'hits': self.hits, 'misses': self.misses}
+
+
+class ExplanationAccessLog:
+    """讲解访问计数（进程级单例）
+
+    计数先累加在内存中，间隔 ACCESS_FLUSH_INTERVAL 秒后与文件中的计数合并写回，
+    多个工作进程各自只写回自己的增量。
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(ExplanationAccessLog, cls).__new__(cls)
+                cls._instance._initialized = False
+            return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.path = ACCESS_LOG_FILE
+        self.counts = None       # 最近一次写回后的全部计数
+        self.pending = Counter()  # 尚未写回的增量
+        self.last_flush = time.time()
+        self._flush_lock = threading.Lock()
+        self._initialized = True
+        atexit.register(self.flush)
+
+    def _read_file(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return Counter({key: int(value) for key, value in data.items()})
+        except (OSError, ValueError, AttributeError):
+            return Counter()
+
+    def record(self, filename):
+        """记录一次访问，到达写回间隔时顺带写回"""
+        self.pending[filename] += 1
+        if time.time() - self.last_flush >= ACCESS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """将增量与文件中的计数合并后原子写回"""
+        with self._flush_lock:
+            pending, self.pending = self.pending, Counter()
+            counts = self._read_file()
+            counts.update(pending)
+            self.counts = counts
+            self.last_flush = time.time()
+            if not pending:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                temp_file = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(dict(counts), f, ensure_ascii=False)
+                os.replace(temp_file, self.path)
+            except OSError:
+                # 写回失败时保留增量，下次再写
+                self.pending.update(pending)
+
+    def hottest(self, filenames, limit):
+        """在给定的讲解文件中按访问次数取前 limit 个（未访问过的不返回）"""
+        self.flush()
+        counts = self.counts
+        ranked = sorted((name for name in set(filenames) if counts.get(name)),
+                        key=lambda name: counts[name], reverse=True)
+        return ranked[:limit]
+
+
+class ExplanationCache:
+    """讲解缓存类"""
+
+    CACHE_DIR = 'data/explanations'
+    memory = _MemoryFiles()
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or self.CACHE_DIR
+        self.pack_registry = CoursePackRegistry()
+        # 只有默认缓存目录与全文索引对应
+        self.search_index = ExplanationSearchIndex.default() if self.cache_dir == self.CACHE_DIR else None
+
+    @staticmethod
+    def get_cache_filename(chapter, concept):
+        """生成缓存文件名（替换文件名中的非法字符）"""
+        safe_filename = f"{chapter}_{concept}.txt"
+        for char in ('/', '\\', ':', '*', '?', '"', '<', '>', '|'):
+            safe_filename = safe_filename.replace(char, '_')
+        return safe_filename
+
+    @staticmethod
+    def get_html_filename(chapter, concept):
+        """生成预渲染HTML缓存文件名"""
+        return ExplanationCache.get_cache_filename(chapter, concept)[:-len('.txt')] + '.html'
+
+    def get_cache_path(self, chapter, concept):
+        """获取缓存文件路径"""
+        return os.path.join(self.cache_dir, self.get_cache_filename(chapter, concept))
+
+    def get_html_path(self, chapter, concept):
+        """获取预渲染HTML缓存文件路径"""
+        return os.path.join(self.cache_dir, self.get_html_filename(chapter, concept))
+
+    def load(self, chapter, concept):
+        """加载讲解，本地文件优先，其次查找已挂载的课程包"""
+        cache_file = self.get_cache_path(chapter, concept)
+        content = self.memory.read(cache_file)
+        if content is not None:
+            current_app.logger.info(f"从缓存加载讲解: {cache_file}")
+            return content
+
+        data = self.pack_registry.find(EXPLANATION_PREFIX + self.get_cache_filename(chapter, concept))
+        if data is not None:
+            current_app.logger.info(f"从课程包加载讲解: {chapter} - {concept}")
+            return data.decode('utf-8')
+
+        return None
+
+    def modified_at(self, chapter, concept):
+        """本地讲解文件的修改时间（不存在时为 None）"""
+        try:
+            return os.stat(self.get_cache_path(chapter, concept)).st_mtime
+        except OSError:
+            return None
+
+    def load_html(self, chapter, concept, explanation=None):
+        """加载预渲染的HTML；缺失或渲染器版本过期时重新渲染"""
+        html_file = self.get_html_path(chapter, concept)
+        rendered = self.memory.read(html_file)
+        if rendered is not None and is_current_render(rendered):
+            return rendered
+
+        local_explanation = os.path.exists(self.get_cache_path(chapter, concept))
+        if not local_explanation:
+            data = self.pack_registry.find(EXPLANATION_PREFIX + self.get_html_filename(chapter, concept))
+            if data is not None and is_current_render(data.decode('utf-8')):
+                return data.decode('utf-8')
+
+        if explanation is None:
+            explanation = self.load(chapter, concept)
+        if explanation is None:
+            return None
+
+        rendered = render_markdown(explanation)
+        if local_explanation:
+            # 为旧缓存补写HTML，之后的请求直接读取
+            self._write_file(html_file, rendered)
+        return rendered
+
+    def record_access(self, chapter, concept):
+        """记录一次讲解访问（用于预热最常访问的讲解）"""
+        ExplanationAccessLog().record(self.get_cache_filename(chapter, concept))
+
+    def hottest(self, items, limit):
+        """按访问次数返回 items（[(章节, 名称)]）中最常访问的前 limit 个"""
+        by_filename = {}
+        for chapter, concept in items:
+            by_filename.setdefault(self.get_cache_filename(chapter, concept), (chapter, concept))
+        return [by_filename[name] for name in ExplanationAccessLog().hottest(by_filename, limit)]
+
+    def warm(self, chapter, concept):
+        """将本地讲解及其HTML读入进程内缓存；没有本地讲解时返回 False"""
+        explanation = self.memory.read(self.get_cache_path(chapter, concept))
+        if explanation is None:
+            return False
+        self.load_html(chapter, concept, explanation)
+        return True
+
+    def save(self, chapter, concept, explanation):
+        """保存讲解到缓存文件，并在写入时渲染HTML"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        cache_file = self.get_cache_path(chapter, concept)
+        self._write_file(cache_file, explanation)
+        self._write_file(self.get_html_path(chapter, concept), render_markdown(explanation))
+        self._update_search_index(chapter, concept, explanation)
+
+        current_app.logger.info(f"讲解已缓存到: {cache_file}")
+        return cache_file
+
+    def delete(self, chapter, concept):
+        """删除讲解缓存文件"""
+        html_file = self.get_html_path(chapter, concept)
+        self.memory.discard(html_file)
+        if os.path.exists(html_file):
+            os.remove(html_file)
+
+        self._update_search_index(chapter, concept, None)
+
+        cache_file = self.get_cache_path(chapter, concept)
+        self.memory.discard(cache_file)
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
+            current_app.logger.info(f"删除讲解缓存: {cache_file}")
+            return True
+        return False
+
+    def _update_search_index(self, chapter, concept, explanation):
+        """同步全文索引；索引失败不影响讲解缓存本身"""
+        if self.search_index is None:
+            return
+        try:
+            if explanation is None:
+                self.search_index.remove(chapter, concept)
+            else:
+                self.search_index.upsert(chapter, concept, explanation)
+        except Exception as e:
+            current_app.logger.warning(f"更新讲解全文索引失败: {e}")
+
+    @classmethod
+    def _write_file(cls, path, content):
+        """先写临时文件再替换，避免并发读取到写了一半的内容"""
+        temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_file, path)
+        cls.memory.discard(path)
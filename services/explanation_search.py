@@ -0,0 +1,436 @@
+"""
+讲解全文检索 - 基于 SQLite FTS5（trigram 分词）的讲解正文索引
+
+索引保存在 data/explanations_fts.db，讲解缓存写入/重新生成/删除时同步更新；
+进程启动后首次检索或缓存目录、已挂载课程包变化时，会按文件 stat 与磁盘上的讲解文件
+及课程包中的讲解条目对账（与 ExplanationCache.load 一致，本地文件优先于课程包）。
+讲解文件名不区分课程，所属课程/章节/概念通过各课程知识库反查。
+
+性能测试：
+    python -m services.explanation_search benchmark --count 5000
+"""
+import os
+import html
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+from models.course import CourseRegistry
+from models.knowledge import KnowledgeBaseCache
+from utils.course_pack import CoursePackRegistry, EXPLANATION_PREFIX
+
+# 高亮标记先用控制字符占位，转义正文后再替换为 <mark>，避免讲解中的HTML被注入
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_END = '\x03'
+SNIPPET_TOKENS = 24
+SNIPPET_CHARS = 60
+
+# bm25 各列权重：course, chapter, concept, body, filename
+_BM25_WEIGHTS = '0.0, 0.0, 10.0, 1.0, 0.0'
+
+
+def _filename_for(chapter, concept):
+    # 与 ExplanationCache.get_cache_filename 保持一致（避免循环导入）
+    from services.explanation_cache import ExplanationCache
+    return ExplanationCache.get_cache_filename(chapter, concept)
+
+
+class ExplanationSearchIndex:
+    """讲解全文索引"""
+
+    DB_PATH = 'data/explanations_fts.db'
+    CACHE_DIR = 'data/explanations'
+    SYNC_INTERVAL = 2.0  # 两次目录对账检查的最小间隔（秒）
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, db_path=None, cache_dir=None):
+        self.db_path = db_path or self.DB_PATH
+        self.cache_dir = cache_dir or self.CACHE_DIR
+        self.knowledge_cache = KnowledgeBaseCache()
+        self.pack_registry = CoursePackRegistry()
+        self.available = True
+        self.error = None
+
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._synced_signature = None
+        self._last_sync_check = 0.0
+        self._owner_map = None
+        self._owner_signature = None
+
+        try:
+            self._init_schema()
+        except sqlite3.Error as e:
+            # SQLite 未编译 FTS5 或不支持 trigram 分词器
+            self.available = False
+            self.error = f"全文索引不可用: {e}"
+            print(self.error)
+
+    @classmethod
+    def default(cls):
+        """进程内共享的默认索引（data/explanations_fts.db）"""
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    # ---------- 数据库 ----------
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS explanation_fts USING fts5("
+                "course UNINDEXED, chapter UNINDEXED, concept, body, filename UNINDEXED, "
+                "tokenize='trigram')"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS indexed_files ("
+                "filename TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, owners TEXT)"
+            )
+            # FTS 表中 filename 列不建索引，按文件删除时通过此表定位 rowid
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS indexed_rows ("
+                "fts_rowid INTEGER PRIMARY KEY, filename TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_indexed_rows_filename ON indexed_rows (filename)")
+
+    # ---------- 所属课程反查 ----------
+
+    def _owners(self):
+        """构建 {缓存文件名: [(课程, 章节, 概念)]}，知识库版本变化时重建"""
+        entries = CourseRegistry().list_entries()
+        knowledge_bases = []
+        for entry in entries:
+            try:
+                knowledge_bases.append((entry['name'], self.knowledge_cache.get(entry['file'])))
+            except Exception as e:
+                print(f"加载课程 {entry['name']} 知识库失败: {e}")
+
+        signature = tuple((name, kb.version) for name, kb in knowledge_bases)
+        if signature != self._owner_signature:
+            owner_map = {}
+            for course_name, kb in knowledge_bases:
+                for chapter in kb.get_chapters():
+                    for concept in kb.get_concepts(chapter) + kb.get_contents(chapter):
+                        owners = owner_map.setdefault(_filename_for(chapter, concept), [])
+                        if not any(owner[0] == course_name for owner in owners):
+                            owners.append((course_name, chapter, concept))
+            self._owner_map = owner_map
+            self._owner_signature = signature
+        return self._owner_map
+
+    def _resolve(self, filename, chapter=None, concept=None):
+        owners = self._owners().get(filename)
+        if owners:
+            return owners
+        if chapter is None:
+            # 无法反查的文件按第一个下划线拆分章节与概念
+            stem = filename[:-len('.txt')]
+            chapter, _, concept = stem.partition('_')
+        return [('', chapter, concept)]
+
+    # ---------- 写入 ----------
+
+    def upsert(self, chapter, concept, body):
+        """写入或更新一条讲解（由讲解缓存在保存后调用）"""
+        if not self.available:
+            return
+        filename = _filename_for(chapter, concept)
+        owners = self._resolve(filename, chapter, concept)
+        stat = self._stat(os.path.join(self.cache_dir, filename))
+
+        conn = self._connect()
+        with conn:
+            self._write(conn, filename, owners, body, stat)
+
+    def remove(self, chapter, concept):
+        """删除一条讲解的索引"""
+        if not self.available:
+            return
+        conn = self._connect()
+        with conn:
+            self._delete(conn, _filename_for(chapter, concept))
+
+    @staticmethod
+    def _write(conn, filename, owners, body, stat):
+        ExplanationSearchIndex._delete_rows(conn, filename)
+        for course, chapter, concept in owners:
+            cursor = conn.execute(
+                'INSERT INTO explanation_fts (course, chapter, concept, body, filename) VALUES (?, ?, ?, ?, ?)',
+                (course, chapter, concept, body, filename)
+            )
+            conn.execute('INSERT INTO indexed_rows (fts_rowid, filename) VALUES (?, ?)',
+                         (cursor.lastrowid, filename))
+        conn.execute(
+            'INSERT OR REPLACE INTO indexed_files (filename, mtime_ns, size, owners) VALUES (?, ?, ?, ?)',
+            (filename, stat[0], stat[1], ExplanationSearchIndex._owners_key(owners))
+        )
+
+    @staticmethod
+    def _delete_rows(conn, filename):
+        conn.execute('DELETE FROM explanation_fts WHERE rowid IN '
+                     '(SELECT fts_rowid FROM indexed_rows WHERE filename = ?)', (filename,))
+        conn.execute('DELETE FROM indexed_rows WHERE filename = ?', (filename,))
+
+    @staticmethod
+    def _delete(conn, filename):
+        ExplanationSearchIndex._delete_rows(conn, filename)
+        conn.execute('DELETE FROM indexed_files WHERE filename = ?', (filename,))
+
+    @staticmethod
+    def _owners_key(owners):
+        return '\n'.join('\t'.join(owner) for owner in owners)
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return 0, 0
+
+    # ---------- 对账 ----------
+
+    @staticmethod
+    def _pack_files(packs, local_files):
+        """课程包中的讲解条目：{课程包路径#文件名: (讲解文件名, 课程包, 课程包 mtime_ns, 大小)}
+
+        以课程包路径为键、课程包的 mtime/大小为版本，重新挂载（文件变化）时整包重建；
+        被本地缓存文件或先挂载的课程包覆盖的条目不索引，与 ExplanationCache.load 的查找顺序一致。
+        """
+        files = {}
+        seen = set(local_files)
+        for path, (mtime_ns, size, pack) in packs.items():
+            for name in pack.names(EXPLANATION_PREFIX):
+                filename = name[len(EXPLANATION_PREFIX):]
+                if not filename.endswith('.txt') or filename in seen:
+                    continue
+                seen.add(filename)
+                files[f'{path}#{filename}'] = (filename, pack, mtime_ns, size)
+        return files
+
+    def sync(self, force=False):
+        """按文件 stat 与缓存目录及已挂载课程包对账，只重建新增、变化或归属变化的讲解"""
+        if not self.available:
+            return
+        if not force and time.monotonic() - self._last_sync_check < self.SYNC_INTERVAL:
+            return
+
+        with self._sync_lock:
+            self._last_sync_check = time.monotonic()
+            owner_map = self._owners()
+            self.pack_registry.refresh()
+            packs = self.pack_registry.packs
+            pack_signature = tuple((path, mtime_ns, size) for path, (mtime_ns, size, _) in packs.items())
+            signature = (self._stat(self.cache_dir), pack_signature, self._owner_signature)
+            if not force and signature == self._synced_signature:
+                return
+
+            files = {}
+            if os.path.isdir(self.cache_dir):
+                with os.scandir(self.cache_dir) as it:
+                    for entry in it:
+                        if entry.is_file() and entry.name.endswith('.txt'):
+                            st = entry.stat()
+                            files[entry.name] = (st.st_mtime_ns, st.st_size)
+
+            pack_files = self._pack_files(packs, files)
+
+            conn = self._connect()
+            indexed = {row[0]: (row[1], row[2], row[3])
+                       for row in conn.execute('SELECT filename, mtime_ns, size, owners FROM indexed_files')}
+
+            with conn:
+                for filename in indexed.keys() - files.keys() - pack_files.keys():
+                    self._delete(conn, filename)
+
+                for filename, stat in files.items():
+                    owners = owner_map.get(filename) or self._resolve(filename)
+                    if indexed.get(filename) == (stat[0], stat[1], self._owners_key(owners)):
+                        continue
+                    try:
+                        with open(os.path.join(self.cache_dir, filename), 'r', encoding='utf-8') as f:
+                            body = f.read()
+                    except OSError:
+                        continue
+                    self._write(conn, filename, owners, body, stat)
+
+                for key, (filename, pack, mtime_ns, size) in pack_files.items():
+                    owners = owner_map.get(filename) or self._resolve(filename)
+                    if indexed.get(key) == (mtime_ns, size, self._owners_key(owners)):
+                        continue
+                    body = pack.read_text(EXPLANATION_PREFIX + filename)
+                    if body is None:
+                        continue
+                    self._write(conn, key, owners, body, (mtime_ns, size))
+
+            self._synced_signature = signature
+
+    # ---------- 检索 ----------
+
+    def search(self, query, course=None, page=1, page_size=20):
+        """检索讲解正文，返回按相关度排序的结果及高亮片段"""
+        query = (query or '').strip()
+        empty = {'results': [], 'total': 0, 'page': page, 'page_size': page_size}
+        if not query or not self.available:
+            return empty
+
+        self.sync()
+        terms = query.split()
+        conn = self._connect()
+
+        if all(len(term) >= 3 for term in terms):
+            match = ' AND '.join('"' + term.replace('"', '""') + '"' for term in terms)
+            where, params = 'explanation_fts MATCH ?', [match]
+            order = f'bm25(explanation_fts, {_BM25_WEIGHTS})'
+            snippet = (f"snippet(explanation_fts, 3, '{_HIGHLIGHT_START}', '{_HIGHLIGHT_END}', "
+                       f"'…', {SNIPPET_TOKENS})")
+        else:
+            # trigram 无法索引少于3个字符的词，退化为 LIKE 扫描
+            where = ' AND '.join('(body LIKE ? OR concept LIKE ?)' for _ in terms)
+            params = []
+            for term in terms:
+                pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                params.extend([pattern, pattern])
+            where = where.replace('LIKE ?', "LIKE ? ESCAPE '\\'")
+            order, snippet = 'concept', 'body'
+
+        if course:
+            where += ' AND course = ?'
+            params.append(course)
+
+        total = conn.execute(f'SELECT COUNT(*) FROM explanation_fts WHERE {where}', params).fetchone()[0]
+        rows = conn.execute(
+            f'SELECT course, chapter, concept, {snippet} FROM explanation_fts '
+            f'WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?',
+            params + [page_size, (page - 1) * page_size]
+        ).fetchall()
+
+        results = []
+        for course_name, chapter, concept, text in rows:
+            if snippet == 'body':
+                text = self._make_snippet(text, terms)
+            results.append({
+                'course': course_name,
+                'chapter': chapter,
+                'concept': concept,
+                'snippet': self._render_snippet(text)
+            })
+
+        return {'results': results, 'total': total, 'page': page, 'page_size': page_size}
+
+    @staticmethod
+    def _make_snippet(body, terms):
+        """为 LIKE 检索结果截取命中位置附近的片段"""
+        lowered = body.lower()
+        position = min((p for p in (lowered.find(t.lower()) for t in terms) if p >= 0), default=0)
+        start = max(position - SNIPPET_CHARS // 2, 0)
+        text = body[start:start + SNIPPET_CHARS]
+        for term in terms:
+            index = 0
+            while True:
+                index = text.lower().find(term.lower(), index)
+                if index < 0:
+                    break
+                text = (text[:index] + _HIGHLIGHT_START + text[index:index + len(term)]
+                        + _HIGHLIGHT_END + text[index + len(term):])
+                index += len(term) + 2
+        return ('…' if start > 0 else '') + text + ('…' if start + SNIPPET_CHARS < len(body) else '')
+
+    @staticmethod
+    def _render_snippet(text):
+        """转义片段并把占位符替换为高亮标签"""
+        text = ' '.join((text or '').split())
+        return (html.escape(text)
+                .replace(_HIGHLIGHT_START, '<mark>')
+                .replace(_HIGHLIGHT_END, '</mark>'))
+
+    def stats(self):
+        """索引统计信息"""
+        if not self.available:
+            return {'available': False, 'error': self.error}
+        conn = self._connect()
+        return {
+            'available': True,
+            'files': conn.execute('SELECT COUNT(*) FROM indexed_files').fetchone()[0],
+            'rows': conn.execute('SELECT COUNT(*) FROM explanation_fts').fetchone()[0]
+        }
+
+
+def benchmark(count=5000, queries=None, rounds=20):
+    """在合成讲解语料上测量索引构建与检索延迟"""
+    queries = queries or ['参照完整性', 'ACID', '事务隔离', '索引', '主键 外键', '不存在的词语']
+    topics = ['事务', '并发控制', '参照完整性', '关系代数', '索引结构', '查询优化', '范式', '恢复技术']
+    paragraph = ('## {topic}\n\n{topic}是数据库系统中的重要概念。在实际应用中，'
+                 '需要结合主键、外键与约束来保证数据的一致性，例如 ACID 特性中的原子性与隔离性。\n'
+                 '- 要点{n}：{topic}与存储管理、缓冲区替换策略密切相关。\n'
+                 '| 特点 | 说明 |\n|------|------|\n| 编号 | {n} |\n')
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache_dir = os.path.join(temp_dir, 'explanations')
+        os.makedirs(cache_dir)
+        for n in range(count):
+            topic = topics[n % len(topics)]
+            with open(os.path.join(cache_dir, f'第{n % 40}章_{topic}{n}.txt'), 'w', encoding='utf-8') as f:
+                f.write(paragraph.format(topic=topic, n=n) * 6)
+
+        index = ExplanationSearchIndex(os.path.join(temp_dir, 'fts.db'), cache_dir)
+        if not index.available:
+            print(index.error)
+            return
+
+        # 合成语料不属于任何课程，跳过知识库反查
+        index._owners = lambda: {}
+        started = time.perf_counter()
+        index.sync(force=True)
+        print(f"索引 {count} 篇讲解耗时 {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        for query in queries:
+            timings = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                result = index.search(query, page_size=20)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p50 = timings[len(timings) // 2]
+            p95 = timings[min(int(len(timings) * 0.95), len(timings) - 1)]
+            print(f"{query!r:>14}: 命中 {result['total']:>5}  p50 {p50:7.2f} ms  p95 {p95:7.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='讲解全文索引工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    bench_parser = subparsers.add_parser('benchmark', help='在合成语料上测量检索延迟')
+    bench_parser.add_argument('--count', type=int, default=5000, help='合成讲解数量')
+    bench_parser.add_argument('--rounds', type=int, default=20, help='每个查询的重复次数')
+
+    subparsers.add_parser('rebuild', help='与缓存目录对账重建索引')
+
+    args = parser.parse_args(argv)
+    if args.command == 'benchmark':
+        benchmark(args.count, rounds=args.rounds)
+    else:
+        index = ExplanationSearchIndex.default()
+        index.sync(force=True)
+        print(index.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+后台任务类型注册表 - 任务类型名到执行函数的映射
+
+入队的任务只保存类型名与 JSON 参数，由 Web 进程的线程池或独立 worker 进程按类型名找到执行函数；
+执行函数的参数必须可以 JSON 序列化，并接受 progress_callback 关键字参数。
+
+注册时可以提供去重键函数（由参数得到如 课程+章节 的键），相同键的任务未结束时重复提交返回已有任务。
+"""
+
+JOBS = {}
+JOB_KEYS = {}
+
+_services = {}
+
+
+def job(kind, key=None):
+    """注册任务类型；key 为去重键函数，参数与执行函数相同"""
+    def register(func):
+        JOBS[kind] = func
+        if key is not None:
+            JOB_KEYS[kind] = key
+        return func
+    return register
+
+
+def get_job(kind):
+    if kind not in JOBS:
+        raise ValueError(f'未知的任务类型: {kind}')
+    return JOBS[kind]
+
+
+def dedup_key(kind, args, kwargs):
+    """任务的去重键（未注册键函数时为 None）"""
+    key = JOB_KEYS.get(kind)
+    if key is None:
+        return None
+    return f'{kind}:{key(*args, **kwargs)}'
+
+
+def _service(cls):
+    """每个进程共用一个服务实例"""
+    if cls not in _services:
+        _services[cls] = cls()
+    return _services[cls]
+
+
+@job('batch_explain_chapter', key=lambda username, chapter, course_name=None: f'{course_name}:{chapter}')
+def batch_explain_chapter(username, chapter, course_name=None, progress_callback=None):
+    from services.learning_service import LearningService
+    return _service(LearningService).batch_explain_chapter(
+        username, chapter, course_name, progress_callback=progress_callback
+    )
+
+
+@job('batch_explain_all', key=lambda username, course_name=None: course_name)
+def batch_explain_all(username, course_name=None, progress_callback=None):
+    from services.learning_service import LearningService
+    return _service(LearningService).batch_explain_all(username, course_name, progress_callback=progress_callback)
+
+
+@job('regenerate_course_items')
+def regenerate_course_items(course_name, items, progress_callback=None):
+    from services.course_versions import CourseVersionService
+    return _service(CourseVersionService).regenerate(course_name, items, progress_callback=progress_callback)
+
+
+@job('build_related_index',
+     key=lambda course_name, include_explanations=False: f'{course_name}:{bool(include_explanations)}')
+def build_related_index(course_name, include_explanations=False, progress_callback=None):
+    from services.learning_service import LearningService
+    return _service(LearningService).build_related_index(
+        course_name, include_explanations, progress_callback=progress_callback
+    )
+
+
+@job('generate_course', key=lambda course_name, description='', pregenerate=False: course_name)
+def generate_course(course_name, description='', pregenerate=False, progress_callback=None):
+    from services.course_service import CourseService
+    return _service(CourseService).generate_course(
+        course_name, description, pregenerate, progress_callback=progress_callback
+    )
+
+
+@job('import_syllabus', key=lambda source_path, course_name, fmt, overwrite=False: course_name)
+def import_syllabus(source_path, course_name, fmt, overwrite=False, progress_callback=None):
+    from services.course_service import CourseService
+    return _service(CourseService).import_syllabus(
+        source_path, course_name, fmt, overwrite, progress_callback=progress_callback
+    )
+
+
+@job('generate_exam')
+def generate_exam(username, chapters, question_types=None, use_ai=True, course_name=None, progress_callback=None):
+    """创建考试并生成题目（与 /api/generate-exam 的同步处理相同，课程为提交时用户的当前课程）"""
+    from services.exam_service import ExamService
+    exam_service = _service(ExamService)
+    result = exam_service.create_exam(username, chapters, question_types, course_name)
+    if not result['success']:
+        return result
+    if progress_callback:
+        progress_callback({'percentage': 20, 'message': '试卷已创建，正在生成题目'})
+
+    exam_id = result['exam_id']
+    generate_result = exam_service.generate_questions(exam_id, use_ai, course_name)
+    if not generate_result['success']:
+        return generate_result
+    return {
+        'success': True,
+        'exam_id': exam_id,
+        'formatted_paper': generate_result['formatted_paper'],
+        'exam_paper': generate_result['exam_paper']
+    }
+
+
+@job('review_exam', key=lambda record_id, username=None: record_id)
+def review_exam(record_id, username=None, progress_callback=None):
+    from services.review_service import ReviewService
+    return _service(ReviewService).review_exam(record_id, username)
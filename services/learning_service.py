@@ -1,10 +1,18 @@
 """
 学习服务
 """
-from models.knowledge import KnowledgeBase
+import time
+from models.knowledge import KnowledgeBase, KnowledgeBaseCache
 from models.course import Course
 from services.ai_service import AIService
 from services.settings_service import SettingsService
+from services.explanation_cache import ExplanationCache
+from services.search_index import SearchIndex
+from services.explanation_search import ExplanationSearchIndex
+from services.suggest_index import SuggestIndex
+from services.related_index import RelatedIndex, build_course_embeddings
+from services.concept_registry import ConceptRegistry, lookup_order
+from services.task_service import cancelled as task_cancelled, exclusive
 from flask import current_app, session
 
 class LearningService:
@@ -13,32 +21,32 @@ class LearningService:
     def __init__(self):
         self.ai_service = AIService()
         self.settings_service = SettingsService()
-
-    def get_current_knowledge_base(self):
-        """获取当前课程的知识库"""
+        self.explanation_cache = ExplanationCache()
+        self.knowledge_cache = KnowledgeBaseCache()
+        self.search_index = SearchIndex()
+        self.explanation_search = ExplanationSearchIndex.default()
+        self.suggest_index = SuggestIndex()
+        self.related_index = RelatedIndex()
+        self.concept_registry = ConceptRegistry()
+
+    def get_current_knowledge_base(self, username=None):
+        """获取当前课程的知识库（后台任务中需传入用户名）"""
+        return self.get_course_knowledge_base(self.settings_service.get_current_course(username))
+
+    def get_course_knowledge_base(self, course_name):
+        """获取指定课程的知识库，课程不存在时回退到默认知识库"""
+        default_file = current_app.config.get('KNOWLEDGE_BASE_FILE', 'kownlgebase.json')
         try:
-            # 获取当前课程
-            current_course = self.settings_service.get_current_course()
-            course = Course.get_course_by_name(current_course)
+            course = Course.get_course_by_name(course_name)
 
             if course and course.filename:
-                # 创建知识库实例并加载指定文件
-                knowledge_base = KnowledgeBase()
-                # 临时修改文件路径
-                original_file = knowledge_base.data
                 try:
-                    import json
-                    with open(course.filename, 'r', encoding='utf-8') as f:
-                        knowledge_base.data = json.load(f)
-                    return knowledge_base
+                    return self.knowledge_cache.get(course.filename)
                 except Exception as e:
                     current_app.logger.error(f"加载课程知识库失败: {e}")
-                    # 回退到默认知识库
-                    knowledge_base.data = original_file
-                    return knowledge_base
-            else:
-                # 使用默认知识库
-                return KnowledgeBase()
+
+            # 回退到默认知识库
+            return self.knowledge_cache.get(default_file)
         except Exception as e:
             current_app.logger.error(f"获取知识库失败: {e}")
             return KnowledgeBase()
@@ -67,21 +75,27 @@ class LearningService:
             current_app.logger.info(f"生成AI讲解: {chapter} - {concept}")
 
             # 获取当前课程名称
-            current_course = self.settings_service.get_current_course()
-
-            # 首先尝试从缓存加载
-            cached_explanation = self._load_explanation_cache(chapter, concept, concept_type)
-            if cached_explanation:
-                current_app.logger.info(f"从缓存加载讲解: {chapter} - {concept}")
-                return {
-                    'success': True,
-                    'explanation': cached_explanation,
-                    'from_cache': True
-                }
+            current_course = self.settings_service.get_current_course(username)
+
+            # 首先尝试从缓存加载（重复出现的概念共享同一份讲解）
+            groups = self._concept_groups(current_course)
+            for source in lookup_order(groups, current_course, chapter, concept, concept_type):
+                cached_explanation = self._load_explanation_cache(*source)
+                if cached_explanation:
+                    current_app.logger.info(f"从缓存加载讲解: {source[0]} - {source[1]}")
+                    self.explanation_cache.record_access(source[0], source[1])
+                    return {
+                        'success': True,
+                        'explanation': cached_explanation,
+                        'html': self._load_explanation_html(*source, cached_explanation),
+                        'from_cache': True,
+                        **self._shared_from(source, chapter, concept)
+                    }
 
-            # 缓存中没有，生成新的讲解
+            # 缓存中没有，为规范条目生成新的讲解
+            target, target_course = self._generation_target(groups, current_course, chapter, concept, concept_type)
             try:
-                explanation = self.ai_service.generate_explanation(chapter, concept, concept_type, current_course)
+                explanation = self.ai_service.generate_explanation(*target, target_course)
             except NameError as ne:
                 current_app.logger.error(f"NameError in AI service: {str(ne)}")
                 return {
@@ -107,12 +121,15 @@ class LearningService:
                 explanation = self._sanitize_content(explanation)
 
             # 保存到缓存
-            self._save_explanation_cache(chapter, concept, concept_type, explanation)
+            self._save_explanation_cache(*target, explanation)
+            self.explanation_cache.record_access(target[0], target[1])
 
             return {
                 'success': True,
                 'explanation': explanation,
-                'from_cache': False
+                'html': self._load_explanation_html(*target, explanation),
+                'from_cache': False,
+                **self._shared_from(target, chapter, concept)
             }
 
         except Exception as e:
@@ -146,11 +163,13 @@ class LearningService:
             current_app.logger.error(f"跟踪学习进度失败: {str(e)}")
             return {'chapters_studied': 0, 'concepts_learned': 0, 'recent_activity': []}
 
-    def batch_explain_chapter(self, username, chapter, progress_callback=None):
-        """批量生成章节讲解"""
+    def batch_explain_chapter(self, username, chapter, course_name=None, progress_callback=None):
+        """批量生成章节讲解（course_name 为提交任务时用户的当前课程）"""
         try:
+            current_course = course_name or self.settings_service.get_current_course(username)
+
             # 获取章节的所有概念和知识点
-            knowledge_base = self.get_current_knowledge_base()
+            knowledge_base = self.get_course_knowledge_base(current_course)
             chapter_data = knowledge_base.get_chapter_content(chapter)
 
             if not chapter_data:
@@ -190,38 +209,7 @@ class LearningService:
                         'percentage': round((current / total) * 100, 1)
                     })
 
-            # 获取当前课程名称
-            current_course = self.settings_service.get_current_course()
-
-            results = self.ai_service.batch_generate_explanations(
-                concepts_to_generate,
-                batch_progress_callback,
-                current_course
-            )
-
-            # 保存成功生成的讲解到缓存
-            success_count = 0
-            error_count = 0
-
-            for key, result in results.items():
-                if result['success']:
-                    self._save_explanation_cache(
-                        result['chapter'],
-                        result['concept'],
-                        result['concept_type'],
-                        result['explanation']
-                    )
-                    success_count += 1
-                else:
-                    error_count += 1
-
-            return {
-                'success': True,
-                'total': len(concepts_to_generate),
-                'success_count': success_count,
-                'error_count': error_count,
-                'results': results
-            }
+            return self._run_batch(current_course, concepts_to_generate, batch_progress_callback)
 
         except Exception as e:
             current_app.logger.error(f"批量生成章节讲解失败: {str(e)}")
@@ -230,11 +218,27 @@ class LearningService:
                 'error': f"批量生成失败: {str(e)}"
             }
     
-    def recommend_content(self, username):
-        """推荐学习内容"""
+    def recommend_content(self, username, chapter=None, concept=None):
+        """推荐学习内容
+
+        提供当前学习的章节和概念时，从预计算的相关知识点中优先推荐其他章节的条目；
+        没有向量索引时推荐第一章。
+        """
         try:
+            knowledge_base = self.get_current_knowledge_base(username)
+            if chapter and concept:
+                related = self.related_index.related(
+                    self.settings_service.get_current_course(username), chapter, concept, k=1, exclude_chapter=True
+                )
+                if related['results']:
+                    item = related['results'][0]
+                    return {
+                        'recommended_chapter': item['chapter'],
+                        'recommended_concept': item['text'],
+                        'reason': f'与"{concept}"内容相关'
+                    }
+
             # 简化版本：推荐第一章
-            knowledge_base = self.get_current_knowledge_base()
             all_chapters = knowledge_base.get_chapters()
             return {
                 'recommended_chapter': all_chapters[0] if all_chapters else '第一章 课程概述',
@@ -247,16 +251,85 @@ class LearningService:
                 'recommended_chapter': None,
                 'reason': '推荐系统暂时不可用'
             }
-    
-    def search_knowledge(self, keyword):
-        """搜索知识点"""
+
+    def get_duplicate_concepts(self, course=None):
+        """列出课程中重复出现的概念及去重后全课程批量生成可节省的AI调用次数"""
+        course = course or self.settings_service.get_current_course()
+        groups = self._concept_groups(course)
+        if groups is None:
+            return {'enabled': False, 'groups': [], 'ai_calls_saved': 0}
+
+        duplicates = [[occurrence._asdict() for occurrence in occurrences]
+                      for occurrences in groups.duplicate_groups()
+                      if any(occurrence.course == course for occurrence in occurrences)]
+        items = [(occurrence.chapter, occurrence.name, occurrence.type)
+                 for occurrences in groups.groups.values() for occurrence in occurrences
+                 if occurrence.course == course]
+        pending, _ = groups.plan(course, items)
+        return {
+            'enabled': True,
+            'course': course,
+            'groups': duplicates,
+            'occurrences': len(items),
+            'ai_calls_saved': len(items) - len(pending)
+        }
+
+    def get_related_concepts(self, chapter, concept, course=None, k=8):
+        """获取相关知识点（读取预计算的近邻，不调用模型）"""
         try:
-            knowledge_base = self.get_current_knowledge_base()
-            return knowledge_base.search_knowledge(keyword)
+            course = course or self.settings_service.get_current_course()
+            return self.related_index.related(course, chapter, concept, k=k)
+        except Exception as e:
+            current_app.logger.error(f"获取相关知识点失败: {str(e)}")
+            return {'available': False, 'stale': False, 'results': []}
+
+    def build_related_index(self, course_name, include_explanations=False, progress_callback=None):
+        """离线计算课程的嵌入向量与相关知识点（在后台任务中执行）"""
+        return build_course_embeddings(
+            course_name,
+            self.ai_service.embed,
+            include_explanations=include_explanations,
+            explanation_loader=self.explanation_cache.load,
+            model=current_app.config.get('OLLAMA_EMBED_MODEL', ''),
+            progress_callback=progress_callback
+        )
+
+    def search_knowledge(self, keyword, course=None, all_courses=False, page=1, page_size=20):
+        """搜索知识点（默认只搜索当前课程，all_courses 为真时跨课程搜索）"""
+        try:
+            if all_courses:
+                courses = None
+            else:
+                courses = [course or self.settings_service.get_current_course()]
+            return self.search_index.search(keyword, courses=courses, page=page, page_size=page_size)
         except Exception as e:
             current_app.logger.error(f"搜索知识点失败: {str(e)}")
+            return {'results': [], 'total': 0, 'page': page, 'page_size': page_size}
+
+    def suggest(self, prefix, course=None, all_courses=False, limit=10):
+        """输入联想（名称前缀、拼音全拼或首字母）"""
+        try:
+            courses = None if all_courses else [course or self.settings_service.get_current_course()]
+            return self.suggest_index.suggest(prefix, courses=courses, limit=limit)
+        except Exception as e:
+            current_app.logger.error(f"获取输入联想失败: {str(e)}")
             return []
 
+    def search_explanations(self, keyword, course=None, all_courses=False, page=1, page_size=20):
+        """全文检索已生成的讲解正文"""
+        try:
+            if not self.explanation_search.available:
+                return {'results': [], 'total': 0, 'page': page, 'page_size': page_size,
+                        'error': self.explanation_search.error}
+            if not all_courses:
+                course = course or self.settings_service.get_current_course()
+            return self.explanation_search.search(
+                keyword, course=None if all_courses else course, page=page, page_size=page_size
+            )
+        except Exception as e:
+            current_app.logger.error(f"检索讲解失败: {str(e)}")
+            return {'results': [], 'total': 0, 'page': page, 'page_size': page_size}
+
     def _contains_dangerous_content(self, content):
         """检查内容是否包含潜在危险的字符或代码"""
         if not content:
@@ -304,10 +377,11 @@ class LearningService:
 
         return content
 
-    def batch_explain_all(self, username, progress_callback=None):
-        """批量生成全部讲解"""
+    def batch_explain_all(self, username, course_name=None, progress_callback=None):
+        """批量生成全部讲解（course_name 为提交任务时用户的当前课程）"""
         try:
-            knowledge_base = self.get_current_knowledge_base()
+            current_course = course_name or self.settings_service.get_current_course(username)
+            knowledge_base = self.get_course_knowledge_base(current_course)
             all_chapters = knowledge_base.get_chapters()
 
             if not all_chapters:
@@ -352,38 +426,7 @@ class LearningService:
                         'percentage': round((current / total) * 100, 1)
                     })
 
-            # 获取当前课程名称
-            current_course = self.settings_service.get_current_course()
-
-            results = self.ai_service.batch_generate_explanations(
-                all_concepts_to_generate,
-                batch_progress_callback,
-                current_course
-            )
-
-            # 保存成功生成的讲解到缓存
-            success_count = 0
-            error_count = 0
-
-            for key, result in results.items():
-                if result['success']:
-                    self._save_explanation_cache(
-                        result['chapter'],
-                        result['concept'],
-                        result['concept_type'],
-                        result['explanation']
-                    )
-                    success_count += 1
-                else:
-                    error_count += 1
-
-            return {
-                'success': True,
-                'total': total_concepts,
-                'success_count': success_count,
-                'error_count': error_count,
-                'results': results
-            }
+            return self._run_batch(current_course, all_concepts_to_generate, batch_progress_callback)
 
         except Exception as e:
             current_app.logger.error(f"批量生成全部讲解失败: {str(e)}")
@@ -397,14 +440,18 @@ class LearningService:
         try:
             current_app.logger.info(f"重新生成讲解: {chapter} - {concept}")
 
-            # 删除现有缓存
-            self._delete_explanation_cache(chapter, concept, concept_type)
-
             # 获取当前课程名称
-            current_course = self.settings_service.get_current_course()
+            current_course = self.settings_service.get_current_course(username)
+            groups = self._concept_groups(current_course)
+            target, target_course = self._generation_target(groups, current_course, chapter, concept, concept_type)
+
+            # 删除现有缓存（条目自身的旧缓存和共享的规范条目缓存）
+            self._delete_explanation_cache(chapter, concept, concept_type)
+            if target[:2] != (chapter, concept):
+                self._delete_explanation_cache(*target)
 
             # 重新生成
-            explanation = self.ai_service.generate_explanation(chapter, concept, concept_type, current_course)
+            explanation = self.ai_service.generate_explanation(*target, target_course)
 
             if not explanation or explanation.startswith("抱歉") or explanation.startswith("无法连接"):
                 return {
@@ -413,12 +460,14 @@ class LearningService:
                 }
 
             # 保存新的缓存
-            self._save_explanation_cache(chapter, concept, concept_type, explanation)
+            self._save_explanation_cache(*target, explanation)
 
             return {
                 'success': True,
                 'explanation': explanation,
-                'from_cache': False
+                'html': self._load_explanation_html(*target, explanation),
+                'from_cache': False,
+                **self._shared_from(target, chapter, concept)
             }
 
         except Exception as e:
@@ -428,68 +477,167 @@ class LearningService:
                 'error': f"重新生成失败: {str(e)}"
             }
 
-    def _save_explanation_cache(self, chapter, concept, concept_type, explanation):
-        """保存讲解到缓存"""
+    def _run_batch(self, course_name, items, progress_callback):
+        """批量生成讲解：重复出现的概念只生成一次，结果中记录节省的AI调用次数
+
+        结果只含计数与逐条状态（generated/shared/reused/failed/skipped），
+        逐条明细由任务存储单独保存，通过 /api/tasks/<task_id>/results 分页查询。
+        """
+        groups = self._concept_groups(course_name)
+        if groups is not None:
+            pending, mapping = groups.plan(course_name, items)
+        else:
+            pending, mapping = list(items), {item: item for item in items}
+
+        if len(pending) < len(items):
+            current_app.logger.info(f"概念去重: {len(items)} 个条目只需生成 {len(pending)} 次")
+
+        # 同一课程同时只有一个任务生成讲解；等待过时跳过其他任务在此期间生成的条目
+        planned = len(pending)
+        started = time.time()
+        reused = {}
+        with exclusive(f'explanations:{course_name}', '等待同一课程的其他讲解生成任务完成') as waited:
+            if waited:
+                fresh = [item for item in pending
+                         if (self.explanation_cache.modified_at(item[0], item[1]) or 0) >= started]
+                for chapter, concept, concept_type in fresh:
+                    reused[f"{chapter}_{concept}"] = {
+                        'success': True, 'reused': True,
+                        'chapter': chapter, 'concept': concept, 'concept_type': concept_type
+                    }
+                pending = [item for item in pending if item not in fresh]
+                if fresh:
+                    current_app.logger.info(f"课程 {course_name} 有 {len(fresh)} 个条目已由其他任务生成，跳过")
+
+            target_courses = {}
+            if groups is not None:
+                for chapter, concept, _ in pending:
+                    canonical = groups.canonical(course_name, chapter, concept)
+                    if canonical and canonical.course != course_name:
+                        target_courses[(chapter, concept)] = canonical.course
+
+            # 每生成一条立即写入缓存（每个规范条目只保存一次），结果中不保留正文；
+            # 工作进程中途退出时已生成的讲解不会丢失
+            generated = {}
+            if not target_courses:
+                generated = self.ai_service.batch_generate_explanations(
+                    pending, progress_callback, course_name, on_result=self._save_explanation_cache
+                )
+            else:
+                # 跨课程去重时按规范条目所属课程分别生成，保持课程风格
+                by_course = {}
+                for item in pending:
+                    by_course.setdefault(target_courses.get(item[:2], course_name), []).append(item)
+                done = 0
+                for target_course, course_items in by_course.items():
+                    if task_cancelled():
+                        break
+                    offset = done
+
+                    def course_progress(current, total, chapter_name, concept_name, error=None, offset=offset):
+                        if progress_callback:
+                            progress_callback(offset + current, len(pending), chapter_name, concept_name, error)
+
+                    generated.update(self.ai_service.batch_generate_explanations(
+                        course_items, course_progress, target_course, on_result=self._save_explanation_cache
+                    ))
+                    done += len(course_items)
+
+            generated.update(reused)
+
+        # 按原始条目展开为逐条状态（不携带讲解正文，成功的条目记录讲解缓存文件）；任务取消时未处理的条目标记为跳过
+        is_cancelled = task_cancelled()
+        entries = []
+        counts = {'success': 0, 'error': 0, 'skipped': 0}
+        for chapter, concept, concept_type in items:
+            target = mapping[(chapter, concept, concept_type)]
+            result = generated.get(f"{target[0]}_{target[1]}")
+            entry = {'chapter': chapter, 'concept': concept, 'concept_type': concept_type}
+            if result is None and is_cancelled:
+                entry.update(status='skipped', error='任务已取消')
+                counts['skipped'] += 1
+            elif result is None or not result['success']:
+                entry.update(status='failed', error=(result or {}).get('error') or '未生成')
+                counts['error'] += 1
+            else:
+                if target[:2] != (chapter, concept):
+                    status = 'shared'
+                else:
+                    status = 'reused' if result.get('reused') else 'generated'
+                entry.update(status=status, cache=self.explanation_cache.get_cache_filename(target[0], target[1]),
+                             **self._shared_from(target, chapter, concept))
+                counts['success'] += 1
+            entries.append(entry)
+
+        return {
+            'success': True,
+            'total': len(items),
+            'success_count': counts['success'],
+            'error_count': counts['error'],
+            'cancelled': is_cancelled,
+            'skipped_count': counts['skipped'],
+            'reused_count': len(reused),
+            'dedup': {
+                'occurrences': len(items),
+                'generated': planned,
+                'ai_calls_saved': len(items) - planned
+            },
+            'items': entries
+        }
+
+    def _concept_groups(self, course_name):
+        """获取课程的规范概念分组；关闭去重或加载失败时返回 None"""
+        if not current_app.config.get('CONCEPT_DEDUP_ENABLED', True):
+            return None
         try:
-            import os
-
-            # 确保缓存目录存在
-            cache_dir = 'data/explanations'
-            os.makedirs(cache_dir, exist_ok=True)
-
-            # 生成缓存文件名
-            safe_filename = f"{chapter}_{concept}.txt"
-            # 替换文件名中的非法字符
-            safe_filename = safe_filename.replace('/', '_').replace('\\', '_').replace(':', '_').replace('*', '_').replace('?', '_').replace('"', '_').replace('<', '_').replace('>', '_').replace('|', '_')
-
-            cache_file = os.path.join(cache_dir, safe_filename)
-
-            # 保存到文件
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                f.write(explanation)
+            return self.concept_registry.get(
+                course_name, cross_course=current_app.config.get('CONCEPT_DEDUP_CROSS_COURSE', False)
+            )
+        except Exception as e:
+            current_app.logger.error(f"加载规范概念注册表失败: {str(e)}")
+            return None
 
-            current_app.logger.info(f"讲解已缓存到: {cache_file}")
+    @staticmethod
+    def _generation_target(groups, course_name, chapter, concept, concept_type):
+        """返回实际生成讲解的规范条目 ((章节, 名称, 类型), 所属课程)"""
+        canonical = groups.canonical(course_name, chapter, concept) if groups is not None else None
+        if canonical is None:
+            return (chapter, concept, concept_type), course_name
+        return (canonical.chapter, canonical.name, canonical.type), canonical.course
+
+    @staticmethod
+    def _shared_from(source, chapter, concept):
+        """讲解来自其他出现位置时，在响应中标注来源"""
+        if source[:2] == (chapter, concept):
+            return {}
+        return {'shared_from': {'chapter': source[0], 'concept': source[1]}}
 
+    def _save_explanation_cache(self, chapter, concept, concept_type, explanation):
+        """保存讲解到缓存"""
+        try:
+            self.explanation_cache.save(chapter, concept, explanation)
         except Exception as e:
             current_app.logger.error(f"保存讲解缓存失败: {str(e)}")
 
     def _load_explanation_cache(self, chapter, concept, concept_type):
         """从缓存加载讲解"""
         try:
-            import os
-
-            # 生成缓存文件名
-            safe_filename = f"{chapter}_{concept}.txt"
-            safe_filename = safe_filename.replace('/', '_').replace('\\', '_').replace(':', '_').replace('*', '_').replace('?', '_').replace('"', '_').replace('<', '_').replace('>', '_').replace('|', '_')
-
-            cache_file = os.path.join('data/explanations', safe_filename)
-
-            if os.path.exists(cache_file):
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                current_app.logger.info(f"从缓存加载讲解: {cache_file}")
-                return content
-
+            return self.explanation_cache.load(chapter, concept)
+        except Exception as e:
+            current_app.logger.error(f"加载讲解缓存失败: {str(e)}")
             return None
 
+    def _load_explanation_html(self, chapter, concept, concept_type, explanation=None):
+        """加载讲解的预渲染HTML"""
+        try:
+            return self.explanation_cache.load_html(chapter, concept, explanation)
         except Exception as e:
-            current_app.logger.error(f"加载讲解缓存失败: {str(e)}")
+            current_app.logger.error(f"加载讲解HTML失败: {str(e)}")
             return None
 
     def _delete_explanation_cache(self, chapter, concept, concept_type):
         """删除讲解缓存"""
         try:
-            import os
-
-            # 生成缓存文件名
-            safe_filename = f"{chapter}_{concept}.txt"
-            safe_filename = safe_filename.replace('/', '_').replace('\\', '_').replace(':', '_').replace('*', '_').replace('?', '_').replace('"', '_').replace('<', '_').replace('>', '_').replace('|', '_')
-
-            cache_file = os.path.join('data/explanations', safe_filename)
-
-            if os.path.exists(cache_file):
-                os.remove(cache_file)
-                current_app.logger.info(f"删除讲解缓存: {cache_file}")
-
+            self.explanation_cache.delete(chapter, concept)
         except Exception as e:
             current_app.logger.error(f"删除讲解缓存失败: {str(e)}")
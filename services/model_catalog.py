@@ -0,0 +1,205 @@
+"""
+Ollama 模型目录 - 后台定期刷新的已安装模型列表及加载状态
+
+监视线程（每个进程一个）每隔 MODEL_CATALOG_INTERVAL 秒请求 /api/tags 与 /api/ps，
+记录模型大小、参数规模、量化方式以及是否已加载到内存；设置页面与模型列表接口
+直接读取内存中的目录，Ollama 未启动时也不会阻塞页面。
+模型路由据此在首选模型未加载、而备选模型已加载时改用备选模型，避免冷启动加载。
+"""
+import os
+import time
+import threading
+import requests
+
+REFRESH_INTERVAL = 60.0
+REQUEST_TIMEOUT = 3
+
+
+def ollama_base_url(api_url):
+    """由聊天接口地址得到 Ollama 服务根地址"""
+    index = api_url.find('/api/')
+    return (api_url[:index] if index >= 0 else api_url).rstrip('/')
+
+
+def canonical_model_name(name):
+    """未写标签的模型名等同于 :latest"""
+    return name if ':' in name else f'{name}:latest'
+
+
+def _format_size(size):
+    if not size:
+        return ''
+    return f'{size / 1024 ** 3:.1f} GB'
+
+
+class ModelCatalog:
+    """Ollama 模型目录（进程级单例）"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(ModelCatalog, cls).__new__(cls)
+                cls._instance._initialized = False
+            return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.base_url = None
+        self.interval = REFRESH_INTERVAL
+        self.models = {}        # {规范模型名: 模型信息}
+        self.loaded = {}        # {规范模型名: {expires_at, size_vram}}（来自 /api/ps）
+        self.refreshed_at = None
+        self.error = None
+        self.thread = None
+        self._pid = None
+        self._wakeup = threading.Event()
+        self._refresh_lock = threading.Lock()
+        self._initialized = True
+
+    def ensure_started(self, api_url, interval=None):
+        """启动刷新线程；fork 后的子进程中会重新启动"""
+        self.set_api_url(api_url)
+        if self.thread is not None and self.thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self.thread is not None and self.thread.is_alive() and self._pid == os.getpid():
+                return
+            if interval:
+                self.interval = interval
+            self._pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name='model-catalog', daemon=True)
+            self.thread.start()
+
+    def set_api_url(self, api_url):
+        """Ollama 地址变化时清空目录并尽快刷新"""
+        base_url = ollama_base_url(api_url)
+        if base_url != self.base_url:
+            self.base_url = base_url
+            self.models = {}
+            self.loaded = {}
+            self.refreshed_at = None
+            self.request_refresh()
+
+    def request_refresh(self):
+        """唤醒刷新线程立即刷新（不等待结果）"""
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"刷新模型目录出错: {e}")
+            self._wakeup.wait(self.interval)
+
+    def refresh(self):
+        """请求 /api/tags 与 /api/ps 刷新目录，返回是否成功"""
+        if not self.base_url:
+            return False
+
+        with self._refresh_lock:
+            base_url = self.base_url
+            try:
+                tags = requests.get(f'{base_url}/api/tags', timeout=REQUEST_TIMEOUT)
+                tags.raise_for_status()
+                running = requests.get(f'{base_url}/api/ps', timeout=REQUEST_TIMEOUT)
+                running.raise_for_status()
+                installed = tags.json().get('models') or []
+                loaded_models = running.json().get('models') or []
+            except (requests.RequestException, ValueError) as e:
+                # 保留上一次的目录，只标记为不可用
+                self.error = f'无法获取模型列表: {e}'
+                self.loaded = {}
+                return False
+
+            if base_url != self.base_url:
+                return False
+
+            loaded = {}
+            for model in loaded_models:
+                name = canonical_model_name(model.get('name') or model.get('model', ''))
+                loaded[name] = {'expires_at': model.get('expires_at'), 'size_vram': model.get('size_vram')}
+
+            models = {}
+            for model in installed:
+                name = canonical_model_name(model.get('name') or model.get('model', ''))
+                details = model.get('details') or {}
+                models[name] = {
+                    'name': model.get('name') or name,
+                    'size': model.get('size'),
+                    'family': details.get('family'),
+                    'parameter_size': details.get('parameter_size'),
+                    'quantization': details.get('quantization_level'),
+                    'modified_at': model.get('modified_at')
+                }
+
+            self.models = models
+            self.loaded = loaded
+            self.refreshed_at = time.time()
+            self.error = None
+            return True
+
+    @property
+    def available(self):
+        return self.refreshed_at is not None and self.error is None
+
+    def is_installed(self, name):
+        return canonical_model_name(name) in self.models
+
+    def is_loaded(self, name):
+        return canonical_model_name(name) in self.loaded
+
+    def mark_loaded(self, name):
+        """请求成功后模型必然已加载，不必等下一次刷新"""
+        name = canonical_model_name(name)
+        if name not in self.loaded:
+            self.loaded = {**self.loaded, name: {'expires_at': None, 'size_vram': None}}
+
+    def list_models(self):
+        """按名称排序的模型列表（含加载状态与显示标签）"""
+        loaded = self.loaded
+        result = []
+        for key, info in sorted(self.models.items()):
+            details = [part for part in (info['parameter_size'], info['quantization'],
+                                         _format_size(info['size'])) if part]
+            if key in loaded:
+                details.append('已加载')
+            label = f"{info['name']}（{' · '.join(details)}）" if details else info['name']
+            result.append({**info, 'loaded': key in loaded, 'label': label})
+        return result
+
+    def model_names(self):
+        return [info['name'] for info in self.list_models()]
+
+    def choose(self, preferred, fallbacks=()):
+        """模型路由：尽量避免冷启动加载
+
+        首选模型已加载时使用首选模型；否则使用第一个已加载的备选模型；
+        都未加载且首选模型未安装时使用第一个已安装的备选模型；目录不可用时总是返回首选模型。
+        """
+        if not fallbacks or not self.available or self.is_loaded(preferred):
+            return preferred
+        for name in fallbacks:
+            if self.is_loaded(name):
+                return name
+        if not self.is_installed(preferred):
+            for name in fallbacks:
+                if self.is_installed(name):
+                    return name
+        return preferred
+
+    def stats(self):
+        return {
+            'base_url': self.base_url,
+            'available': self.available,
+            'models': len(self.models),
+            'loaded': sorted(self.loaded),
+            'refreshed_at': self.refreshed_at,
+            'error': self.error
+        }
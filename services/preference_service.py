@@ -0,0 +1,127 @@
+"""
+用户偏好服务 - 每个用户的当前课程等偏好保存在数据库中
+
+读取经过进程内缓存：每个用户的偏好整体缓存 USER_PREFERENCE_CACHE_TTL 秒，
+其他工作进程写入的修改最迟在缓存过期后可见；本进程写入时直接更新缓存。
+匿名用户不写数据库，由调用方保存在会话中。
+"""
+import json
+import time
+import threading
+from collections import OrderedDict
+from flask import current_app
+from extensions import db
+from models.user import User, UserPreference
+
+ANONYMOUS = 'anonymous'
+MAX_CACHED_USERS = 1024
+PREFERENCE_KEYS = ('current_course',)
+
+
+def is_anonymous(username):
+    return not username or username == ANONYMOUS
+
+
+class PreferenceService:
+    """用户偏好服务（进程级单例）"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(PreferenceService, cls).__new__(cls)
+                cls._instance._initialized = False
+            return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.cache = OrderedDict()  # {用户名: (加载时间, {键: 值})}
+        self._cache_lock = threading.Lock()
+        self._initialized = True
+
+    def _ttl(self):
+        return current_app.config.get('USER_PREFERENCE_CACHE_TTL', 2.0)
+
+    def _cache_put(self, username, preferences):
+        with self._cache_lock:
+            self.cache[username] = (time.monotonic(), preferences)
+            self.cache.move_to_end(username)
+            while len(self.cache) > MAX_CACHED_USERS:
+                self.cache.popitem(last=False)
+
+    def get_all(self, username):
+        """返回用户的全部偏好（匿名用户或读取失败时返回空字典）"""
+        if is_anonymous(username):
+            return {}
+
+        cached = self.cache.get(username)
+        if cached is not None and time.monotonic() - cached[0] < self._ttl():
+            return cached[1]
+
+        try:
+            rows = db.session.query(UserPreference.key, UserPreference.value) \
+                .join(User, User.id == UserPreference.user_id) \
+                .filter(User.username == username).all()
+        except Exception as e:
+            current_app.logger.error(f"读取用户偏好失败: {e}")
+            return cached[1] if cached is not None else {}
+
+        preferences = {}
+        for key, value in rows:
+            try:
+                preferences[key] = json.loads(value)
+            except ValueError:
+                continue
+        self._cache_put(username, preferences)
+        return preferences
+
+    def get(self, username, key, default=None):
+        return self.get_all(username).get(key, default)
+
+    def set(self, username, key, value):
+        """保存一项偏好；匿名用户返回 False"""
+        if is_anonymous(username):
+            return False
+        if key not in PREFERENCE_KEYS:
+            raise ValueError(f'不支持的偏好: {key}')
+
+        user = User.get_or_create(username)
+        encoded = json.dumps(value, ensure_ascii=False)
+        try:
+            preference = UserPreference.query.filter_by(user_id=user.id, key=key).first()
+            if preference is None:
+                db.session.add(UserPreference(user_id=user.id, key=key, value=encoded))
+            else:
+                preference.value = encoded
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # 并发插入同一键时唯一约束冲突，改为更新
+            preference = UserPreference.query.filter_by(user_id=user.id, key=key).first()
+            if preference is None:
+                raise
+            preference.value = encoded
+            db.session.commit()
+
+        preferences = dict(self.get_all(username))
+        preferences[key] = value
+        self._cache_put(username, preferences)
+        return True
+
+    def delete(self, username, key):
+        """删除一项偏好（恢复为全局默认值）"""
+        if is_anonymous(username):
+            return False
+
+        deleted = UserPreference.query \
+            .filter(UserPreference.key == key,
+                    UserPreference.user_id.in_(db.session.query(User.id).filter(User.username == username))) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+        with self._cache_lock:
+            self.cache.pop(username, None)
+        return deleted > 0
@@ -0,0 +1,329 @@
+"""
+相关知识点索引 - 基于本地 Ollama 嵌入向量的离线近邻预计算
+
+离线任务为课程的每个概念/知识点名称（可选附带已缓存讲解的开头部分）计算嵌入向量，
+归一化后保存为每门课程一个 NumPy 文件（data/embeddings/<课程>.npz），
+同时分块计算并保存每个条目的前 TOP_K 个近邻；
+在线查询只需读取预计算的近邻行，不再调用模型。
+
+构建：
+    python -m services.related_index build --course 数据库原理 [--with-explanations]
+"""
+import os
+import json
+import argparse
+import threading
+from models.course import CourseRegistry
+from models.knowledge import KnowledgeBaseCache
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 可选依赖
+    np = None
+
+EMBEDDINGS_DIR = 'data/embeddings'
+TOP_K = 20
+EMBED_BATCH_SIZE = 64
+BLOCK_ROWS = 1024
+EXPLANATION_CHARS = 500
+
+
+def embeddings_filename(course_name):
+    """课程向量文件名（替换文件名中的非法字符）"""
+    safe_name = course_name
+    for char in ('/', '\\', ':', '*', '?', '"', '<', '>', '|'):
+        safe_name = safe_name.replace(char, '_')
+    return f"{safe_name}.npz"
+
+
+def course_items(knowledge_base):
+    """按章节顺序列出课程的全部条目 [(名称, 类型, 章节)]"""
+    items = []
+    for chapter in knowledge_base.get_chapters():
+        seen = set()
+        for item_type, names in (('concept', knowledge_base.get_concepts(chapter)),
+                                 ('content', knowledge_base.get_contents(chapter))):
+            for name in names:
+                if name not in seen:
+                    seen.add(name)
+                    items.append((name, item_type, chapter))
+    return items
+
+
+def normalize_rows(matrix):
+    """L2 归一化为 float32，之后点积即余弦相似度"""
+    vectors = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_neighbors(vectors, k=TOP_K, block_rows=BLOCK_ROWS):
+    """分块计算每行的前 k 个近邻（排除自身），返回 (序号, 相似度)"""
+    count = vectors.shape[0]
+    k = max(min(k, count - 1), 0)
+    neighbors = np.zeros((count, k), dtype=np.int32)
+    scores = np.zeros((count, k), dtype=np.float32)
+    if k == 0:
+        return neighbors, scores
+
+    for start in range(0, count, block_rows):
+        end = min(start + block_rows, count)
+        similarity = vectors[start:end] @ vectors.T
+        rows = np.arange(end - start)
+        similarity[rows, rows + start] = -np.inf
+
+        # 先用 argpartition 取出前 k 个，再只对这 k 个排序
+        if k < count - 1:
+            top = np.argpartition(similarity, -k, axis=1)[:, -k:]
+        else:
+            top = np.argsort(similarity, axis=1)[:, 1:]
+        top_scores = np.take_along_axis(similarity, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        neighbors[start:end] = np.take_along_axis(top, order, axis=1)
+        scores[start:end] = np.take_along_axis(top_scores, order, axis=1)
+
+    return neighbors, scores
+
+
+def build_course_embeddings(course_name, embed, include_explanations=False, explanation_loader=None,
+                            model='', progress_callback=None, output_dir=EMBEDDINGS_DIR, k=TOP_K):
+    """为课程计算嵌入向量与近邻并写入向量文件
+
+    embed 接收文本列表并返回向量列表（通常为 AIService.embed）；
+    include_explanations 为真时用 explanation_loader(chapter, name) 读取已缓存讲解并拼接到文本中。
+    """
+    if np is None:
+        return {'success': False, 'error': '未安装 numpy，无法构建相关知识点索引'}
+
+    entry = CourseRegistry().get_entry(course_name)
+    if not entry:
+        return {'success': False, 'error': '课程不存在'}
+
+    knowledge_base = KnowledgeBaseCache().get(entry['file'])
+    items = course_items(knowledge_base)
+    if not items:
+        return {'success': False, 'error': '课程没有可用的知识点'}
+
+    texts = []
+    with_explanations = 0
+    for name, _, chapter in items:
+        text = f"{chapter} - {name}"
+        if include_explanations and explanation_loader:
+            explanation = explanation_loader(chapter, name)
+            if explanation:
+                text = f"{text}\n{explanation[:EXPLANATION_CHARS]}"
+                with_explanations += 1
+        texts.append(text)
+
+    vectors = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        batch = texts[start:start + EMBED_BATCH_SIZE]
+        vectors.extend(embed(batch))
+        if progress_callback:
+            done = min(start + EMBED_BATCH_SIZE, len(texts))
+            progress_callback({
+                'percentage': int(done * 90 / len(texts)),
+                'message': f"正在计算嵌入向量 {done}/{len(texts)}",
+                'current': done,
+                'total': len(texts)
+            })
+
+    vectors = normalize_rows(vectors)
+    if progress_callback:
+        progress_callback({'percentage': 95, 'message': '正在预计算相关知识点'})
+    neighbors, scores = top_k_neighbors(vectors, k)
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, embeddings_filename(course_name))
+    temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_file, 'wb') as f:
+        np.savez(
+            f,
+            vectors=vectors,
+            neighbors=neighbors,
+            scores=scores,
+            items=np.array(json.dumps(items, ensure_ascii=False)),
+            version=np.array(knowledge_base.version_tag),
+            model=np.array(model)
+        )
+    os.replace(temp_file, path)
+
+    return {
+        'success': True,
+        'course': course_name,
+        'items': len(items),
+        'with_explanations': with_explanations,
+        'dimensions': int(vectors.shape[1]),
+        'file': path
+    }
+
+
+class CourseEmbeddings:
+    """单门课程已加载的向量与近邻表"""
+
+    __slots__ = ('course', 'stat', 'version', 'model', 'items', 'vectors', 'neighbors', 'scores', 'positions')
+
+    def __init__(self, course, path, stat):
+        self.course = course
+        self.stat = stat
+        with np.load(path, allow_pickle=False) as data:
+            self.vectors = data['vectors']
+            self.neighbors = data['neighbors']
+            self.scores = data['scores']
+            self.items = [tuple(item) for item in json.loads(str(data['items']))]
+            self.version = str(data['version'])
+            self.model = str(data['model'])
+
+        self.positions = {}  # {(章节, 名称): 序号}，名称单独再映射到首次出现的序号
+        for position, (name, _, chapter) in enumerate(self.items):
+            self.positions[(chapter, name)] = position
+            self.positions.setdefault((None, name), position)
+
+    def find(self, chapter, name):
+        position = self.positions.get((chapter, name))
+        if position is None:
+            position = self.positions.get((None, name))
+        return position
+
+
+class RelatedIndex:
+    """相关知识点索引（进程级单例），向量文件变化时重新加载"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(RelatedIndex, cls).__new__(cls)
+                cls._instance._initialized = False
+            return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.embeddings_dir = EMBEDDINGS_DIR
+        self.courses = {}  # {课程名称: CourseEmbeddings}
+        self._load_lock = threading.Lock()
+        self.knowledge_cache = KnowledgeBaseCache()
+        self._initialized = True
+
+    def _get(self, course_name):
+        """加载课程向量文件；不存在或未安装 numpy 时返回 None"""
+        if np is None:
+            return None
+        path = os.path.join(self.embeddings_dir, embeddings_filename(course_name))
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.courses.pop(course_name, None)
+            return None
+
+        stat = (st.st_mtime_ns, st.st_size)
+        embeddings = self.courses.get(course_name)
+        if embeddings is None or embeddings.stat != stat:
+            with self._load_lock:
+                embeddings = self.courses.get(course_name)
+                if embeddings is None or embeddings.stat != stat:
+                    embeddings = CourseEmbeddings(course_name, path, stat)
+                    self.courses[course_name] = embeddings
+        return embeddings
+
+    def warm(self, course_name):
+        """预先加载课程的向量文件，返回条目数（没有向量文件时返回 0）"""
+        embeddings = self._get(course_name)
+        return len(embeddings.items) if embeddings is not None else 0
+
+    def _current_knowledge_base(self, course_name):
+        entry = CourseRegistry().get_entry(course_name)
+        if not entry:
+            return None
+        try:
+            return self.knowledge_cache.get(entry['file'])
+        except Exception:
+            return None
+
+    def related(self, course_name, chapter, name, k=8, exclude_chapter=False):
+        """返回与条目最相近的前 k 个条目
+
+        向量文件比课程文件旧时 stale 为真，已从课程中删除的条目会被过滤掉；
+        exclude_chapter 为真时只返回其他章节的条目。
+        """
+        result = {'available': False, 'stale': False, 'results': []}
+        embeddings = self._get(course_name)
+        if embeddings is None:
+            return result
+
+        result['available'] = True
+        knowledge_base = self._current_knowledge_base(course_name)
+        stale = knowledge_base is not None and knowledge_base.version_tag != embeddings.version
+        result['stale'] = stale
+
+        position = embeddings.find(chapter, name)
+        if position is None:
+            return result
+
+        for neighbor, score in zip(embeddings.neighbors[position], embeddings.scores[position]):
+            neighbor_name, item_type, neighbor_chapter = embeddings.items[neighbor]
+            if exclude_chapter and neighbor_chapter == chapter:
+                continue
+            if stale and not self._exists(knowledge_base, neighbor_chapter, neighbor_name, item_type):
+                continue
+            result['results'].append({
+                'text': neighbor_name,
+                'type': item_type,
+                'chapter': neighbor_chapter,
+                'score': round(float(score), 4)
+            })
+            if len(result['results']) >= k:
+                break
+        return result
+
+    @staticmethod
+    def _exists(knowledge_base, chapter, name, item_type):
+        items = knowledge_base.get_concepts(chapter) if item_type == 'concept' else knowledge_base.get_contents(chapter)
+        return name in items
+
+    def stats(self):
+        """索引统计信息"""
+        return {
+            'available': np is not None,
+            'courses': len(self.courses),
+            'items': sum(len(embeddings.items) for embeddings in self.courses.values())
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='相关知识点索引工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='通过本地 Ollama 嵌入接口构建课程向量与近邻')
+    build_parser.add_argument('--course', action='append', help='课程名称（可重复，默认全部课程）')
+    build_parser.add_argument('--with-explanations', action='store_true', help='拼接已缓存讲解的开头部分')
+
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from services.ai_service import AIService
+    from services.explanation_cache import ExplanationCache
+
+    app = create_app()
+    with app.app_context():
+        ai_service = AIService()
+        explanation_cache = ExplanationCache()
+        course_names = args.course or [entry['name'] for entry in CourseRegistry().list_entries()]
+        for course_name in course_names:
+            result = build_course_embeddings(
+                course_name,
+                ai_service.embed,
+                include_explanations=args.with_explanations,
+                explanation_loader=explanation_cache.load,
+                model=app.config.get('OLLAMA_EMBED_MODEL', '')
+            )
+            print(f"{course_name}: {result}")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,7 +7,8 @@ from datetime import datetime
 from werkzeug.utils import secure_filename
 from models.records import ReviewRecord
 from models.user import User
-from models.knowledge import KnowledgeBase
+from models.knowledge import KnowledgeBaseCache
+from models.course import Course
 from services.ai_service import AIService
 from extensions import db
 from flask import current_app
@@ -17,9 +18,20 @@ class ReviewService:
     
     def __init__(self):
         self.ai_service = AIService()
-        self.knowledge_base = KnowledgeBase()
         from services.settings_service import SettingsService
         self.settings_service = SettingsService()
+
+    @property
+    def knowledge_base(self):
+        """当前课程的知识库（共享进程级缓存，不再单独解析）"""
+        return self.get_knowledge_base()
+
+    def get_knowledge_base(self, username=None):
+        """用户当前课程的知识库（后台任务中没有会话，需传入用户名）"""
+        course = Course.get_course_by_name(self.settings_service.get_current_course(username))
+        if course and course.filename:
+            return KnowledgeBaseCache().get(course.filename)
+        return KnowledgeBaseCache().get(current_app.config.get('KNOWLEDGE_BASE_FILE', 'kownlgebase.json'))
     
     def upload_exam_file(self, username, file):
         """上传试卷文件"""
@@ -154,8 +166,8 @@ class ReviewService:
             'questions': questions[:10]  # 只返回前10个题目作为预览
         }
     
-    def review_exam(self, record_id):
-        """审批试卷"""
+    def review_exam(self, record_id, username=None):
+        """审批试卷（后台任务中没有会话，需传入用户名以确定当前课程）"""
         try:
             review_record = ReviewRecord.query.get(record_id)
             if not review_record:
@@ -172,10 +184,10 @@ class ReviewService:
             content = parse_result['content']
             
             # 获取相关知识背景
-            knowledge_context = self._get_knowledge_context()
+            knowledge_context = self._get_knowledge_context(username)
             
             # 获取当前课程名称
-            current_course = self.settings_service.get_current_course()
+            current_course = self.settings_service.get_current_course(username)
 
             # 调用AI进行批改
             current_app.logger.info("开始AI批改试卷")
@@ -221,15 +233,16 @@ class ReviewService:
                 'error': f"审批失败: {str(e)}"
             }
     
-    def _get_knowledge_context(self):
+    def _get_knowledge_context(self, username=None):
         """获取知识背景"""
         try:
-            chapters = self.knowledge_base.get_chapters()
+            knowledge_base = self.get_knowledge_base(username)
+            chapters = knowledge_base.get_chapters()
             context_parts = []
             
             for chapter in chapters[:3]:  # 只取前3章作为背景
-                concepts = self.knowledge_base.get_concepts(chapter)
-                contents = self.knowledge_base.get_contents(chapter)
+                concepts = knowledge_base.get_concepts(chapter)
+                contents = knowledge_base.get_contents(chapter)
                 context_parts.append(f"{chapter}: {', '.join(concepts[:5])}")
             
             return "; ".join(context_parts)
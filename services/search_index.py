@@ -0,0 +1,240 @@
+"""
+知识点搜索索引 - 面向中文的倒排索引（概念与知识点名称，覆盖所有课程）
+
+中文按单字和相邻二元组切分，拉丁字母/数字按单词切分（并索引单词后缀以支持子串匹配）。
+每门课程单独建索引，课程文件变化（知识库缓存版本变化）时只重建该课程。
+"""
+import re
+import bisect
+import threading
+import unicodedata
+from models.course import CourseRegistry
+from models.knowledge import KnowledgeBaseCache
+
+_CJK_RE = re.compile(r'[㐀-䶿一-鿿豈-﫿]+')
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+# 匹配等级：数值越小排名越靠前
+MATCH_EXACT = 0
+MATCH_PREFIX = 1
+MATCH_SUBSTRING = 2
+MATCH_TERMS = 3
+MATCH_LABELS = {
+    MATCH_EXACT: 'exact',
+    MATCH_PREFIX: 'prefix',
+    MATCH_SUBSTRING: 'substring',
+    MATCH_TERMS: 'terms'
+}
+TYPE_ORDER = {'concept': 0, 'content': 1}
+
+
+def normalize(text):
+    """全角转半角、统一大小写"""
+    return unicodedata.normalize('NFKC', text or '').casefold().strip()
+
+
+def tokenize(text):
+    """将规范化后的文本切分为索引词（中文单字+二元组，拉丁单词）"""
+    tokens = set()
+    for run in _CJK_RE.findall(text):
+        tokens.update(run)
+        tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.update(_WORD_RE.findall(text))
+    return tokens
+
+
+def query_tokens(text):
+    """查询切分：中文尽量使用二元组，拉丁单词作为前缀在后缀表中查找"""
+    cjk_tokens = set()
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            cjk_tokens.add(run)
+        else:
+            cjk_tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return cjk_tokens, set(_WORD_RE.findall(text))
+
+
+class CourseIndex:
+    """单门课程的倒排索引"""
+
+    __slots__ = ('course', 'version', 'docs', 'postings', 'suffix_keys', 'suffix_postings')
+
+    def __init__(self, course, knowledge_base=None):
+        """由知识库构建索引；knowledge_base 为 None 时创建空索引，逐条 add 后调用 finish"""
+        self.course = course
+        self.version = knowledge_base.version if knowledge_base is not None else None
+        self.docs = []             # [(类型, 章节, 文本, 规范化文本, 章节序号)]
+        self.postings = {}         # {中文词: set(doc_id)}
+        self.suffix_postings = {}  # {拉丁单词后缀: set(doc_id)}
+        self.suffix_keys = []
+
+        if knowledge_base is not None:
+            for chapter_order, chapter in enumerate(knowledge_base.get_chapters()):
+                for item_type, items in (('concept', knowledge_base.get_concepts(chapter)),
+                                         ('content', knowledge_base.get_contents(chapter))):
+                    for text in items:
+                        self.add(item_type, chapter, text, chapter_order)
+            self.finish(knowledge_base.version)
+
+    def finish(self, version):
+        """逐条添加完成后排序后缀表并记录对应的知识库版本"""
+        self.version = version
+        self.suffix_keys = sorted(self.suffix_postings)
+
+    def add(self, item_type, chapter, text, chapter_order):
+        doc_id = len(self.docs)
+        normalized = normalize(text)
+        self.docs.append((item_type, chapter, text, normalized, chapter_order))
+
+        for token in tokenize(normalized):
+            if _WORD_RE.fullmatch(token):
+                for i in range(len(token)):
+                    self.suffix_postings.setdefault(token[i:], set()).add(doc_id)
+            else:
+                self.postings.setdefault(token, set()).add(doc_id)
+
+    def _latin_candidates(self, word):
+        """拉丁单词子串匹配：在排序的后缀表中做前缀扫描"""
+        matched = set()
+        start = bisect.bisect_left(self.suffix_keys, word)
+        for key in self.suffix_keys[start:]:
+            if not key.startswith(word):
+                break
+            matched |= self.suffix_postings[key]
+        return matched
+
+    def candidates(self, cjk_tokens, words):
+        """返回包含全部查询词的文档ID集合"""
+        result = None
+        for token in cjk_tokens:
+            docs = self.postings.get(token, set())
+            result = docs if result is None else result & docs
+            if not result:
+                return set()
+        for word in words:
+            docs = self._latin_candidates(word)
+            result = docs if result is None else result & docs
+            if not result:
+                return set()
+        return result or set()
+
+
+class SearchIndex:
+    """全课程搜索索引（进程级单例），按需增量重建"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(SearchIndex, cls).__new__(cls)
+                cls._instance._initialized = False
+            return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.course_indexes = {}  # {课程名称: CourseIndex}
+        self._build_lock = threading.Lock()
+        self.knowledge_cache = KnowledgeBaseCache()
+        self._initialized = True
+
+    def refresh(self, course_names=None):
+        """确保指定课程（默认全部）的索引与课程文件一致"""
+        entries = CourseRegistry().list_entries()
+        known = {entry['name'] for entry in entries}
+
+        for entry in entries:
+            if course_names is not None and entry['name'] not in course_names:
+                continue
+            try:
+                knowledge_base = self.knowledge_cache.get(entry['file'])
+            except Exception as e:
+                print(f"加载课程 {entry['name']} 知识库失败: {e}")
+                continue
+
+            index = self.course_indexes.get(entry['name'])
+            if index is None or index.version != knowledge_base.version:
+                with self._build_lock:
+                    index = self.course_indexes.get(entry['name'])
+                    if index is None or index.version != knowledge_base.version:
+                        self.course_indexes[entry['name']] = CourseIndex(entry['name'], knowledge_base)
+
+        # 移除已删除课程的索引
+        for name in list(self.course_indexes):
+            if name not in known:
+                self.course_indexes.pop(name, None)
+
+    def install(self, index):
+        """直接安装外部构建好的课程索引（流式导入时与课程文件同步构建）"""
+        with self._build_lock:
+            self.course_indexes[index.course] = index
+
+    def search(self, keyword, courses=None, page=1, page_size=20):
+        """搜索知识点，返回排序并分页后的结果
+
+        courses 为 None 时搜索全部课程，否则只搜索列表中的课程。
+        """
+        query = normalize(keyword)
+        if not query:
+            return {'results': [], 'total': 0, 'page': page, 'page_size': page_size}
+
+        self.refresh(set(courses) if courses is not None else None)
+        terms = query.split()
+        cjk_tokens, words = query_tokens(query)
+        course_order = {name: i for i, name in enumerate(courses or [])}
+
+        ranked = []
+        for course_name, index in list(self.course_indexes.items()):
+            if courses is not None and course_name not in course_order:
+                continue
+
+            for doc_id in index.candidates(cjk_tokens, words):
+                item_type, chapter, text, normalized, chapter_order = index.docs[doc_id]
+                match = self._match_level(query, terms, normalized)
+                if match is None:
+                    continue
+                ranked.append((
+                    (match, TYPE_ORDER.get(item_type, 2), course_order.get(course_name, 0),
+                     len(normalized), chapter_order, doc_id),
+                    course_name, item_type, chapter, text, match
+                ))
+
+        ranked.sort(key=lambda item: item[0])
+        start = (page - 1) * page_size
+        results = [{
+            'type': item_type,
+            'chapter': chapter,
+            'content': text,
+            'course': course_name,
+            'match': MATCH_LABELS[match]
+        } for _, course_name, item_type, chapter, text, match in ranked[start:start + page_size]]
+
+        return {
+            'results': results,
+            'total': len(ranked),
+            'page': page,
+            'page_size': page_size
+        }
+
+    @staticmethod
+    def _match_level(query, terms, normalized):
+        """候选文档的最终校验与匹配等级"""
+        if normalized == query:
+            return MATCH_EXACT
+        if normalized.startswith(query):
+            return MATCH_PREFIX
+        if query in normalized:
+            return MATCH_SUBSTRING
+        if len(terms) > 1 and all(term in normalized for term in terms):
+            return MATCH_TERMS
+        return None
+
+    def stats(self):
+        """索引统计信息"""
+        return {
+            'courses': len(self.course_indexes),
+            'documents': sum(len(index.docs) for index in self.course_indexes.values())
+        }
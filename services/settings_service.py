@@ -1,54 +1,224 @@
 """
 设置服务
+
+设置由进程级的 SettingsStore 统一持有：首次使用时加载一次，之后最多每隔
+REVALIDATE_INTERVAL 秒检查一次文件的 mtime/大小，其他进程写入后自动重新加载；
+设置变化时通知订阅者（如 AI 客户端配置、课程预热）。
+设置文件不存在时，AI 相关设置以应用配置（环境变量）为默认值写入。
+启动时应用配置（环境变量）优先：文件中的 AI 设置只有在设置页面保存过
+（带有 AI_SETTINGS_SAVED_KEY 时间戳）时才覆盖应用配置。
+SettingsService 保留原有接口，读写都委托给 SettingsStore。
+
+当前课程按用户保存（用户偏好 > 会话 > settings.json 中的全局默认课程），
+切换课程默认只影响当前用户，全局默认课程仅在 scope='global' 时修改。
 """
 import os
 import json
+import time
+import threading
 import subprocess
 import requests
-from flask import current_app
+from flask import current_app, session, has_request_context
+from services.model_catalog import ModelCatalog
+
+SETTINGS_FILE = 'data/settings.json'
+AI_SETTINGS_SAVED_KEY = 'ai_settings_saved_at'  # 在设置页面保存 AI 设置的时间
+REVALIDATE_INTERVAL = 0.5  # 秒
+
+DEFAULT_SETTINGS = {
+    'ollama_api_url': 'http://127.0.0.1:11434/api/chat',
+    'ollama_model': 'gemma3:27b',
+    'current_course': '数据库原理',
+    'created_at': '2024-01-01T00:00:00',
+    'updated_at': '2024-01-01T00:00:00'
+}
+
+
+def _log(level, message):
+    """有应用上下文时写应用日志，否则打印"""
+    try:
+        getattr(current_app.logger, level)(message)
+    except RuntimeError:
+        print(message)
+
+
+class SettingsStore:
+    """设置存储（进程级单例）"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(SettingsStore, cls).__new__(cls)
+                cls._instance._initialized = False
+            return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.path = SETTINGS_FILE
+        self.interval = REVALIDATE_INTERVAL
+        self.defaults = dict(DEFAULT_SETTINGS)  # 创建设置文件时写入的默认设置
+        self.data = None      # 当前设置（只整体替换，不原地修改）
+        self.stat = None      # 加载时文件的 (mtime_ns, size)
+        self.checked_at = 0.0
+        self.loads = 0
+        self.subscribers = {}  # {名称: fn(旧设置, 新设置)}
+        self._load_lock = threading.RLock()
+        self._initialized = True
+
+    def configure(self, interval=None, defaults=None):
+        """配置检查间隔；defaults 覆盖创建设置文件时使用的默认值（如来自环境变量的 AI 配置）"""
+        if interval is not None:
+            self.interval = interval
+        if defaults:
+            self.defaults = {**DEFAULT_SETTINGS, **{k: v for k, v in defaults.items() if v}}
+
+    def subscribe(self, name, subscriber):
+        """注册设置变化订阅者（同名覆盖）"""
+        self.subscribers[name] = subscriber
+
+    def unsubscribe(self, name):
+        self.subscribers.pop(name, None)
+
+    def _notify(self, old, new):
+        for name, subscriber in list(self.subscribers.items()):
+            try:
+                subscriber(old, new)
+            except Exception as e:
+                _log('error', f"设置订阅者 {name} 处理失败: {e}")
+
+    @staticmethod
+    def _file_stat(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _current(self):
+        """返回最新设置，必要时按文件 mtime 重新加载"""
+        data = self.data
+        if data is not None and time.monotonic() - self.checked_at < self.interval:
+            return data
+
+        changed = None
+        with self._load_lock:
+            stat = self._file_stat(self.path)
+            if self.data is None or stat != self.stat:
+                old = self.data
+                self.data = self._read_file(stat)
+                self.stat = self._file_stat(self.path)
+                self.loads += 1
+                if old is not None:
+                    changed = (old, self.data)
+            self.checked_at = time.monotonic()
+            data = self.data
+
+        if changed:
+            self._notify(*changed)
+        return data
+
+    def _read_file(self, stat):
+        """读取设置文件；文件不存在或损坏时写入默认设置"""
+        if stat is not None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    content = f.read().strip()
+                if not content:
+                    raise ValueError("文件为空")
+                data = json.loads(content)
+                if isinstance(data, dict):
+                    return data
+            except (OSError, ValueError) as e:
+                _log('warning', f"设置文件损坏，重新创建: {e}")
+
+        data = dict(self.defaults)
+        if not self._write_file(data):
+            return dict(self.defaults)
+        return data
+
+    def _write_file(self, settings):
+        """原子写入：先写入临时文件，再重命名"""
+        temp_file = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(settings, f, ensure_ascii=False, indent=2)
+
+            try:
+                os.replace(temp_file, self.path)
+            except OSError:
+                # Windows 下目标文件被占用时 replace 可能失败，先删除再重命名
+                os.remove(self.path)
+                os.rename(temp_file, self.path)
+            return True
+        except Exception as e:
+            _log('error', f"保存设置失败: {e}")
+            if os.path.exists(temp_file):
+                try:
+                    os.remove(temp_file)
+                except OSError:
+                    pass
+            return False
+
+    def get(self, key=None, default=None):
+        """读取设置：key 为空时返回全部设置的副本"""
+        data = self._current()
+        if key is None:
+            return dict(data)
+        return data.get(key, default)
+
+    def save(self, settings):
+        """保存全部设置并通知订阅者"""
+        from datetime import datetime
+        new = dict(settings)
+        new['updated_at'] = datetime.utcnow().isoformat()
+
+        with self._load_lock:
+            old = self._current()
+            if not self._write_file(new):
+                return False
+            self.data = new
+            self.stat = self._file_stat(self.path)
+            self.checked_at = time.monotonic()
+
+        settings['updated_at'] = new['updated_at']
+        self._notify(old, new)
+        return True
+
+    def update(self, **changes):
+        """修改部分设置"""
+        settings = self.get()
+        settings.update(changes)
+        return self.save(settings)
+
+    def stats(self):
+        return {'loads': self.loads, 'interval': self.interval, 'subscribers': sorted(self.subscribers)}
+
 
 class SettingsService:
     """设置服务类"""
     
-    SETTINGS_FILE = 'data/settings.json'
+    SETTINGS_FILE = SETTINGS_FILE
     
     def __init__(self):
-        self.ensure_settings_file()
+        self.store = SettingsStore()
     
     def ensure_settings_file(self):
-        """确保设置文件存在"""
+        """确保设置文件存在（不存在或损坏时由 SettingsStore 写入默认设置）"""
         try:
-            if not os.path.exists(self.SETTINGS_FILE):
-                os.makedirs(os.path.dirname(self.SETTINGS_FILE), exist_ok=True)
-                default_settings = {
-                    'ollama_api_url': 'http://127.0.0.1:11434/api/chat',
-                    'ollama_model': 'gemma3:27b',
-                    'current_course': '数据库原理',
-                    'created_at': '2024-01-01T00:00:00',
-                    'updated_at': '2024-01-01T00:00:00'
-                }
-                self.save_settings(default_settings)
-            else:
-                # 验证现有文件是否有效
-                try:
-                    with open(self.SETTINGS_FILE, 'r', encoding='utf-8') as f:
-                        content = f.read().strip()
-                        if not content:
-                            raise ValueError("文件为空")
-                        json.loads(content)
-                except (json.JSONDecodeError, ValueError):
-                    # 文件损坏，重新创建
-                    current_app.logger.warning("设置文件损坏，重新创建")
-                    default_settings = self.get_default_settings()
-                    self.save_settings(default_settings)
+            self.store.get()
         except Exception as e:
             current_app.logger.error(f"初始化设置文件失败: {e}")
     
     def load_settings(self):
-        """加载设置"""
+        """加载设置（返回副本，可直接修改后保存）"""
         try:
-            with open(self.SETTINGS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return self.store.get()
         except Exception as e:
             current_app.logger.error(f"加载设置失败: {e}")
             return self.get_default_settings()
@@ -56,72 +226,27 @@ class SettingsService:
     def save_settings(self, settings):
         """保存设置"""
         try:
-            # 更新时间戳
-            from datetime import datetime
-            settings['updated_at'] = datetime.utcnow().isoformat()
-            
-            # 原子写入：先写入临时文件，再重命名
-            temp_file = f"{self.SETTINGS_FILE}.tmp"
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(settings, f, ensure_ascii=False, indent=2)
-            
-            # Windows下重命名需要先删除目标文件
-            if os.path.exists(self.SETTINGS_FILE):
-                try:
-                    os.replace(temp_file, self.SETTINGS_FILE)
-                except OSError:
-                    # 如果replace失败（如文件被占用），尝试删除后重命名
-                    os.remove(self.SETTINGS_FILE)
-                    os.rename(temp_file, self.SETTINGS_FILE)
-            else:
-                os.rename(temp_file, self.SETTINGS_FILE)
-                
-            return True
+            return self.store.save(settings)
         except Exception as e:
             current_app.logger.error(f"保存设置失败: {e}")
-            if os.path.exists(f"{self.SETTINGS_FILE}.tmp"):
-                try:
-                    os.remove(f"{self.SETTINGS_FILE}.tmp")
-                except:
-                    pass
             return False
     
     def get_default_settings(self):
         """获取默认设置"""
-        return {
-            'ollama_api_url': 'http://127.0.0.1:11434/api/chat',
-            'ollama_model': 'gemma3:27b',
-            'current_course': '数据库原理',
-            'created_at': '2024-01-01T00:00:00',
-            'updated_at': '2024-01-01T00:00:00'
-        }
+        return dict(self.store.defaults)
     
-    def get_available_models(self):
-        """获取可用的Ollama模型"""
+    def get_available_models(self, refresh=False):
+        """获取可用的Ollama模型（读取后台刷新的模型目录，refresh 为真时立即刷新一次）"""
         try:
-            # 尝试从配置获取API URL，如果失败则使用默认值
-            settings = self.load_settings()
-            api_url = settings.get('ollama_api_url', 'http://127.0.0.1:11434/api/chat')
-            
-            # 构造tags API URL (假设API URL是 /api/chat，我们需要 /api/tags)
-            base_url = api_url.replace('/api/chat', '')
-            tags_url = f"{base_url}/api/tags"
-            
-            try:
-                response = requests.get(tags_url, timeout=5)
-                if response.status_code == 200:
-                    data = response.json()
-                    models = []
-                    if 'models' in data:
-                        for model in data['models']:
-                            models.append(model['name'])
-                    return models
-            except Exception as e:
-                current_app.logger.warning(f"通过API获取模型失败: {e}")
-            
-            # 如果API失败，尝试使用默认列表或返回空
-            return []
-            
+            catalog = ModelCatalog()
+            if catalog.base_url is None:
+                catalog.set_api_url(current_app.config['OLLAMA_API_URL'])
+            if refresh:
+                catalog.refresh()
+            elif catalog.refreshed_at is None:
+                # 尚未刷新过（监视线程未启动或刚启动）：先返回空列表，后台刷新
+                catalog.request_refresh()
+            return catalog.model_names()
         except Exception as e:
             current_app.logger.error(f"获取模型列表异常: {e}")
             return []
@@ -189,17 +314,15 @@ class SettingsService:
     def update_ollama_settings(self, api_url, model_name):
         """更新Ollama设置"""
         try:
-            settings = self.load_settings()
-            settings['ollama_api_url'] = api_url
-            settings['ollama_model'] = model_name
-            
-            if self.save_settings(settings):
-                # 更新应用配置（需要重启才能完全生效）
+            from datetime import datetime
+            if self.store.update(ollama_api_url=api_url, ollama_model=model_name,
+                                 **{AI_SETTINGS_SAVED_KEY: datetime.utcnow().isoformat()}):
+                # 本进程立即生效，其他工作进程在下次检查设置文件时由设置订阅者同步
                 current_app.config['OLLAMA_API_URL'] = api_url
                 current_app.config['OLLAMA_MODEL'] = model_name
                 return {
                     'success': True,
-                    'message': '设置已保存，重启应用后完全生效'
+                    'message': '设置已保存并已生效'
                 }
             else:
                 return {
@@ -212,21 +335,57 @@ class SettingsService:
                 'message': f'更新设置失败: {str(e)}'
             }
     
-    def get_current_course(self):
-        """获取当前课程"""
-        settings = self.load_settings()
-        return settings.get('current_course', '数据库原理')
+    def get_default_course(self):
+        """获取全局默认课程"""
+        try:
+            return self.store.get('current_course', '数据库原理')
+        except Exception as e:
+            current_app.logger.error(f"加载设置失败: {e}")
+            return '数据库原理'
+
+    def get_current_course(self, username=None):
+        """获取当前课程：用户偏好 > 会话 > 全局默认课程
+
+        未指定用户名时在请求中使用会话中的用户；后台任务中需显式传入用户名。
+        """
+        from services.preference_service import PreferenceService, is_anonymous
+        in_request = has_request_context()
+        if username is None and in_request:
+            username = session.get('username')
+
+        if not is_anonymous(username):
+            course = PreferenceService().get(username, 'current_course')
+            if course:
+                return course
+        if in_request and session.get('current_course'):
+            return session['current_course']
+        return self.get_default_course()
     
-    def set_current_course(self, course_name):
-        """设置当前课程"""
+    def set_current_course(self, course_name, username=None, scope='user'):
+        """设置当前课程
+
+        scope 为 'user' 时保存为用户偏好（匿名用户只保存在会话中），
+        为 'global' 时修改全局默认课程。
+        """
+        from services.preference_service import PreferenceService, is_anonymous
         try:
-            settings = self.load_settings()
-            settings['current_course'] = course_name
-            
-            if self.save_settings(settings):
+            if scope == 'global':
+                saved = self.store.update(current_course=course_name)
+            else:
+                if username is None and has_request_context():
+                    username = session.get('username')
+                saved = True
+                if not is_anonymous(username):
+                    saved = PreferenceService().set(username, 'current_course', course_name)
+
+            if saved and has_request_context():
+                session['current_course'] = course_name
+
+            if saved:
                 return {
                     'success': True,
-                    'message': '课程切换成功'
+                    'message': '默认课程已修改' if scope == 'global' else '课程切换成功',
+                    'scope': scope
                 }
             else:
                 return {
@@ -0,0 +1,175 @@
+"""
+输入联想索引 - 基于前缀树的概念/知识点名称联想，支持拼音全拼与首字母匹配
+
+每门课程单独构建前缀树，每个节点预先保存排名最高的前 TOP_K 个条目，
+查询只需沿前缀走到对应节点；课程知识库版本变化时按需重建。
+拼音匹配依赖可选的 pypinyin，未安装时只支持名称前缀匹配。
+"""
+import re
+import heapq
+import threading
+from models.course import CourseRegistry
+from models.knowledge import KnowledgeBaseCache
+from services.search_index import normalize
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:  # pragma: no cover - 可选依赖
+    lazy_pinyin = None
+    Style = None
+
+TOP_K = 20
+_KEY_STRIP_RE = re.compile(r'[\s\W_]+')
+
+
+def pinyin_keys(text):
+    """生成名称的拼音全拼与首字母键（非中文部分原样保留）"""
+    if lazy_pinyin is None:
+        return ()
+    full = _KEY_STRIP_RE.sub('', ''.join(lazy_pinyin(text)).lower())
+    initials = _KEY_STRIP_RE.sub('', ''.join(lazy_pinyin(text, style=Style.FIRST_LETTER)).lower())
+    return tuple(key for key in {full, initials} if key)
+
+
+class _TrieNode:
+    __slots__ = ('children', 'items')
+
+    def __init__(self):
+        self.children = {}
+        self.items = []  # 按排名升序的条目序号，最多 TOP_K 个
+
+
+class CourseTrie:
+    """单门课程的联想前缀树"""
+
+    __slots__ = ('course', 'version', 'items', 'keys', 'root')
+
+    def __init__(self, course, knowledge_base):
+        self.course = course
+        self.version = knowledge_base.version
+        self.root = _TrieNode()
+
+        items = {}
+        for chapter_order, chapter in enumerate(knowledge_base.get_chapters()):
+            for item_type, names in (('concept', knowledge_base.get_concepts(chapter)),
+                                     ('content', knowledge_base.get_contents(chapter))):
+                for name in names:
+                    items.setdefault((name, item_type), (chapter_order, chapter))
+
+        # 排名：概念优先，名称越短越靠前，其次按章节顺序
+        ranked = sorted(items.items(), key=lambda item: (
+            item[0][1] != 'concept', len(item[0][0]), item[1][0]
+        ))
+        self.items = [(name, item_type, chapter) for (name, item_type), (_, chapter) in ranked]
+        self.keys = []  # 每个条目的全部联想键，用于判断完全匹配
+
+        # 按排名顺序插入，节点列表自然保持前 TOP_K
+        for item_id, (name, _, _) in enumerate(self.items):
+            normalized = normalize(name)
+            keys = frozenset({normalized, _KEY_STRIP_RE.sub('', normalized), *pinyin_keys(name)})
+            self.keys.append(keys)
+            for key in keys:
+                self._insert(key, item_id)
+
+    def _insert(self, key, item_id):
+        node = self.root
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+            items = node.items
+            if len(items) < TOP_K and (not items or items[-1] != item_id):
+                items.append(item_id)
+
+    def lookup(self, prefix):
+        """返回前缀对应节点的条目序号（按排名）"""
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.items
+
+
+class SuggestIndex:
+    """输入联想索引（进程级单例）"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(SuggestIndex, cls).__new__(cls)
+                cls._instance._initialized = False
+            return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.tries = {}  # {课程名称: CourseTrie}
+        self._build_lock = threading.Lock()
+        self.knowledge_cache = KnowledgeBaseCache()
+        self._initialized = True
+
+    def _get_trie(self, entry):
+        knowledge_base = self.knowledge_cache.get(entry['file'])
+        trie = self.tries.get(entry['name'])
+        if trie is None or trie.version != knowledge_base.version:
+            with self._build_lock:
+                trie = self.tries.get(entry['name'])
+                if trie is None or trie.version != knowledge_base.version:
+                    trie = CourseTrie(entry['name'], knowledge_base)
+                    self.tries[entry['name']] = trie
+        return trie
+
+    def warm(self, course_name):
+        """预先构建课程的联想树，返回条目数（课程不存在时返回 0）"""
+        entry = CourseRegistry().get_entry(course_name)
+        if entry is None:
+            return 0
+        return len(self._get_trie(entry).items)
+
+    def suggest(self, prefix, courses=None, limit=10):
+        """返回名称或拼音以 prefix 开头的前 limit 个条目
+
+        courses 为 None 时在全部课程中联想，否则按列表顺序合并各课程结果。
+        """
+        normalized = normalize(prefix)
+        key = _KEY_STRIP_RE.sub('', normalized)
+        if not key:
+            return []
+        limit = min(limit, TOP_K)
+
+        registry = CourseRegistry()
+        entries = registry.list_entries() if courses is None else \
+            [entry for entry in (registry.get_entry(name) for name in courses) if entry]
+
+        matches = []
+        for course_order, entry in enumerate(entries):
+            try:
+                trie = self._get_trie(entry)
+            except Exception as e:
+                print(f"加载课程 {entry['name']} 知识库失败: {e}")
+                continue
+            # 名称原样前缀匹配（保留空格等字符），再补充去除空白和符号后的键匹配
+            item_ids = trie.lookup(normalized)
+            if key != normalized:
+                item_ids = list(heapq.merge(item_ids, trie.lookup(key)))
+            seen = set()
+            for item_id in item_ids:
+                if item_id in seen:
+                    continue
+                seen.add(item_id)
+                name, item_type, _ = trie.items[item_id]
+                # 跨课程排序：完全匹配优先，其次概念优先、名称越短越靠前
+                exact = normalized in trie.keys[item_id] or key in trie.keys[item_id]
+                rank = (not exact, item_type != 'concept', len(name), course_order, item_id)
+                matches.append((rank, trie.course, trie.items[item_id]))
+
+        matches.sort(key=lambda match: match[0])
+        return [{
+            'text': name,
+            'type': item_type,
+            'chapter': chapter,
+            'course': course_name
+        } for _, course_name, (name, item_type, chapter) in matches[:limit]]
@@ -1,116 +1,357 @@
 """
 任务服务 - 处理异步后台任务
+
+任务在本进程的线程池中执行，状态、进度和结果写入所有工作进程共享的 TaskStore，
+任意进程都能查询任务状态；执行中的任务由心跳线程定期刷新心跳，
+进程退出后其未完成任务在心跳超时后被标记为失败。
+进度变化以事件形式记录，stream_events 按事件 id 增量产出，供 SSE 推送使用。
+
+注册的任务类型（services.jobs）通过 enqueue 提交，可以交给独立的 worker 进程执行，
+Web 进程只负责入队和查询状态。
+
+任务结果只保存汇总，逐条明细（result['items']）由任务存储单独保存、分页读取；
+每个任务结束后按 TASK_MAX_FINISHED / TASK_RESULT_MAX_BYTES 提前清理最早结束的任务。
+
+用户提交的任务受 TASK_QUEUE_MAX（等待执行的任务总数）与 TASK_QUEUE_MAX_PER_USER（每个用户未结束的任务数）限制，
+超出时抛出 QueueFull；等待执行的任务状态中附带排队位置与预计开始时间。
+
+取消与暂停是协作式的：长任务在处理条目之间调用模块级的 checkpoint()，
+暂停时在此等待继续，请求取消时返回 True 由任务自行停止并返回已完成的部分结果。
 """
+import os
 import uuid
+import socket
+import sqlite3
 import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
-from flask import current_app
+from contextlib import contextmanager
+from flask import current_app, has_request_context, session
+from services.task_store import TaskStore, QueueFull, ACTIVE_STATUSES, TERMINAL_STATUSES
+
+HEARTBEAT_INTERVAL = 5.0  # 秒
+PAUSE_CHECK_INTERVAL = 1.0  # 暂停期间检查继续/取消请求的间隔（秒）
+PAUSE_TIMEOUT = 3600.0      # 暂停超过此时间自动取消，释放占用的执行线程（秒）
+LOCK_WAIT_INTERVAL = 2.0    # 等待其他任务释放锁时的检查间隔（秒）
+
+_current = threading.local()  # 当前线程正在执行的任务
+
+# 返回给客户端的任务字段（不含任务参数 payload、去重键、所属进程与用户等内部字段）
+PUBLIC_TASK_FIELDS = ('id', 'kind', 'status', 'progress', 'message', 'details', 'result', 'error', 'control',
+                      'created_at', 'updated_at', 'queue')
+
+
+def public_task(task):
+    """只保留可以返回给客户端的任务字段"""
+    if task is None:
+        return None
+    return {key: task[key] for key in PUBLIC_TASK_FIELDS if key in task}
+
+
+def checkpoint():
+    """在长任务的条目之间调用：暂停时等待继续；请求取消时返回 True。不在任务线程中时返回 False"""
+    task_id = getattr(_current, 'task_id', None)
+    if task_id is None:
+        return False
+    return TaskService().checkpoint(task_id)
+
+
+@contextmanager
+def exclusive(name, wait_message='等待其他任务完成'):
+    """任务间的跨进程互斥：锁被其他未结束的任务持有时等待（期间响应暂停/取消），产出是否等待过
+
+    不在任务线程中时不加锁；等待中被取消时不持有锁直接产出，由调用方通过 cancelled() 判断。
+    """
+    task_id = getattr(_current, 'task_id', None)
+    if task_id is None:
+        yield False
+        return
+
+    service = TaskService()
+    waited = False
+    while not service.store.acquire_lock(name, task_id):
+        if not waited:
+            waited = True
+            service.update_task(task_id, message=wait_message)
+        if checkpoint():
+            break
+        time.sleep(LOCK_WAIT_INTERVAL)
+    try:
+        yield waited
+    finally:
+        service.store.release_lock(name, task_id)
+
+
+def cancelled():
+    """当前任务是否已在 checkpoint() 处响应了取消请求"""
+    return getattr(_current, 'task_id', None) is not None and getattr(_current, 'cancelled', False)
+
 
 class TaskService:
     """任务服务类"""
-    
+
     _instance = None
     _lock = threading.Lock()
-    
+
     def __new__(cls):
         with cls._lock:
             if cls._instance is None:
                 cls._instance = super(TaskService, cls).__new__(cls)
                 cls._instance._initialized = False
             return cls._instance
-    
+
     def __init__(self):
         if self._initialized:
             return
-            
+
         self.executor = ThreadPoolExecutor(max_workers=4)
-        self.tasks = {}  # 存储任务状态: {task_id: {status, result, error, progress, ...}}
+        self.store = TaskStore.default()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.active = set()  # 本进程持有的未完成任务
         self._initialized = True
-        
-        # 启动清理线程
+
+        # 启动心跳线程与清理线程
+        self.heartbeat_thread = threading.Thread(target=self._heartbeat, name='task-heartbeat', daemon=True)
+        self.heartbeat_thread.start()
         self.cleanup_thread = threading.Thread(target=self._cleanup_tasks, daemon=True)
         self.cleanup_thread.start()
-    
+
     def submit_task(self, func, *args, **kwargs):
-        """提交任务"""
+        """提交任务（在本进程的线程池中执行任意可调用对象，用于只影响本进程的任务，如缓存预热）
+
+        这类系统任务不属于任何用户：不计入用户的任务数上限，也不出现在用户的任务推送中。
+        """
         task_id = str(uuid.uuid4())
-        
-        self.tasks[task_id] = {
-            'id': task_id,
-            'status': 'pending',
-            'progress': 0,
-            'created_at': time.time(),
-            'result': None,
-            'error': None,
-            'message': '任务已提交'
-        }
-        
-        def task_wrapper(tid, f, *a, **kw):
-            try:
-                self.update_task(tid, status='running', message='任务正在执行')
-                
-                # 注入进度回调
-                if 'progress_callback' not in kw:
-                    kw['progress_callback'] = lambda p: self.update_progress(tid, p)
-                
-                result = f(*a, **kw)
-                self.update_task(tid, status='completed', result=result, progress=100, message='任务完成')
-            except Exception as e:
-                current_app.logger.error(f"任务 {tid} 执行失败: {e}")
-                self.update_task(tid, status='failed', error=str(e), message=f'任务失败: {str(e)}')
-        
+        self.store.create(task_id, getattr(func, '__name__', 'task'), self.owner)
+        self._execute(task_id, func, args, kwargs)
+        return task_id
+
+    def enqueue(self, kind, *args, **kwargs):
+        """提交注册的任务类型（见 services.jobs），参数需可 JSON 序列化，返回任务 id（系统任务，不属于任何用户）
+
+        TASK_EXECUTION_MODE 为 'worker' 时只写入队列，由独立 worker 进程（python -m worker）领取执行；
+        为 'thread'（默认）时在本进程的线程池中执行。
+        """
+        return self.enqueue_job(kind, args, kwargs)['task_id']
+
+    def enqueue_job(self, kind, args=(), kwargs=None, idempotency_key=None, from_user=False):
+        """提交任务并去重，返回 {'task_id', 'created'}
+
+        提供 idempotency_key（客户端生成）时按用户与该键去重，保留期内即使任务已结束也返回同一任务；
+        否则使用任务类型的去重键（如 课程+章节），只与未结束的任务去重。
+        from_user 为真时任务属于当前会话的用户，并检查队列上限，超出时抛出 QueueFull（重复提交返回已有任务，不受上限影响）；
+        否则为系统任务，不记录用户。
+        """
+        from services.jobs import get_job, dedup_key
+        func = get_job(kind)
+        kwargs = dict(kwargs or {})
+        username = self._username() if from_user else None
+        if idempotency_key:
+            key, active_only = f'client:{username}:{idempotency_key}', False
+        else:
+            key, active_only = dedup_key(kind, args, kwargs), True
+
+        if key is not None:
+            existing = self.store.find_by_key(key, active_only=active_only)
+            if existing is not None:
+                current_app.logger.info(f"重复提交任务 {kind}，返回已有任务 {existing['id']}")
+                return {'task_id': existing['id'], 'created': False}
+
+        task_id = str(uuid.uuid4())
+        payload = {'args': list(args), 'kwargs': kwargs}
+        config = current_app.config
+        local = config.get('TASK_EXECUTION_MODE', 'thread') != 'worker'
+        limits = None
+        if from_user:
+            limits = {'max_queued': config.get('TASK_QUEUE_MAX'), 'max_per_user': config.get('TASK_QUEUE_MAX_PER_USER')}
+        try:
+            self.store.create(task_id, kind, self.owner if local else None, username=username,
+                              message='任务已提交' if local else '任务已排队', payload=payload, dedup_key=key,
+                              limits=limits)
+        except QueueFull as e:
+            current_app.logger.warning(f"拒绝提交任务 {kind}（用户 {username}）: {e}")
+            raise
+        except sqlite3.IntegrityError:
+            # 并发提交：另一个请求刚创建了相同键的任务
+            existing = self.store.find_by_key(key)
+            if existing is None:
+                raise
+            return {'task_id': existing['id'], 'created': False}
+
+        if local:
+            self._execute(task_id, func, args, kwargs)
+        return {'task_id': task_id, 'created': True}
+
+    @staticmethod
+    def _username():
+        return session.get('username', 'anonymous') if has_request_context() else None
+
+    def _execute(self, task_id, func, args, kwargs):
+        """在本进程的线程池中执行任务"""
+        self.active.add(task_id)
         # 使用应用上下文，因为很多服务需要访问 current_app
         app = current_app._get_current_object()
-        
-        def context_wrapper(tid, f, *a, **kw):
+
+        def context_wrapper():
             with app.app_context():
-                task_wrapper(tid, f, *a, **kw)
-                
-        self.executor.submit(context_wrapper, task_id, func, *args, **kwargs)
-        return task_id
-    
+                self.run(task_id, func, args, kwargs)
+
+        self.executor.submit(context_wrapper)
+
+    def run(self, task_id, func, args=(), kwargs=None):
+        """在当前线程中执行任务并记录状态与结果（需要应用上下文）"""
+        kwargs = dict(kwargs or {})
+        self.active.add(task_id)
+        _current.task_id = task_id
+        _current.cancelled = False
+        try:
+            if self.store.get_control(task_id) == 'cancel':
+                self.update_task(task_id, status='cancelled', control=None, message='任务已取消')
+                return
+            self.update_task(task_id, status='running', message='任务正在执行')
+
+            # 注入进度回调
+            if 'progress_callback' not in kwargs:
+                kwargs['progress_callback'] = lambda p: self.update_progress(task_id, p)
+
+            result = func(*args, **kwargs)
+            if _current.cancelled:
+                # 保留已完成部分的结果
+                self.update_task(task_id, status='cancelled', result=result, control=None,
+                                 message='任务已取消，已保留完成的部分')
+            else:
+                self.update_task(task_id, status='completed', result=result, progress=100, control=None,
+                                 message='任务完成')
+        except Exception as e:
+            current_app.logger.error(f"任务 {task_id} 执行失败: {e}")
+            self.update_task(task_id, status='failed', error=str(e), control=None, message=f'任务失败: {str(e)}')
+        finally:
+            _current.task_id = None
+            self.active.discard(task_id)
+            self._evict_finished()
+
+    def _evict_finished(self):
+        """已结束任务的数量或结果总大小超出上限时，提前删除最早结束的任务（不必等到24小时清理）"""
+        config = current_app.config
+        try:
+            evicted = self.store.purge(
+                max_finished=config.get('TASK_MAX_FINISHED'),
+                max_bytes=config.get('TASK_RESULT_MAX_BYTES')
+            )
+            if evicted:
+                current_app.logger.info(f"任务存储超出上限，已清理 {evicted} 个已结束的任务")
+        except Exception as e:
+            current_app.logger.error(f"清理已结束的任务失败: {e}")
+
     def get_task(self, task_id):
-        """获取任务状态"""
-        return self.tasks.get(task_id)
-    
+        """获取任务状态（等待执行时附带 queue: 排队位置与预计开始时间）"""
+        task = self.store.get(task_id)
+        if task is not None and task['status'] == 'pending':
+            task['queue'] = self.store.queue_info(task)
+        return task
+
+    def get_results(self, task_id, page=1, page_size=50, status=None):
+        """分页获取任务结果明细"""
+        items, total = self.store.results(task_id, offset=(page - 1) * page_size, limit=page_size, status=status)
+        return {'items': items, 'total': total, 'page': page, 'page_size': page_size}
+
     def update_task(self, task_id, **kwargs):
         """更新任务状态"""
-        if task_id in self.tasks:
-            self.tasks[task_id].update(kwargs)
-            self.tasks[task_id]['updated_at'] = time.time()
-            
+        self.store.update(task_id, **kwargs)
+
+    def control_task(self, task_id, action):
+        """取消/暂停/继续任务（action 为 cancel、pause 或 resume）"""
+        controls = {'cancel': 'cancel', 'pause': 'pause', 'resume': None}
+        if action not in controls:
+            return {'success': False, 'error': f'不支持的操作: {action}'}
+
+        task = self.store.get(task_id)
+        if task is None:
+            return {'success': False, 'error': '任务不存在'}
+        if task['status'] not in ACTIVE_STATUSES:
+            return {'success': False, 'error': '任务已结束', 'task': task}
+        if not self.store.request_control(task_id, controls[action]):
+            return {'success': False, 'error': '任务已结束或已请求取消', 'task': self.store.get(task_id)}
+        return {'success': True, 'task': self.store.get(task_id)}
+
+    def checkpoint(self, task_id):
+        """读取任务的控制请求：暂停时阻塞到继续或取消；返回是否应当停止"""
+        control = self.store.get_control(task_id)
+        if control == 'pause':
+            self.update_task(task_id, status='paused', message='任务已暂停')
+            paused_at = time.monotonic()
+            while control == 'pause':
+                if time.monotonic() - paused_at > PAUSE_TIMEOUT:
+                    self.store.request_control(task_id, 'cancel')
+                time.sleep(PAUSE_CHECK_INTERVAL)
+                control = self.store.get_control(task_id)
+            if control != 'cancel':
+                self.update_task(task_id, status='running', message='任务已继续')
+        if control == 'cancel':
+            _current.cancelled = True
+            self.update_task(task_id, message='正在取消任务...')
+            return True
+        return False
+
     def update_progress(self, task_id, progress_data):
         """更新进度"""
-        if task_id in self.tasks:
-            # 如果是简单的数字进度
-            if isinstance(progress_data, (int, float)):
-                self.tasks[task_id]['progress'] = progress_data
-            # 如果是详细的进度对象
-            elif isinstance(progress_data, dict):
-                if 'percentage' in progress_data:
-                    self.tasks[task_id]['progress'] = progress_data['percentage']
-                self.tasks[task_id]['details'] = progress_data
-                
-                # 更新消息
-                if 'chapter' in progress_data and 'concept' in progress_data:
-                    self.tasks[task_id]['message'] = f"正在生成: {progress_data['chapter']} - {progress_data['concept']}"
-    
+        # 如果是简单的数字进度
+        if isinstance(progress_data, (int, float)):
+            self.store.update(task_id, progress=progress_data)
+        # 如果是详细的进度对象
+        elif isinstance(progress_data, dict):
+            fields = {'details': progress_data}
+            if 'percentage' in progress_data:
+                fields['progress'] = progress_data['percentage']
+
+            # 更新消息
+            if 'message' in progress_data:
+                fields['message'] = progress_data['message']
+            elif 'chapter' in progress_data and 'concept' in progress_data:
+                fields['message'] = f"正在生成: {progress_data['chapter']} - {progress_data['concept']}"
+            self.store.update(task_id, **fields)
+
+    def stream_events(self, task_id=None, username=None, after_id=0, max_duration=55.0, poll_interval=1.0):
+        """增量产出任务事件 (事件id, 任务id, 变化字段)
+
+        本进程内的变化立即唤醒，其他进程执行的任务按 poll_interval 轮询事件表；
+        没有新事件时产出 None 作为保活信号。单个任务结束后或超过 max_duration 秒后停止，
+        由客户端携带 Last-Event-ID 重新连接。
+        """
+        deadline = time.monotonic() + max_duration
+        while True:
+            events = self.store.events(task_id=task_id, username=username, after_id=after_id)
+            for event in events:
+                after_id = event['id']
+                yield event['id'], event['task_id'], event['data']
+                if task_id is not None and event['data'].get('status') in TERMINAL_STATUSES:
+                    return
+            if not events:
+                if task_id is not None:
+                    self.store.get(task_id)  # 触发心跳超时检测，所属进程退出时产生失败事件
+                yield None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if not events:
+                self.store.wait_for_change(min(poll_interval, remaining))
+
+    def _heartbeat(self):
+        """定期刷新本进程持有的任务心跳"""
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                self.store.heartbeat(list(self.active))
+            except Exception as e:
+                print(f"刷新任务心跳出错: {e}")
+
     def _cleanup_tasks(self):
-        """定期清理过期任务"""
+        """定期清理过期任务并标记心跳超时的任务"""
         while True:
             try:
                 time.sleep(3600)  # 每小时清理一次
-                now = time.time()
-                expired_tasks = []
-                
-                for tid, task in self.tasks.items():
-                    # 清理24小时前的任务
-                    if now - task['created_at'] > 86400:
-                        expired_tasks.append(tid)
-                        
-                for tid in expired_tasks:
-                    del self.tasks[tid]
-                    
+                self.store.mark_stale()
+                # 清理24小时前的任务
+                self.store.purge()
             except Exception as e:
                 print(f"任务清理出错: {e}")
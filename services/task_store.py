@@ -0,0 +1,550 @@
+"""
+任务存储 - 后台任务的状态、进度、心跳与结果保存在 SQLite（WAL）中
+
+所有工作进程共享同一数据库，任务状态查询可以落在任意进程上；进程重启后已完成任务的结果仍可查询。
+执行任务的进程定期刷新心跳，心跳超过 STALE_AFTER 秒未更新的未完成任务视为所属进程已退出，
+读取时标记为失败。
+
+每次状态/进度变化同时追加一条只含变化字段的事件（task_events，自增 id 即事件 id），
+SSE 推送从事件表按 id 增量读取，断线重连时用 Last-Event-ID 续传；
+同一进程内的变化通过条件变量立即唤醒等待中的推送。
+
+取消/暂停/继续请求写入 control 字段，由执行任务的进程在处理条目之间读取（协作式控制），
+因此请求可以落在任意工作进程上。
+
+独立 worker 进程（python -m worker）以此作为持久化队列：入队的任务记录任务类型与 JSON 参数
+（payload），owner 为空表示尚未被领取，worker 通过 claim() 原子地领取；排队中的任务不做心跳超时检测。
+
+去重键（dedup_key）在未结束的任务中唯一，重复提交时返回已有任务；
+命名锁（task_locks）由任务持有，持有任务结束或心跳超时后可被其他任务接管，用于跨进程互斥。
+
+结果中的逐条明细（result['items']）单独存放在 task_results 表中按页读取，tasks.result 只保留汇总；
+已结束任务的数量或结果总大小超出上限时，purge() 提前删除最早结束的任务，不必等到保留期满。
+
+提交任务时可以限制等待执行的任务总数与每个用户未结束的任务数（create 的 limits），超出时抛出 QueueFull；
+排队位置与预计开始时间按最近任务的平均执行时间估算（queue_info），queue_metrics() 给出队列深度与等待时间。
+"""
+import os
+import json
+import time
+import heapq
+import sqlite3
+import threading
+
+ACTIVE_STATUSES = ('pending', 'running', 'paused')
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+CONTROLS = ('pause', 'cancel')
+STALE_AFTER = 30.0      # 心跳超时（秒）
+RETENTION = 86400       # 已结束任务的保留时间（秒）
+ITEMS_KEY = 'items'     # 结果中单独存放、分页读取的逐条明细
+DURATION_SAMPLES = 50   # 估算等待时间时参考的最近完成任务数
+
+_JSON_FIELDS = ('details', 'result', 'payload')
+_ACTIVE = ', '.join(f"'{status}'" for status in ACTIVE_STATUSES)
+_COLUMNS = ('id', 'kind', 'username', 'status', 'progress', 'message', 'details', 'result', 'error',
+            'control', 'payload', 'dedup_key', 'owner', 'created_at', 'updated_at', 'heartbeat_at')
+_EVENT_FIELDS = ('status', 'progress', 'message', 'details', 'error', 'control')  # 推送的字段（结果只通知已就绪）
+
+
+def _dumps(value):
+    return None if value is None else json.dumps(value, ensure_ascii=False, default=str)
+
+
+class QueueFull(Exception):
+    """任务队列已满或用户未结束的任务过多，retry_after 为建议的重试等待秒数"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TaskStore:
+    """任务存储"""
+
+    DB_PATH = 'data/tasks.db'
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or self.DB_PATH
+        self._local = threading.local()
+        self._changed = threading.Condition()
+        self._init_schema()
+
+    @classmethod
+    def default(cls):
+        """进程内共享的默认存储（data/tasks.db）"""
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "id TEXT PRIMARY KEY, kind TEXT, status TEXT NOT NULL, progress REAL DEFAULT 0, "
+                "message TEXT, details TEXT, result TEXT, error TEXT, owner TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL, heartbeat_at REAL)"
+            )
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(tasks)")}
+            for column in ('username', 'control', 'payload', 'dedup_key'):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} TEXT")
+            if 'started_at' not in columns:
+                conn.execute("ALTER TABLE tasks ADD COLUMN started_at REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, heartbeat_at)")
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_dedup ON tasks (dedup_key) "
+                f"WHERE dedup_key IS NOT NULL AND status IN ({_ACTIVE})"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS task_locks ("
+                "name TEXT PRIMARY KEY, task_id TEXT NOT NULL, acquired_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS task_events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, task_id TEXT NOT NULL, username TEXT, "
+                "data TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_task_events_task ON task_events (task_id, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_task_events_user ON task_events (username, id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS task_results ("
+                "task_id TEXT NOT NULL, seq INTEGER NOT NULL, status TEXT, data TEXT NOT NULL, "
+                "PRIMARY KEY (task_id, seq))"
+            )
+
+    @staticmethod
+    def _row_to_task(row):
+        task = dict(row)
+        for field in _JSON_FIELDS:
+            if task[field] is not None:
+                task[field] = json.loads(task[field])
+        return task
+
+    @staticmethod
+    def _add_event(conn, task_id, data, now):
+        conn.execute(
+            "INSERT INTO task_events (task_id, username, data, created_at) "
+            "SELECT id, username, ?, ? FROM tasks WHERE id = ?",
+            (_dumps(data), now, task_id)
+        )
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait_for_change(self, timeout):
+        """等待本进程内的任务变化（其他进程的变化由调用方按超时轮询）"""
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def create(self, task_id, kind, owner, username=None, message='任务已提交', payload=None, dedup_key=None,
+               limits=None):
+        """创建任务；owner 为 None 时任务进入队列，等待 worker 领取
+
+        dedup_key 与未结束的任务重复时抛出 sqlite3.IntegrityError；
+        limits 为 {'max_queued': 等待执行的任务总数上限, 'max_per_user': 用户未结束的任务数上限}，
+        超出时抛出 QueueFull（检查与插入在同一写事务中，多个进程同时提交也不会超出）。
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if limits:
+                self._check_limits(conn, username, limits, now)
+            conn.execute(
+                "INSERT INTO tasks (id, kind, username, status, progress, message, payload, dedup_key, owner, "
+                "created_at, updated_at, heartbeat_at) VALUES (?, ?, ?, 'pending', 0, ?, ?, ?, ?, ?, ?, ?)",
+                (task_id, kind, username, message, _dumps(payload), dedup_key, owner, now, now, now)
+            )
+            self._add_event(conn, task_id, {'kind': kind, 'status': 'pending', 'progress': 0, 'message': message}, now)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        self._notify()
+        return self.get(task_id)
+
+    def _check_limits(self, conn, username, limits, now):
+        max_queued = limits.get('max_queued')
+        if max_queued:
+            queued = conn.execute("SELECT COUNT(*) FROM tasks WHERE status = 'pending'").fetchone()[0]
+            if queued >= max_queued:
+                retry_after = self._retry_after(conn, now)
+                raise QueueFull(f'任务队列已满（{queued} 个任务等待执行），请约 {retry_after} 秒后再试', retry_after)
+        max_per_user = limits.get('max_per_user')
+        if max_per_user and username is not None:
+            active = conn.execute(
+                f"SELECT COUNT(*) FROM tasks WHERE username = ? AND status IN ({_ACTIVE})", (username,)
+            ).fetchone()[0]
+            if active >= max_per_user:
+                retry_after = self._retry_after(conn, now, username)
+                raise QueueFull(f'您已有 {active} 个任务未完成，请等待完成后再提交（约 {retry_after} 秒后再试）',
+                                retry_after)
+
+    @staticmethod
+    def _average_duration(conn):
+        """最近完成任务的平均执行时间（秒），没有记录时返回 None"""
+        row = conn.execute(
+            "SELECT AVG(duration) FROM (SELECT updated_at - started_at AS duration FROM tasks "
+            "WHERE status = 'completed' AND started_at IS NOT NULL ORDER BY updated_at DESC LIMIT ?)",
+            (DURATION_SAMPLES,)
+        ).fetchone()
+        return row[0]
+
+    def _estimate_wait(self, conn, ahead, now, username=None):
+        """估算前面还有 ahead 个任务时的等待时间（秒）
+
+        执行中的任务各占一个执行槽，按平均执行时间估算各槽空出的时间，排在前面的任务依次占用最早空出的槽。
+        没有历史记录时返回 None。
+        """
+        duration = self._average_duration(conn)
+        if duration is None:
+            return None
+        condition, params = '', []
+        if username is not None:
+            condition, params = ' AND username = ?', [username]
+        running = conn.execute(
+            f"SELECT started_at FROM tasks WHERE status IN ('running', 'paused'){condition}", params
+        ).fetchall()
+        slots = [max(duration - (now - (row[0] or now)), 0.0) for row in running] or [0.0]
+        heapq.heapify(slots)
+        for _ in range(ahead):
+            heapq.heapreplace(slots, slots[0] + duration)
+        return slots[0]
+
+    def _retry_after(self, conn, now, username=None):
+        """队列满时建议的重试等待秒数：预计下一个执行槽空出的时间（无记录时 30 秒，限定在 5~600 秒）"""
+        wait = self._estimate_wait(conn, 0, now, username)
+        return int(min(max(wait if wait is not None else 30, 5), 600))
+
+    def update(self, task_id, **fields):
+        """更新任务字段（同时刷新心跳），返回是否存在该任务
+
+        结果中的 items 列表拆出逐条保存到 task_results，汇总中以 items_count 记录条目数。
+        """
+        fields = {key: value for key, value in fields.items() if key in _COLUMNS and key != 'id'}
+        items = None
+        if isinstance(fields.get('result'), dict) and isinstance(fields['result'].get(ITEMS_KEY), list):
+            result = dict(fields['result'])
+            items = result.pop(ITEMS_KEY)
+            result['items_count'] = len(items)
+            fields['result'] = result
+        now = time.time()
+        fields['updated_at'] = now
+        fields['heartbeat_at'] = now
+        for field in _JSON_FIELDS:
+            if field in fields:
+                fields[field] = _dumps(fields[field])
+
+        event = {key: value for key, value in fields.items() if key in _EVENT_FIELDS}
+        if 'details' in event:
+            event['details'] = json.loads(event['details']) if event['details'] is not None else None
+        if fields.get('result') is not None:
+            event['has_result'] = True
+
+        assignments = [f'{key} = ?' for key in fields]
+        values = list(fields.values())
+        if fields.get('status') == 'running':
+            # 记录首次开始执行的时间（暂停后继续不改变），用于统计排队等待时间与执行时间
+            assignments.append('started_at = COALESCE(started_at, ?)')
+            values.append(now)
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(f"UPDATE tasks SET {', '.join(assignments)} WHERE id = ?", (*values, task_id))
+            if cursor.rowcount and items is not None:
+                conn.execute("DELETE FROM task_results WHERE task_id = ?", (task_id,))
+                conn.executemany(
+                    "INSERT INTO task_results (task_id, seq, status, data) VALUES (?, ?, ?, ?)",
+                    [(task_id, seq, item.get('status') if isinstance(item, dict) else None, _dumps(item))
+                     for seq, item in enumerate(items)]
+                )
+            if cursor.rowcount and event:
+                self._add_event(conn, task_id, event, now)
+        if cursor.rowcount and event:
+            self._notify()
+        return cursor.rowcount > 0
+
+    def claim(self, owner, kinds=None):
+        """领取最早入队的任务（标记为执行中并记录领取者），队列为空时返回 None"""
+        conn = self._connect()
+        condition = "status = 'pending' AND owner IS NULL"
+        params = []
+        if kinds:
+            condition += f" AND kind IN ({', '.join('?' for _ in kinds)})"
+            params.extend(kinds)
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                f"SELECT id FROM tasks WHERE {condition} ORDER BY created_at LIMIT 1", params
+            ).fetchone()
+            if row is None:
+                conn.commit()
+                return None
+            conn.execute(
+                "UPDATE tasks SET owner = ?, updated_at = ?, heartbeat_at = ? WHERE id = ?",
+                (owner, now, now, row['id'])
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return self.get(row['id'])
+
+    def get(self, task_id):
+        """读取任务；所属进程心跳超时的未完成任务标记为失败"""
+        row = self._connect().execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        task = self._row_to_task(row)
+        if task['status'] in ACTIVE_STATUSES and task['owner'] is not None \
+                and time.time() - (task['heartbeat_at'] or 0) > STALE_AFTER:
+            self.mark_stale()
+            task = self._row_to_task(self._connect().execute(
+                "SELECT * FROM tasks WHERE id = ?", (task_id,)
+            ).fetchone())
+        return task
+
+    def queue_info(self, task):
+        """等待执行的任务的排队位置（从 1 开始）与预计开始时间，其他状态返回 None"""
+        if task is None or task['status'] != 'pending':
+            return None
+        now = time.time()
+        conn = self._connect()
+        ahead = conn.execute(
+            "SELECT COUNT(*) FROM tasks WHERE status = 'pending' AND created_at < ?", (task['created_at'],)
+        ).fetchone()[0]
+        wait = self._estimate_wait(conn, ahead, now)
+        return {
+            'position': ahead + 1,
+            'estimated_wait': None if wait is None else round(wait),
+            'estimated_start': None if wait is None else now + wait
+        }
+
+    def queue_metrics(self, window=3600):
+        """队列指标：等待执行/执行中的任务数、各类型排队数、最长已等待时间，
+        以及最近 window 秒内开始执行的任务的平均/最长排队等待时间与平均执行时间（秒）"""
+        now = time.time()
+        conn = self._connect()
+        depth = {kind: count for kind, count in conn.execute(
+            "SELECT kind, COUNT(*) FROM tasks WHERE status = 'pending' GROUP BY kind"
+        )}
+        oldest = conn.execute("SELECT MIN(created_at) FROM tasks WHERE status = 'pending'").fetchone()[0]
+        running = conn.execute("SELECT COUNT(*) FROM tasks WHERE status IN ('running', 'paused')").fetchone()[0]
+        waits = conn.execute(
+            "SELECT COUNT(*), AVG(started_at - created_at), MAX(started_at - created_at) FROM tasks "
+            "WHERE started_at >= ?", (now - window,)
+        ).fetchone()
+        duration = self._average_duration(conn)
+        return {
+            'depth': sum(depth.values()),
+            'depth_by_kind': depth,
+            'running': running,
+            'oldest_wait': round(now - oldest, 1) if oldest is not None else 0,
+            'started': waits[0],
+            'avg_wait': round(waits[1], 1) if waits[1] is not None else None,
+            'max_wait': round(waits[2], 1) if waits[2] is not None else None,
+            'avg_duration': round(duration, 1) if duration is not None else None
+        }
+
+    def heartbeat(self, task_ids):
+        """刷新本进程持有的任务心跳"""
+        task_ids = list(task_ids)
+        if not task_ids:
+            return
+        placeholders = ', '.join('?' for _ in task_ids)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                f"UPDATE tasks SET heartbeat_at = ? WHERE id IN ({placeholders}) AND status IN ({_ACTIVE})",
+                (time.time(), *task_ids)
+            )
+
+    def mark_stale(self):
+        """将心跳超时的未完成任务标记为失败，返回标记数量"""
+        now = time.time()
+        error = '执行任务的进程已退出（心跳超时）'
+        message = '任务中断: 执行任务的进程已退出'
+        conn = self._connect()
+        with conn:
+            stale = [row['id'] for row in conn.execute(
+                f"SELECT id FROM tasks WHERE status IN ({_ACTIVE}) AND owner IS NOT NULL AND heartbeat_at < ?",
+                (now - STALE_AFTER,)
+            )]
+            for task_id in stale:
+                conn.execute(
+                    "UPDATE tasks SET status = 'failed', error = ?, message = ?, updated_at = ? "
+                    f"WHERE id = ? AND status IN ({_ACTIVE})",
+                    (error, message, now, task_id)
+                )
+                self._add_event(conn, task_id, {'status': 'failed', 'error': error, 'message': message}, now)
+        if stale:
+            self._notify()
+        return len(stale)
+
+    def request_control(self, task_id, control):
+        """记录取消/暂停请求（control 为 None 表示继续），只对未结束的任务生效，返回是否生效"""
+        if control is not None and control not in CONTROLS:
+            raise ValueError(f'不支持的任务控制: {control}')
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            cursor = None
+            if control == 'cancel':
+                # 尚未被领取的排队任务直接取消
+                cursor = conn.execute(
+                    "UPDATE tasks SET status = 'cancelled', message = ?, updated_at = ? "
+                    "WHERE id = ? AND status = 'pending' AND owner IS NULL",
+                    ('任务已取消', now, task_id)
+                )
+                if cursor.rowcount:
+                    self._add_event(conn, task_id, {'status': 'cancelled', 'message': '任务已取消'}, now)
+            if not (cursor and cursor.rowcount):
+                # 已请求取消的任务不能再暂停或继续
+                cursor = conn.execute(
+                    f"UPDATE tasks SET control = ?, updated_at = ? WHERE id = ? AND status IN ({_ACTIVE}) "
+                    "AND control IS NOT 'cancel'",
+                    (control, now, task_id)
+                )
+                if cursor.rowcount:
+                    self._add_event(conn, task_id, {'control': control}, now)
+        if cursor.rowcount:
+            self._notify()
+        return cursor.rowcount > 0
+
+    def find_by_key(self, dedup_key, active_only=True):
+        """按去重键查找最近的任务（active_only 时只查找未结束的任务）"""
+        condition = f" AND status IN ({_ACTIVE})" if active_only else ''
+        row = self._connect().execute(
+            f"SELECT id FROM tasks WHERE dedup_key = ?{condition} ORDER BY created_at DESC LIMIT 1",
+            (dedup_key,)
+        ).fetchone()
+        if row is None:
+            return None
+        task = self.get(row['id'])
+        # 读取时可能刚被判定为心跳超时
+        if active_only and task['status'] not in ACTIVE_STATUSES:
+            return None
+        return task
+
+    def acquire_lock(self, name, task_id):
+        """尝试为任务获取命名锁；锁被其他未结束的任务持有时返回 False"""
+        conn = self._connect()
+        row = conn.execute("SELECT task_id FROM task_locks WHERE name = ?", (name,)).fetchone()
+        holder = row['task_id'] if row else None
+        if holder == task_id:
+            return True
+        if holder is not None:
+            task = self.get(holder)
+            if task is not None and task['status'] in ACTIVE_STATUSES:
+                return False
+        with conn:
+            # 仅当持有者仍是刚才读到的任务时接管，避免并发接管
+            cursor = conn.execute(
+                "INSERT INTO task_locks (name, task_id, acquired_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET task_id = excluded.task_id, acquired_at = excluded.acquired_at "
+                "WHERE task_locks.task_id IS ?",
+                (name, task_id, time.time(), holder)
+            )
+        return cursor.rowcount > 0
+
+    def release_lock(self, name, task_id):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM task_locks WHERE name = ? AND task_id = ?", (name, task_id))
+
+    def get_control(self, task_id):
+        row = self._connect().execute("SELECT control FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return row[0] if row else None
+
+    def results(self, task_id, offset=0, limit=50, status=None):
+        """分页读取任务结果明细（可按条目状态筛选），返回 (条目列表, 总数)"""
+        condition, params = 'task_id = ?', [task_id]
+        if status:
+            condition += ' AND status = ?'
+            params.append(status)
+        conn = self._connect()
+        total = conn.execute(f"SELECT COUNT(*) FROM task_results WHERE {condition}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT data FROM task_results WHERE {condition} ORDER BY seq LIMIT ? OFFSET ?",
+            (*params, limit, offset)
+        ).fetchall()
+        return [json.loads(row['data']) for row in rows], total
+
+    def events(self, task_id=None, username=None, after_id=0, limit=200):
+        """按事件 id 增量读取某个任务或某个用户全部任务的事件"""
+        if task_id is not None:
+            condition, value = 'task_id = ?', task_id
+        else:
+            condition, value = 'username = ?', username
+        rows = self._connect().execute(
+            f"SELECT id, task_id, data FROM task_events WHERE {condition} AND id > ? ORDER BY id LIMIT ?",
+            (value, after_id, limit)
+        ).fetchall()
+        return [{'id': row['id'], 'task_id': row['task_id'], 'data': json.loads(row['data'])} for row in rows]
+
+    def last_event_id(self, task_id=None, username=None):
+        condition, value = ('task_id = ?', task_id) if task_id is not None else ('username = ?', username)
+        row = self._connect().execute(
+            f"SELECT MAX(id) FROM task_events WHERE {condition}", (value,)
+        ).fetchone()
+        return row[0] or 0
+
+    def purge(self, retention=RETENTION, max_finished=None, max_bytes=None):
+        """删除超过保留时间的已结束任务，返回删除数量
+
+        提供 max_finished / max_bytes 时，已结束任务的数量或结果（汇总与明细）总字节数超出上限，
+        从最早结束的任务开始提前删除；最近结束的一个任务总是保留。
+        """
+        conn = self._connect()
+        with conn:
+            deleted = conn.execute(
+                f"DELETE FROM tasks WHERE status NOT IN ({_ACTIVE}) AND created_at < ?",
+                (time.time() - retention,)
+            ).rowcount
+            if max_finished is not None or max_bytes is not None:
+                rows = conn.execute(
+                    "SELECT id, LENGTH(COALESCE(result, '')) + COALESCE("
+                    "(SELECT SUM(LENGTH(data)) FROM task_results WHERE task_id = tasks.id), 0) AS size "
+                    f"FROM tasks WHERE status NOT IN ({_ACTIVE}) ORDER BY updated_at DESC"
+                ).fetchall()
+                total = 0
+                evicted = []
+                for index, row in enumerate(rows):
+                    total += row['size']
+                    if index and (evicted or (max_finished is not None and index >= max_finished)
+                                  or (max_bytes is not None and total > max_bytes)):
+                        evicted.append((row['id'],))
+                conn.executemany("DELETE FROM tasks WHERE id = ?", evicted)
+                deleted += len(evicted)
+            conn.execute("DELETE FROM task_events WHERE task_id NOT IN (SELECT id FROM tasks)")
+            conn.execute("DELETE FROM task_locks WHERE task_id NOT IN (SELECT id FROM tasks)")
+            conn.execute("DELETE FROM task_results WHERE task_id NOT IN (SELECT id FROM tasks)")
+        return deleted
+
+    def stats(self):
+        conn = self._connect()
+        rows = conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        stats = {status: count for status, count in rows}
+        stats['queued'] = conn.execute(
+            "SELECT COUNT(*) FROM tasks WHERE status = 'pending' AND owner IS NULL"
+        ).fetchone()[0]
+        return stats
@@ -431,12 +431,12 @@ function switchCourse(courseName) {
             updateCurrentCourseDisplay(courseName);
             showToast('课程切换成功', 'success');
 
-            // 如果在学习页面，刷新内容
-            if (window.location.pathname.includes('/learning')) {
-                setTimeout(() => {
+            // 等待后台预热完成后再刷新学习页面，避免刷新后的首批请求重新加载课程
+            watchCourseWarmup(courseName, data.warmup, function() {
+                if (window.location.pathname.includes('/learning')) {
                     location.reload();
-                }, 1000);
-            }
+                }
+            });
         } else {
             showToast('切换失败: ' + data.error, 'danger');
         }
@@ -446,6 +446,174 @@ function switchCourse(courseName) {
     });
 }
 
+// 跟踪课程预热状态（按预热任务 id 轮询，最长等待 WARMUP_MAX_WAIT 毫秒，超时后照常继续）
+// idle / unknown 表示查不到预热任务，不代表课程已就绪
+const WARMUP_POLL_INTERVAL = 500;
+const WARMUP_MAX_WAIT = 10000;
+
+function watchCourseWarmup(courseName, warmup, onReady) {
+    const indicator = $('#course-warmup-indicator');
+    const startedAt = Date.now();
+    const taskId = warmup ? warmup.task_id : null;
+    let finished = false;
+
+    function finish(state) {
+        if (finished) {
+            return;
+        }
+        finished = true;
+        indicator.addClass('d-none');
+        if (state === 'failed') {
+            showToast('课程缓存预热失败，首次访问可能较慢', 'warning');
+        }
+        if (onReady) {
+            onReady(state);
+        }
+    }
+
+    function check(status) {
+        if (status && (status.state === 'ready' || status.state === 'failed')) {
+            finish(status.state);
+        } else if (!taskId || !status || status.state === 'idle' || status.state === 'unknown') {
+            finish('unknown');
+        } else if (Date.now() - startedAt >= WARMUP_MAX_WAIT) {
+            finish('timeout');
+        } else {
+            setTimeout(poll, WARMUP_POLL_INTERVAL);
+        }
+    }
+
+    function poll() {
+        $.get('/api/courses/current/warmup', { course: courseName, task_id: taskId })
+            .done(function(data) {
+                check(data.success ? data.warmup : null);
+            })
+            .fail(function() {
+                finish('unknown');
+            });
+    }
+
+    indicator.removeClass('d-none');
+    check(warmup);
+}
+
+// 跟踪后台任务：优先使用 SSE 推送（只接收变化的字段），浏览器不支持或连接失败时改为轮询
+const TASK_POLL_INTERVAL = 2000;
+
+// 取消、暂停或继续后台任务（action: cancel / pause / resume）
+function controlTask(taskId, action) {
+    return $.ajax({
+        url: `/api/tasks/${taskId}/${action}`,
+        method: 'POST',
+        contentType: 'application/json'
+    });
+}
+
+// 分页获取任务结果明细（params: page / page_size / status）
+function getTaskResults(taskId, params) {
+    return $.get(`/api/tasks/${taskId}/results`, params || {});
+}
+
+function watchTask(taskId, handlers) {
+    const task = { id: taskId };
+    let source = null;
+    let timer = null;
+    let received = false;
+    let stopped = false;
+
+    function stop() {
+        stopped = true;
+        if (source) {
+            source.close();
+            source = null;
+        }
+        if (timer) {
+            clearInterval(timer);
+            timer = null;
+        }
+    }
+
+    function settle(current) {
+        if (current.status === 'completed') {
+            stop();
+            if (handlers.onComplete) {
+                handlers.onComplete(current);
+            }
+        } else if (current.status === 'failed') {
+            stop();
+            if (handlers.onFailed) {
+                handlers.onFailed(current);
+            }
+        } else if (current.status === 'cancelled') {
+            stop();
+            if (handlers.onCancelled) {
+                handlers.onCancelled(current);
+            }
+        }
+    }
+
+    function fetchStatus(onDone) {
+        return $.get(`/api/tasks/${taskId}/status`).done(function (data) {
+            if (data.success && !stopped) {
+                Object.assign(task, data.task);
+                onDone(task);
+            }
+        });
+    }
+
+    function poll() {
+        if (source) {
+            source.close();
+            source = null;
+        }
+        const tick = function () {
+            fetchStatus(function (current) {
+                if (handlers.onUpdate) {
+                    handlers.onUpdate(current);
+                }
+                settle(current);
+            }).fail(function () {
+                // 网络错误不立即停止，可能是暂时的
+                console.warn('获取任务状态失败，重试中...');
+            });
+        };
+        timer = setInterval(tick, TASK_POLL_INTERVAL);
+        tick();
+    }
+
+    function apply(event) {
+        received = true;
+        Object.assign(task, JSON.parse(event.data));
+        if (handlers.onUpdate) {
+            handlers.onUpdate(task);
+        }
+    }
+
+    if (!window.EventSource) {
+        poll();
+        return { stop: stop };
+    }
+
+    source = new EventSource(`/api/tasks/${taskId}/events`);
+    source.addEventListener('snapshot', apply);
+    source.addEventListener('progress', apply);
+    source.addEventListener('end', function () {
+        source.close();
+        source = null;
+        // 推送不含任务结果，结束后取一次完整状态
+        fetchStatus(settle).fail(function () {
+            settle(task);
+        });
+    });
+    source.onerror = function () {
+        // 已收到过消息时由浏览器携带 Last-Event-ID 自动重连；从未连通或连接被拒绝时改为轮询
+        if (!stopped && (!received || source.readyState === EventSource.CLOSED)) {
+            poll();
+        }
+    };
+    return { stop: stop };
+}
+
 // 导出全局函数
 window.setUsername = setUsername;
 window.showProgress = showProgress;
@@ -455,3 +623,6 @@ window.formatDateTime = formatDateTime;
 window.copyToClipboard = copyToClipboard;
 window.loadCourseList = loadCourseList;
 window.switchCourse = switchCourse;
+window.watchCourseWarmup = watchCourseWarmup;
+window.watchTask = watchTask;
+window.controlTask = controlTask;
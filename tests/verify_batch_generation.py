@@ -0,0 +1,50 @@
+import unittest
+import sys
+import os
+from unittest.mock import patch
+from flask import Flask
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services import ai_service as ai_module
+from services.ai_service import AIService
+
+
+class TestBatchGeneration(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        context = self.app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+        patcher = patch.object(ai_module.time, 'sleep')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.service = AIService()
+        self.items = [('第一章', '事务', 'concept'), ('第一章', '索引', 'content'), ('第二章', '范式', 'concept')]
+
+    def test_saves_each_explanation_as_generated(self):
+        saved = []
+        responses = {'事务': '## 事务', '索引': '抱歉，AI服务暂时不可用', '范式': '## 范式'}
+
+        def generate(chapter, concept, concept_type, course_name):
+            # 生成下一条之前，上一条成功的讲解已经保存
+            self.assertEqual(len(saved), {'事务': 0, '索引': 1, '范式': 1}[concept])
+            return responses[concept]
+
+        with patch.object(AIService, 'generate_explanation', side_effect=generate):
+            results = self.service.batch_generate_explanations(
+                self.items, course_name='数据库原理', on_result=lambda *args: saved.append(args))
+
+        self.assertEqual(saved, [('第一章', '事务', 'concept', '## 事务'), ('第二章', '范式', 'concept', '## 范式')])
+        self.assertEqual([result['success'] for result in results.values()], [True, False, True])
+        self.assertTrue(all('explanation' not in result for result in results.values()))
+
+    def test_returns_text_without_callback(self):
+        with patch.object(AIService, 'generate_explanation', return_value='## 讲解'):
+            results = self.service.batch_generate_explanations(self.items[:1])
+        self.assertEqual(results['第一章_事务']['explanation'], '## 讲解')
+
+
+if __name__ == '__main__':
+    unittest.main()
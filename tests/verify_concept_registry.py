@@ -0,0 +1,52 @@
+import unittest
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.knowledge import KnowledgeBase
+from services.concept_registry import ConceptGroups, canonical_key, lookup_order
+
+
+class TestConceptRegistry(unittest.TestCase):
+    def setUp(self):
+        self.groups = ConceptGroups([
+            ('数据库', KnowledgeBase({"科目": "数据库", "章节": {
+                "第一章": {"mainConcepts": ["数据定义语言", "SQL"], "mainContents": ["事务"]},
+                "第二章": {"mainConcepts": ["数据定义语言"], "mainContents": ["ｓｑｌ", "关系代数"]}
+            }}, version=1)),
+            ('操作系统', KnowledgeBase({"科目": "操作系统", "章节": {
+                "第一章": {"mainConcepts": ["事务"], "mainContents": []}
+            }}, version=1))
+        ])
+
+    def test_normalized_duplicates(self):
+        self.assertEqual(canonical_key(' Ｓ Q l '), 'sql')
+        canonical = self.groups.canonical('数据库', '第二章', 'ｓｑｌ')
+        self.assertEqual((canonical.chapter, canonical.name, canonical.type), ('第一章', 'SQL', 'concept'))
+        self.assertIsNone(self.groups.canonical('数据库', '第三章', 'SQL'))
+
+    def test_plan_generates_once(self):
+        items = [('第一章', '数据定义语言', 'concept'), ('第一章', 'SQL', 'concept'), ('第一章', '事务', 'content'),
+                 ('第二章', '数据定义语言', 'concept'), ('第二章', 'ｓｑｌ', 'content'), ('第二章', '关系代数', 'content')]
+        pending, mapping = self.groups.plan('数据库', items)
+        self.assertEqual(len(pending), 4)
+        self.assertEqual(mapping[('第二章', 'ｓｑｌ', 'content')], ('第一章', 'SQL', 'concept'))
+
+        # 只生成第二章时，重复概念仍以第一章的规范条目生成
+        pending, _ = self.groups.plan('数据库', items[3:])
+        self.assertIn(('第一章', '数据定义语言', 'concept'), pending)
+
+    def test_cross_course_groups(self):
+        occurrences = self.groups.occurrences('操作系统', '第一章', '事务')
+        self.assertEqual([occurrence.course for occurrence in occurrences], ['数据库', '操作系统'])
+
+    def test_lookup_order(self):
+        order = lookup_order(self.groups, '数据库', '第二章', 'ｓｑｌ', 'content')
+        self.assertEqual(order, [('第一章', 'SQL', 'concept'), ('第二章', 'ｓｑｌ', 'content')])
+        self.assertEqual(lookup_order(None, '数据库', '第二章', 'ｓｑｌ', 'content'), [('第二章', 'ｓｑｌ', 'content')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import threading
+import time
+from unittest.mock import MagicMock, patch
+from flask import Flask
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services import task_service as task_module
+from services.course_service import CourseService
+from services.explanation_cache import ExplanationCache
+from services.task_service import TaskService
+from services.task_store import TaskStore
+
+
+class TestCourseGeneration(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        context = self.app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+        self.service = CourseService()
+        self.saved_ai = self.service.ai_service
+        self.service.ai_service = MagicMock()
+        self.make_request = self.service.ai_service._make_request
+
+    def tearDown(self):
+        self.service.ai_service = self.saved_ai
+
+    def test_extract_json(self):
+        extract = CourseService._extract_json
+        self.assertEqual(extract('```json\n{"章节": ["第一章"]}\n```'), {'章节': ['第一章']})
+        # 代码块内的对象数组不能被截成两个对象之间的片段
+        self.assertEqual(extract('结果如下：\n```json\n[{"a": 1}, {"b": 2}]\n```'), [{'a': 1}, {'b': 2}])
+        self.assertEqual(extract('[{"a": 1}, {"b": 2}]'), [{'a': 1}, {'b': 2}])
+        self.assertEqual(extract('好的，大纲如下：{"章节": ["第一章"]} 希望有帮助{}'), {'章节': ['第一章']})
+        self.assertIsNone(extract('抱歉，AI服务暂时不可用'))
+        self.assertIsNone(extract('{"章节": ["第一章"'))
+        self.assertIsNone(extract(''))
+
+    def test_outline_retries_and_cleans_names(self):
+        self.make_request.side_effect = [
+            '无效的响应',
+            '```json\n{"章节": [" 第一章 绪论 ", "第一章 绪论", "", 3, "第二章 方法"]}\n```',
+        ]
+        self.assertEqual(self.service._generate_outline('统计学', ''), ['第一章 绪论', '第二章 方法'])
+        self.assertEqual(self.make_request.call_count, 2)
+
+        # 以章节名为键的对象同样可以识别
+        self.make_request.side_effect = ['{"章节": {"第一章": {}, "第二章": {}}}']
+        self.assertEqual(self.service._generate_outline('统计学', ''), ['第一章', '第二章'])
+
+        self.make_request.side_effect = ['{}', '[]']
+        self.assertIsNone(self.service._generate_outline('统计学', ''))
+
+    def test_chapter_requires_concepts_and_contents(self):
+        self.make_request.side_effect = [
+            '{"mainConcepts": ["概念"], "mainContents": []}',
+            '{"第一章": {"mainConcepts": ["概念", "概念"], "mainContents": ["知识点"]}}',
+        ]
+        self.assertEqual(self.service._generate_chapter('统计学', '', ['第一章'], '第一章'),
+                         {'mainConcepts': ['概念'], 'mainContents': ['知识点']})
+
+        self.make_request.side_effect = ['抱歉，无法生成', '{"mainConcepts": ["概念"]}']
+        self.assertIsNone(self.service._generate_chapter('统计学', '', ['第一章'], '第一章'))
+
+    def test_generate_course(self):
+        chapter = {'mainConcepts': ['概念'], 'mainContents': ['知识点']}
+
+        def respond(prompt, max_tokens=None):
+            if '设计章节大纲' in prompt:
+                return '```json\n{"章节": ["第一章", "第二章", "第三章"]}\n```'
+            if '"第二章"' in prompt:
+                return '抱歉，AI服务暂时不可用'
+            return json.dumps(chapter, ensure_ascii=False)
+
+        self.make_request.side_effect = respond
+        progress = []
+        with patch('services.course_service.Course') as course_model:
+            course_model.get_course_by_name.return_value = None
+            course_model.create_course.return_value.to_dict.return_value = {'name': '统计学'}
+            result = self.service.generate_course('统计学', progress_callback=progress.append)
+
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertEqual(result['failed_chapters'], ['第二章'])
+        # 章节按大纲顺序合并，失败章节不写入知识库
+        self.assertEqual(list(result['knowledge_data']['章节']), ['第一章', '第三章'])
+        course_model.create_course.assert_called_once_with('统计学', '', result['knowledge_data'])
+        self.assertEqual(progress[0]['stage'], 'outline')
+        self.assertEqual((progress[-1]['stage'], progress[-1]['percentage']), ('done', 100))
+
+    def test_generate_course_rejects_existing(self):
+        with patch('services.course_service.Course') as course_model:
+            course_model.get_course_by_name.return_value = object()
+            result = self.service.generate_course('统计学')
+        self.assertFalse(result['success'])
+        self.make_request.assert_not_called()
+        course_model.create_course.assert_not_called()
+
+    def test_pregeneration_waits_for_course_lock(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        task_service = TaskService()
+        saved = (task_service.store, task_module.LOCK_WAIT_INTERVAL, self.service.explanation_cache)
+        self.addCleanup(lambda: (setattr(task_service, 'store', saved[0]),
+                                 setattr(task_module, 'LOCK_WAIT_INTERVAL', saved[1]),
+                                 setattr(self.service, 'explanation_cache', saved[2])))
+        store = task_service.store = TaskStore(os.path.join(temp_dir.name, 'tasks.db'))
+        task_module.LOCK_WAIT_INTERVAL = 0.02
+        self.service.explanation_cache = ExplanationCache(cache_dir=temp_dir.name)
+        self.app.config['CONCEPT_DEDUP_ENABLED'] = False
+
+        # 另一个任务（如“生成全部讲解”）正在为同一课程生成讲解
+        store.create('other', 'batch_explain_all', 'host:1')
+        self.assertTrue(store.acquire_lock('explanations:统计学', 'other'))
+
+        generate = self.service.ai_service.batch_generate_explanations
+        generate.side_effect = lambda items, callback, course: {
+            f'{chapter}_{concept}': {'success': True, 'chapter': chapter, 'concept': concept, 'explanation': '讲解'}
+            for chapter, concept, _ in items
+        }
+        knowledge = {'科目': '统计学', '章节': {'第一章': {'mainConcepts': ['均值'], 'mainContents': ['方差']}}}
+        results = {}
+
+        def pregenerate(progress_callback=None):
+            results.update(self.service._pregenerate_explanations('统计学', knowledge, lambda *args: None))
+
+        def run():
+            with self.app.app_context():
+                task_service.run('pregen', pregenerate)
+
+        store.create('pregen', 'create_course', task_service.owner)
+        thread = threading.Thread(target=run)
+        thread.start()
+        deadline = time.time() + 5
+        while store.get('pregen')['message'] != '等待同一课程的其他讲解生成任务完成' and time.time() < deadline:
+            time.sleep(0.01)
+        generate.assert_not_called()
+
+        # 等待期间另一个任务生成了其中一条，释放锁后只生成剩余的条目
+        self.service.explanation_cache.save('第一章', '均值', '已生成的讲解')
+        store.release_lock('explanations:统计学', 'other')
+        thread.join(5)
+
+        generate.assert_called_once()
+        self.assertEqual(generate.call_args.args[0], [('第一章', '方差', 'content')])
+        self.assertEqual((results['total'], results['success_count']), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
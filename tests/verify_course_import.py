@@ -0,0 +1,65 @@
+import unittest
+import sys
+import os
+import io
+import json
+import tempfile
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.knowledge import KnowledgeBase, validate_knowledge_data
+from services.course_import import CourseFileWriter, _ByteCountingLines, iter_rows
+from services.search_index import CourseIndex
+
+
+def rows(text, fmt):
+    return list(iter_rows(_ByteCountingLines(io.BytesIO(text.encode('utf-8'))), fmt))
+
+
+class TestCourseImport(unittest.TestCase):
+    def test_csv_with_header_and_quoted_newline(self):
+        parsed = rows('\ufeff章节,类型,内容\n第一章,概念,"统计\n调查"\n\n第一章,知识点,抽样\n第二章,concept\n', 'csv')
+        self.assertEqual(parsed[0], (3, '第一章', '概念', '统计\n调查'))
+        self.assertEqual(parsed[1], (5, '第一章', '知识点', '抽样'))
+        self.assertEqual(parsed[2][:3], (6, None, None))
+
+    def test_jsonl_fields_and_errors(self):
+        parsed = rows('{"chapter": "第一章", "type": "concept", "text": "普查"}\n'
+                      '{"章节": "第一章", "类型": "知识点", "内容": "抽样"}\n'
+                      'not json\n{"chapter": "第二章"}\n', 'jsonl')
+        self.assertEqual(parsed[0], (1, '第一章', 'concept', '普查'))
+        self.assertEqual(parsed[1], (2, '第一章', '知识点', '抽样'))
+        self.assertEqual([row[1] for row in parsed[2:]], [None, None])
+
+    def test_writer_and_incremental_index(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'course.json')
+            writer = CourseFileWriter(path, '统计实务')
+            index = CourseIndex('统计实务')
+            for chapter_order, (chapter, items) in enumerate([
+                ('第一章', [('concept', '统计调查'), ('content', '抽样方法')]),
+                ('第二章', [('content', 'CPI 指数')])
+            ]):
+                writer.begin_chapter(chapter)
+                for item_type, text in items:
+                    writer.add(item_type, text)
+                    index.add(item_type, chapter, text, chapter_order)
+            writer.commit()
+            index.finish(1)
+
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.assertFalse(os.path.exists(writer.temp_file))
+
+        self.assertTrue(validate_knowledge_data(data))
+        self.assertEqual(data['章节']['第二章'], {'mainConcepts': [], 'mainContents': ['CPI 指数']})
+
+        # 流式构建的索引与由知识库构建的索引一致
+        expected = CourseIndex('统计实务', KnowledgeBase(data, version=1))
+        self.assertEqual(index.docs, expected.docs)
+        self.assertEqual(index.suffix_keys, expected.suffix_keys)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import course_pack
+from utils.course_pack import CoursePack, CoursePackWriter, CoursePackError, CoursePackRegistry, KNOWLEDGE_ENTRY
+
+
+class TestCoursePack(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'course.cpk')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_round_trip(self):
+        knowledge = {"科目": "测试课程", "章节": {"第一章": {"mainConcepts": ["概念"], "mainContents": []}}}
+        with CoursePackWriter(self.path, {'course_name': '测试课程'}) as writer:
+            writer.add_json(KNOWLEDGE_ENTRY, knowledge)
+            writer.add('explanations/第一章_概念.txt', '## 讲解')
+
+        with CoursePack(self.path) as pack:
+            self.assertEqual(pack.course_name, '测试课程')
+            self.assertEqual(pack.manifest['entry_count'], 2)
+            self.assertEqual(pack.read_json(KNOWLEDGE_ENTRY), knowledge)
+            self.assertEqual(pack.read_text('explanations/第一章_概念.txt'), '## 讲解')
+            self.assertIsNone(pack.read('missing'))
+            self.assertEqual(pack.verify(), [])
+
+    def test_detects_corruption(self):
+        with CoursePackWriter(self.path, {'course_name': '测试课程'}) as writer:
+            writer.add('a.txt', 'aaaa')
+
+        with open(self.path, 'r+b') as f:
+            f.seek(32)
+            f.write(b'b')
+
+        with CoursePack(self.path) as pack:
+            self.assertEqual(pack.verify(), ['a.txt'])
+
+    def test_rejects_invalid_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a course pack at all, just some bytes')
+
+        with self.assertRaises(CoursePackError):
+            CoursePack(self.path)
+
+
+
+class TestCoursePackRegistry(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.registry = CoursePackRegistry()
+        self.saved = (course_pack.PACKS_DIR, self.registry.packs, self.registry._dir_signature,
+                      self.registry._last_scan)
+        course_pack.PACKS_DIR = self.temp_dir.name
+        self.registry.packs, self.registry._dir_signature, self.registry._last_scan = {}, None, 0.0
+
+    def tearDown(self):
+        (course_pack.PACKS_DIR, self.registry.packs, self.registry._dir_signature,
+         self.registry._last_scan) = self.saved
+        self.temp_dir.cleanup()
+
+    def write_pack(self, course_name):
+        path = os.path.join(self.temp_dir.name, f'{course_name}.cpk')
+        with CoursePackWriter(path, {'course_name': course_name}) as writer:
+            writer.add(f'explanations/{course_name}.txt', course_name)
+
+    def test_rescan_is_throttled(self):
+        self.write_pack('课程一')
+        self.assertEqual(self.registry.find('explanations/课程一.txt'), '课程一'.encode('utf-8'))
+
+        # 扫描间隔内不重新扫描目录，强制刷新（如导入课程包后）立即可见
+        self.write_pack('课程二')
+        self.assertIsNone(self.registry.get_pack('课程二'))
+        self.registry.refresh(force=True)
+        self.assertEqual(self.registry.get_pack('课程二').course_name, '课程二')
+
+
+if __name__ == '__main__':
+    unittest.main()
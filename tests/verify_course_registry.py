@@ -0,0 +1,132 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+from unittest.mock import patch
+from flask import Flask
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.course import Course, CourseRegistry, COURSES_DIR, DEFAULT_COURSE_FILE, DEFAULT_COURSE_NAME, \
+    migrate_legacy_course_files
+
+
+def course_file(name):
+    return os.path.join(COURSES_DIR, f'course_{name}.json')
+
+
+class TestCourseRegistry(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.saved_cwd = os.getcwd()
+        # 课程文件与清单均使用相对路径，切换到临时目录以免触碰真实数据
+        os.chdir(self.temp_dir.name)
+        self.registry = CourseRegistry()
+        self.saved = (self.registry.entries, self.registry._last_scan)
+        self.registry._apply({})
+        self.registry._last_scan = 0.0
+
+    def tearDown(self):
+        os.chdir(self.saved_cwd)
+        entries, self.registry._last_scan = self.saved
+        self.registry._apply(entries)
+        self.temp_dir.cleanup()
+
+    def write_course(self, filename, name, concepts):
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        data = {'科目': name, '章节': {'第一章': {'mainConcepts': concepts, 'mainContents': ['知识点']}}}
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    def test_manifest_and_incremental_rescan(self):
+        self.write_course(DEFAULT_COURSE_FILE, '任意名称', ['概念'])
+        self.write_course(course_file('统计学'), '统计学', ['均值', '方差'])
+        with open('notes.json', 'w') as f:
+            f.write('{}')
+
+        entries = self.registry.list_entries()
+        self.assertEqual([entry['name'] for entry in entries], [DEFAULT_COURSE_NAME, '统计学'])
+        self.assertEqual(self.registry.get_entry('统计学')['concept_count'], 3)
+        with open(CourseRegistry.MANIFEST_FILE, encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)['courses']), 2)
+
+        # 扫描间隔内不重新扫描；强制刷新时只解析变化的文件
+        self.write_course(course_file('概率论'), '概率论', ['事件'])
+        self.assertIsNone(self.registry.get_entry('概率论'))
+        with patch.object(CourseRegistry, '_build_entry', wraps=self.registry._build_entry) as build:
+            self.registry.refresh(force=True)
+        self.assertEqual([call.args[0] for call in build.call_args_list], [course_file('概率论')])
+        self.assertEqual(self.registry.get_entry('概率论')['chapter_count'], 1)
+
+        # 删除的课程文件从清单移除
+        os.remove(course_file('统计学'))
+        self.registry.refresh(force=True)
+        self.assertIsNone(self.registry.get_entry('统计学'))
+
+    def test_loads_saved_manifest_without_parsing(self):
+        self.write_course(course_file('统计学'), '统计学', ['均值'])
+        self.registry.refresh(force=True)
+
+        self.registry._apply({})
+        self.registry._load_manifest()
+        with patch.object(CourseRegistry, '_build_entry') as build:
+            self.registry.refresh(force=True)
+        build.assert_not_called()
+        self.assertEqual(self.registry.get_entry('统计学')['file'], course_file('统计学'))
+
+    def test_invalid_rewrite_keeps_previous_entry(self):
+        self.write_course(course_file('统计学'), '统计学', ['均值'])
+        self.registry.refresh(force=True)
+        with open(course_file('统计学'), 'w', encoding='utf-8') as f:
+            f.write('{"科目": "统计')
+
+        self.registry.refresh(force=True)
+        self.assertEqual(self.registry.get_entry('统计学')['concept_count'], 2)
+
+    def test_skips_non_object_course_file(self):
+        self.write_course(course_file('统计学'), '统计学', ['均值'])
+        with open(course_file('数组'), 'w', encoding='utf-8') as f:
+            f.write('[]')
+        with open(course_file('章节列表'), 'w', encoding='utf-8') as f:
+            f.write('{"科目": "章节列表", "章节": []}')
+
+        entries = self.registry.list_entries()
+        self.assertEqual([entry['name'] for entry in entries], ['章节列表', '统计学'])
+        self.assertEqual(self.registry.get_entry('章节列表')['chapter_count'], 0)
+
+    def test_migrates_legacy_course_files(self):
+        self.write_course('course_统计学.json', '统计学', ['均值'])
+        self.write_course('course_概率论.json', '概率论', ['事件'])
+        # 已存在于课程目录的文件不被覆盖
+        self.write_course(course_file('概率论'), '概率论', ['事件', '概率'])
+
+        # 创建注册表不会迁移文件，只有显式执行迁移时才迁移
+        self.registry.refresh(force=True)
+        self.assertIsNone(self.registry.get_entry('统计学'))
+        self.assertTrue(os.path.exists('course_统计学.json'))
+
+        with Flask(__name__).app_context():
+            self.assertEqual(migrate_legacy_course_files(), 1)
+        self.assertFalse(os.path.exists('course_统计学.json'))
+        self.assertTrue(os.path.exists('course_概率论.json'))
+        self.assertEqual(self.registry.get_entry('统计学')['file'], course_file('统计学'))
+        self.assertEqual(self.registry.get_entry('概率论')['concept_count'], 3)
+
+    def test_course_created_by_worker_is_visible_to_other_process(self):
+        # 另一个进程（如 Web 服务）的注册表实例，与 worker 读取同一课程目录
+        other = object.__new__(CourseRegistry)
+        other._initialized = False
+        other.__init__()
+        self.assertIsNone(other.get_entry('统计学'))
+
+        course = Course.create_course('统计学', '统计学课程', {'科目': '统计学', '章节': {'第一章': {'mainConcepts': ['均值']}}})
+        self.assertEqual(course.filename, course_file('统计学'))
+
+        other.refresh(force=True)
+        self.assertEqual(other.get_entry('统计学')['concept_count'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
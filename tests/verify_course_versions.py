@@ -0,0 +1,88 @@
+import unittest
+import sys
+import os
+import tempfile
+from flask import Flask
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.knowledge import KnowledgeBase
+from services.course_versions import diff_knowledge, versions_dirname, CourseVersionService
+
+
+def knowledge_base(chapters):
+    return KnowledgeBase({"科目": "数据库", "章节": chapters}, version=1)
+
+
+class TestCourseVersionDiff(unittest.TestCase):
+    def setUp(self):
+        self.old = knowledge_base({
+            "第一章 绪论": {"mainConcepts": ["数据库", "数据模型", "SQL"], "mainContents": ["数据库的发展"]},
+            "第二章 关系模型": {"mainConcepts": ["关系代数", "主键"], "mainContents": ["外键约束"]}
+        })
+
+    def test_unchanged(self):
+        diff = diff_knowledge(self.old, self.old)
+        self.assertEqual(diff['unchanged'], 7)
+        self.assertEqual(diff['added'] + diff['removed'] + diff['renamed'] + diff['moved'], [])
+
+    def test_added_removed_renamed_moved(self):
+        new = knowledge_base({
+            "第一章 绪论": {"mainConcepts": ["数据库", "数据模型概述"], "mainContents": ["数据库的发展", "事务"]},
+            "第二章 关系模型": {"mainConcepts": ["关系代数", "sql"], "mainContents": ["外键约束"]}
+        })
+        diff = diff_knowledge(self.old, new)
+
+        self.assertEqual(diff['added'], [{'chapter': '第一章 绪论', 'name': '事务', 'type': 'content'}])
+        self.assertEqual(diff['removed'], [{'chapter': '第二章 关系模型', 'name': '主键', 'type': 'concept'}])
+        self.assertEqual([(change['from']['name'], change['to']['name']) for change in diff['renamed']],
+                         [('数据模型', '数据模型概述')])
+        self.assertEqual([(change['from']['chapter'], change['to']['chapter']) for change in diff['moved']],
+                         [('第一章 绪论', '第二章 关系模型')])
+
+    def test_chapter_rename_moves_items(self):
+        new = knowledge_base({
+            "第一章 数据库绪论": {"mainConcepts": ["数据库", "数据模型", "SQL语言"], "mainContents": ["数据库的发展"]},
+            "第二章 关系模型": {"mainConcepts": ["关系代数", "主键"], "mainContents": ["外键约束"]}
+        })
+        diff = diff_knowledge(self.old, new)
+
+        self.assertEqual(len(diff['moved']), 3)
+        self.assertEqual(diff['added'], [])
+        self.assertEqual(diff['removed'], [])
+        # 章节改名后，改名章节内的相似名称仍识别为重命名
+        self.assertEqual([(change['from']['name'], change['to']['chapter'], change['to']['name'])
+                          for change in diff['renamed']],
+                         [('SQL', '第一章 数据库绪论', 'SQL语言')])
+
+
+
+class TestCourseVersionSync(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.service = CourseVersionService(versions_dir=self.temp_dir.name, explanation_cache=object())
+        self.app = Flask(__name__)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_rechecks_state_after_claim(self):
+        kb = knowledge_base({"第一章 绪论": {"mainConcepts": ["数据库"], "mainContents": []}})
+        course_dir = os.path.join(self.temp_dir.name, versions_dirname('数据库'))
+        claim = self.service._claim
+
+        def claim_after_other_worker(directory, version):
+            # 另一个进程在本进程读取状态之后、认领之前处理完了同一版本
+            CourseVersionService._save_state(directory, {'current': version, 'history': []})
+            return claim(directory, version)
+
+        self.service._claim = claim_after_other_worker
+        with self.app.app_context():
+            result = self.service.sync('数据库', kb)
+        self.assertEqual((result['changed'], result.get('baseline')), (False, None))
+        self.assertEqual(CourseVersionService._load_state(course_dir), {'current': kb.version_tag, 'history': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+from collections import Counter
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.explanation_cache import ExplanationCache, ExplanationAccessLog, _MemoryFiles
+from services.course_warmup import CourseWarmupService
+from services.task_service import TaskService
+from services.task_store import TaskStore
+
+
+class TestExplanationMemory(unittest.TestCase):
+    def test_lru_and_invalidation(self):
+        memory = _MemoryFiles(max_items=2)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = [os.path.join(temp_dir, f'{i}.txt') for i in range(3)]
+            for i, path in enumerate(paths):
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(f'讲解{i}')
+
+            self.assertEqual(memory.read(paths[0]), '讲解0')
+            self.assertEqual(memory.read(paths[0]), '讲解0')
+            self.assertEqual((memory.hits, memory.misses), (1, 1))
+
+            memory.read(paths[1])
+            memory.read(paths[2])
+            self.assertFalse(memory.contains(paths[0]))
+
+            # 文件被替换后重新读取
+            ExplanationCache._write_file(paths[2], '新讲解')
+            self.assertEqual(memory.read(paths[2]), '新讲解')
+
+            os.remove(paths[1])
+            self.assertIsNone(memory.read(paths[1]))
+            self.assertFalse(memory.contains(paths[1]))
+
+
+class TestAccessLog(unittest.TestCase):
+    def setUp(self):
+        self.log = ExplanationAccessLog()
+        self.saved = (self.log.path, self.log.counts, self.log.pending)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.log.path = os.path.join(self.temp_dir.name, 'access.json')
+        self.log.counts = None
+        self.log.pending = Counter()
+
+    def tearDown(self):
+        self.log.path, self.log.counts, self.log.pending = self.saved
+        self.temp_dir.cleanup()
+
+    def test_hottest_merges_other_workers(self):
+        cache = ExplanationCache(cache_dir=self.temp_dir.name)
+        # 其他工作进程已写回的计数
+        with open(self.log.path, 'w', encoding='utf-8') as f:
+            json.dump({cache.get_cache_filename('第一章', 'SQL'): 5}, f)
+
+        for _ in range(3):
+            cache.record_access('第一章', '事务')
+        cache.record_access('第二章', '关系代数')
+
+        items = [('第一章', 'SQL'), ('第一章', '事务'), ('第二章', '关系代数'), ('第二章', '外键')]
+        self.assertEqual(cache.hottest(items, 2), [('第一章', 'SQL'), ('第一章', '事务')])
+        self.assertEqual(len(cache.hottest(items, 10)), 3)
+
+        with open(self.log.path, encoding='utf-8') as f:
+            self.assertEqual(sum(json.load(f).values()), 9)
+
+
+class TestWarmupStatus(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.task_service = TaskService()
+        self.saved_store = self.task_service.store
+        self.task_service.store = TaskStore(os.path.join(self.temp_dir.name, 'tasks.db'))
+        self.warmup = CourseWarmupService()
+        self.saved_tasks = self.warmup.tasks
+        self.warmup.tasks = {}
+
+    def tearDown(self):
+        self.warmup.tasks = self.saved_tasks
+        self.task_service.store = self.saved_store
+        self.temp_dir.cleanup()
+
+    def test_status_is_read_from_shared_task_store(self):
+        store = self.task_service.store
+        store.create('warm-1', 'warm', 'other-host:1')
+        store.update('warm-1', status='running', progress=50,
+                     details={'course': '数据库原理', 'step': 'related_index', 'steps': {'knowledge_base': {}}})
+
+        # 未在本进程提交预热的工作进程：不按任务 id 查询时不知道预热状态
+        self.assertEqual(self.warmup.get_status('数据库原理')['state'], 'idle')
+
+        status = self.warmup.get_status('数据库原理', 'warm-1')
+        self.assertEqual(status['state'], 'running')
+        self.assertIn('knowledge_base', status['steps'])
+
+        store.update('warm-1', status='completed',
+                     result={'success': True, 'course': '数据库原理', 'duration_ms': 12.5, 'steps': {'exam_template': {}}})
+        status = self.warmup.get_status('数据库原理', 'warm-1')
+        self.assertEqual((status['state'], status['duration_ms']), ('ready', 12.5))
+        self.assertIsNotNone(status['finished_at'])
+
+        store.create('other-task', 'batch_explanations', None)
+        self.assertEqual(self.warmup.get_status('数据库原理', 'other-task')['state'], 'unknown')
+        self.assertEqual(self.warmup.get_status('数据库原理', 'missing')['state'], 'unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import sys
+import os
+import tempfile
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.explanation_search import ExplanationSearchIndex
+from utils import course_pack
+from utils.course_pack import CoursePackWriter, CoursePackRegistry, EXPLANATION_PREFIX
+
+
+class TestExplanationSearch(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, 'explanations')
+        os.makedirs(self.cache_dir)
+        patcher = patch.object(ExplanationSearchIndex, '_owners', return_value={
+            '第五章_参照完整性.txt': [('数据库原理', '第五章', '参照完整性')]
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # 课程包目录指向临时目录，结束后恢复注册表状态
+        self.packs_dir = os.path.join(self.temp_dir.name, 'packs')
+        os.makedirs(self.packs_dir)
+        registry = CoursePackRegistry()
+        saved = (course_pack.PACKS_DIR, registry.packs, registry._dir_signature, registry._last_scan)
+        course_pack.PACKS_DIR = self.packs_dir
+        registry.packs, registry._dir_signature, registry._last_scan = {}, None, 0.0
+
+        def restore():
+            for _, _, pack in registry.packs.values():
+                pack.close()
+            course_pack.PACKS_DIR, registry.packs, registry._dir_signature, registry._last_scan = saved
+        self.addCleanup(restore)
+        self.index = ExplanationSearchIndex(os.path.join(self.temp_dir.name, 'fts.db'), self.cache_dir)
+        if not self.index.available:
+            self.skipTest(self.index.error)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_upsert_search_and_remove(self):
+        body = '外键保证<b>参照完整性</b>，与 ACID 无直接关系'
+        with open(os.path.join(self.cache_dir, '第五章_参照完整性.txt'), 'w', encoding='utf-8') as f:
+            f.write(body)
+        self.index.upsert('第五章', '参照完整性', body)
+        result = self.index.search('参照完整性', course='数据库原理')
+        self.assertEqual(result['total'], 1)
+        hit = result['results'][0]
+        self.assertEqual((hit['course'], hit['chapter'], hit['concept']), ('数据库原理', '第五章', '参照完整性'))
+        self.assertIn('&lt;b&gt;<mark>参照完整性</mark>&lt;/b&gt;', hit['snippet'])
+
+        os.remove(os.path.join(self.cache_dir, '第五章_参照完整性.txt'))
+        self.index.remove('第五章', '参照完整性')
+        self.assertEqual(self.index.search('参照完整性')['total'], 0)
+
+    def test_short_query_and_sync_from_disk(self):
+        with open(os.path.join(self.cache_dir, '第一章_事务.txt'), 'w', encoding='utf-8') as f:
+            f.write('事务具有原子性')
+        self.index.sync(force=True)
+
+        result = self.index.search('事务')
+        self.assertEqual(result['total'], 1)
+        self.assertEqual(result['results'][0]['chapter'], '第一章')
+        self.assertIn('<mark>事务</mark>', result['results'][0]['snippet'])
+
+        os.remove(os.path.join(self.cache_dir, '第一章_事务.txt'))
+        self.index.sync(force=True)
+        self.assertEqual(self.index.stats()['files'], 0)
+
+    def write_pack(self, explanations):
+        with CoursePackWriter(os.path.join(self.packs_dir, 'course_数据库原理.cpk'),
+                              {'course_name': '数据库原理'}) as writer:
+            for filename, body in explanations.items():
+                writer.add(EXPLANATION_PREFIX + filename, body)
+
+    def test_indexes_mounted_pack_explanations(self):
+        with open(os.path.join(self.cache_dir, '第一章_事务.txt'), 'w', encoding='utf-8') as f:
+            f.write('本地缓存的事务讲解')
+        self.write_pack({'第五章_参照完整性.txt': '外键保证参照完整性',
+                         '第一章_事务.txt': '课程包中的事务讲解'})
+        self.index.sync(force=True)
+
+        hit = self.index.search('参照完整性')['results'][0]
+        self.assertEqual((hit['course'], hit['chapter']), ('数据库原理', '第五章'))
+        # 本地缓存优先，课程包中被覆盖的条目不索引
+        self.assertEqual(self.index.search('课程包中')['total'], 0)
+        self.assertEqual(self.index.search('本地缓存')['total'], 1)
+
+        # 重新挂载（课程包文件变化）后按新内容重建，旧条目移除
+        self.write_pack({'第五章_参照完整性.txt': '更新后的外键约束说明'})
+        CoursePackRegistry().refresh(force=True)
+        self.index.sync(force=True)
+        self.assertEqual(self.index.search('外键保证')['total'], 0)
+        self.assertEqual(self.index.search('外键约束')['total'], 1)
+        self.assertEqual(self.index.stats()['files'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
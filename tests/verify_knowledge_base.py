@@ -0,0 +1,82 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.knowledge import KnowledgeBase, KnowledgeBaseCache, KnowledgeBaseWatcher
+
+
+class TestKnowledgeBase(unittest.TestCase):
+    def setUp(self):
+        self.raw = {"科目": "数据库", "章节": {
+            "第一章": {"mainConcepts": ["数据模型", "事务"], "mainContents": ["数据库的发展历史"]},
+            "第二章": {"mainConcepts": ["事务"], "mainContents": []}
+        }}
+        self.knowledge_base = KnowledgeBase(self.raw, version=1)
+
+    def test_same_api_and_round_trip(self):
+        kb = self.knowledge_base
+        self.assertEqual(kb.get_subject(), '数据库')
+        self.assertEqual(list(kb.get_chapters()), ['第一章', '第二章'])
+        self.assertEqual(list(kb.get_concepts('第一章')), ['数据模型', '事务'])
+        self.assertEqual(list(kb.get_contents('不存在')), [])
+        self.assertEqual(kb.get_chapter_content('第一章'),
+                         {'mainConcepts': ['数据模型', '事务'], 'mainContents': ['数据库的发展历史']})
+        self.assertEqual(kb.to_dict(), self.raw)
+        self.assertEqual([item['type'] for item in kb.get_all_concepts_and_contents('第一章')],
+                         ['concept', 'concept', 'content'])
+
+    def test_listing_reuses_precomputed_structures(self):
+        kb = self.knowledge_base
+        self.assertIs(kb.get_chapters(), kb.get_chapters())
+        self.assertIs(kb.get_all_concepts_and_contents('第一章'), kb.get_all_concepts_and_contents('第一章'))
+
+    def test_interned_strings_and_concept_chapters(self):
+        other = KnowledgeBase(self.raw, version=2)
+        self.assertIs(other.get_concepts('第二章')[0], self.knowledge_base.get_concepts('第一章')[1])
+        self.assertEqual(self.knowledge_base.get_concept_chapters('事务'), ('第一章', '第二章'))
+        self.assertEqual(self.knowledge_base.get_concept_chapters('数据模型'), ('第一章',))
+
+
+
+class TestKnowledgeBaseHotReload(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'course_测试.json')
+        self.write({"科目": "测试", "章节": {"第一章": {"mainConcepts": ["旧"], "mainContents": []}}}, 1)
+        self.cache = KnowledgeBaseCache()
+        self.watcher = KnowledgeBaseWatcher()
+
+    def tearDown(self):
+        self.cache.invalidate(self.path)
+        self.temp_dir.cleanup()
+
+    def write(self, data, mtime):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(data if isinstance(data, str) else json.dumps(data, ensure_ascii=False))
+        os.utime(self.path, ns=(mtime * 10 ** 9, mtime * 10 ** 9))
+
+    def test_keeps_old_version_until_valid_file_is_stable(self):
+        old = self.cache.get(self.path)
+
+        self.write('{"科目": "测试", "章节": {', 2)
+        self.watcher.check()
+        self.watcher.check()
+        self.assertIs(self.cache.entries[os.path.abspath(self.path)][1], old)
+
+        self.write({"科目": "测试", "章节": {"第一章": {"mainConcepts": ["新"], "mainContents": []}}}, 3)
+        self.watcher.check()
+        self.assertIs(self.cache.entries[os.path.abspath(self.path)][1], old)
+        self.watcher.check()
+
+        new = self.cache.entries[os.path.abspath(self.path)][1]
+        self.assertEqual(list(new.get_concepts('第一章')), ['新'])
+        self.assertNotEqual(new.version_tag, old.version_tag)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.markdown_renderer import render_markdown, is_current_render
+
+
+class TestMarkdownRenderer(unittest.TestCase):
+    def test_escapes_raw_html(self):
+        rendered = render_markdown('正文 <script>alert(1)</script> <img src=x onerror=alert(1)>')
+        self.assertNotIn('<script>', rendered)
+        self.assertNotIn('<img', rendered)
+        self.assertIn('&lt;script&gt;', rendered)
+
+    def test_keeps_mermaid_placeholder(self):
+        rendered = render_markdown('```mermaid\ngraph TD\n    A["开始"] --> B\n```')
+        self.assertIn('<div class="mermaid">graph TD\n    A[&quot;开始&quot;] --&gt; B</div>', rendered)
+
+    def test_table_and_lists(self):
+        rendered = render_markdown('| 特点 | 说明 |\n|------|------|\n| **A** | `x<y` |\n\n- 一\n- 二')
+        self.assertIn('<th>特点</th>', rendered)
+        self.assertIn('<td><strong>A</strong></td><td><code>x&lt;y</code></td>', rendered)
+        self.assertIn('<ul><li>一</li><li>二</li></ul>', rendered)
+
+    def test_strips_thinking_and_unsafe_links(self):
+        rendered = render_markdown('<think>推理过程</think>\n[链接](javascript:alert)')
+        self.assertNotIn('推理过程', rendered)
+        self.assertNotIn('href', rendered)
+        self.assertTrue(is_current_render(rendered))
+
+    def test_links_with_parentheses(self):
+        rendered = render_markdown('[l](javascript:alert(1)) 之后')
+        self.assertNotIn('href', rendered)
+        self.assertIn('<p>l 之后</p>', rendered)
+
+        rendered = render_markdown('[关系模型](https://zh.wikipedia.org/wiki/模型_(数据库))')
+        self.assertIn('<a href="https://zh.wikipedia.org/wiki/模型_(数据库)"', rendered)
+        self.assertIn('>关系模型</a>', rendered)
+
+    def test_ignores_placeholder_like_input(self):
+        rendered = render_markdown('`a` 文本\x005\x00 与 \x000\x00')
+        self.assertIn('<p><code>a</code> 文本5 与 0</p>', rendered)
+
+
+if __name__ == '__main__':
+    unittest.main()
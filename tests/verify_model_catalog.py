@@ -0,0 +1,85 @@
+import unittest
+import sys
+import os
+from unittest import mock
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import requests
+from services.model_catalog import ModelCatalog, ollama_base_url
+
+TAGS = {'models': [
+    {'name': 'qwen2.5:14b', 'size': 9 * 1024 ** 3,
+     'details': {'family': 'qwen2', 'parameter_size': '14.8B', 'quantization_level': 'Q4_K_M'}},
+    {'name': 'qwen2.5:7b', 'size': 4.7 * 1024 ** 3,
+     'details': {'family': 'qwen2', 'parameter_size': '7.6B', 'quantization_level': 'Q4_K_M'}},
+    {'name': 'llama3:latest', 'size': 4.7 * 1024 ** 3, 'details': {}}
+]}
+
+
+def fake_get(ps_models):
+    def get(url, timeout=None):
+        response = mock.Mock()
+        response.raise_for_status.return_value = None
+        response.json.return_value = TAGS if url.endswith('/api/tags') else {'models': ps_models}
+        return response
+    return get
+
+
+class TestModelCatalog(unittest.TestCase):
+    def setUp(self):
+        self.catalog = ModelCatalog()
+        self.saved = dict(self.catalog.__dict__)
+        self.catalog.base_url = 'http://ollama:11434'
+        self.catalog.models = {}
+        self.catalog.loaded = {}
+        self.catalog.refreshed_at = None
+        self.catalog.error = None
+
+    def tearDown(self):
+        self.catalog.__dict__.update(self.saved)
+
+    def refresh(self, ps_models):
+        with mock.patch('services.model_catalog.requests.get', side_effect=fake_get(ps_models)):
+            return self.catalog.refresh()
+
+    def test_base_url(self):
+        self.assertEqual(ollama_base_url('http://127.0.0.1:11434/api/chat'), 'http://127.0.0.1:11434')
+
+    def test_catalog_details(self):
+        self.assertTrue(self.refresh([{'name': 'qwen2.5:7b', 'size_vram': 1}]))
+        models = {model['name']: model for model in self.catalog.list_models()}
+        self.assertEqual(sorted(models), ['llama3:latest', 'qwen2.5:14b', 'qwen2.5:7b'])
+        self.assertTrue(models['qwen2.5:7b']['loaded'])
+        self.assertEqual(models['qwen2.5:14b']['label'], 'qwen2.5:14b（14.8B · Q4_K_M · 9.0 GB）')
+        self.assertTrue(self.catalog.is_installed('llama3'))
+
+    def test_router_avoids_cold_load(self):
+        # 目录不可用时不改变模型
+        self.assertEqual(self.catalog.choose('qwen2.5:14b', ['qwen2.5:7b']), 'qwen2.5:14b')
+
+        self.refresh([{'name': 'qwen2.5:7b'}])
+        self.assertEqual(self.catalog.choose('qwen2.5:14b', ['llama3', 'qwen2.5:7b']), 'qwen2.5:7b')
+        self.assertEqual(self.catalog.choose('qwen2.5:14b', []), 'qwen2.5:14b')
+
+        self.catalog.mark_loaded('qwen2.5:14b')
+        self.assertEqual(self.catalog.choose('qwen2.5:14b', ['qwen2.5:7b']), 'qwen2.5:14b')
+
+        # 都未加载：首选模型未安装时使用已安装的备选模型
+        self.refresh([])
+        self.assertEqual(self.catalog.choose('missing:1b', ['llama3']), 'llama3')
+        self.assertEqual(self.catalog.choose('qwen2.5:14b', ['llama3']), 'qwen2.5:14b')
+
+    def test_failure_keeps_models(self):
+        self.refresh([])
+        with mock.patch('services.model_catalog.requests.get',
+                        side_effect=requests.ConnectionError('refused')):
+            self.assertFalse(self.catalog.refresh())
+        self.assertEqual(len(self.catalog.model_names()), 3)
+        self.assertFalse(self.catalog.available)
+        self.assertEqual(self.catalog.choose('qwen2.5:14b', ['qwen2.5:7b']), 'qwen2.5:14b')
+
+
+if __name__ == '__main__':
+    unittest.main()
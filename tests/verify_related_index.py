@@ -0,0 +1,100 @@
+import unittest
+import sys
+import os
+import tempfile
+from unittest.mock import MagicMock, patch
+from flask import Flask
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services import related_index
+from services.related_index import RelatedIndex, build_course_embeddings, normalize_rows, top_k_neighbors
+from services.ai_service import AIService
+
+np = related_index.np
+
+
+def char_embed(texts):
+    """按字符哈希的确定性向量，代替 Ollama 嵌入接口"""
+    vectors = []
+    for text in texts:
+        vector = [0.0] * 64
+        for char in text.split(' - ', 1)[-1]:
+            vector[ord(char) % 64] += 1.0
+        vectors.append(vector)
+    return vectors
+
+
+@unittest.skipIf(np is None, 'numpy 未安装')
+class TestRelatedIndex(unittest.TestCase):
+    def test_top_k_matches_brute_force(self):
+        vectors = normalize_rows(np.random.default_rng(0).normal(size=(50, 8)))
+        neighbors, scores = top_k_neighbors(vectors, k=5, block_rows=7)
+
+        similarity = vectors @ vectors.T
+        np.fill_diagonal(similarity, -np.inf)
+        expected = np.argsort(-similarity, axis=1)[:, :5]
+        np.testing.assert_array_equal(neighbors, expected)
+        self.assertTrue(np.all(scores[:, :-1] >= scores[:, 1:]))
+
+    def test_small_course_excludes_self(self):
+        neighbors, _ = top_k_neighbors(normalize_rows([[1, 0], [0.9, 0.1], [0, 1]]), k=20)
+        self.assertEqual(neighbors.shape, (3, 2))
+        self.assertEqual(list(neighbors[0]), [1, 2])
+
+    def test_build_and_lookup(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            result = build_course_embeddings('数据库原理', char_embed, output_dir=temp_dir, k=5)
+            self.assertTrue(result['success'])
+
+            index = RelatedIndex()
+            original_dir = index.embeddings_dir
+            index.embeddings_dir = temp_dir
+            try:
+                related = index.related('数据库原理', '第一章 数据库系统的世界(概述)', '数据库管理系统', k=3)
+            finally:
+                index.embeddings_dir = original_dir
+                index.courses.pop('数据库原理', None)
+
+        self.assertTrue(related['available'])
+        self.assertFalse(related['stale'])
+        self.assertEqual(len(related['results']), 3)
+        self.assertNotIn('数据库管理系统', [item['text'] for item in related['results']])
+
+    def test_missing_index(self):
+        result = RelatedIndex().related('不存在的课程', '第一章', '概念')
+        self.assertEqual(result, {'available': False, 'stale': False, 'results': []})
+
+
+class TestEmbed(unittest.TestCase):
+    def setUp(self):
+        context = Flask(__name__).app_context()
+        context.push()
+        self.addCleanup(context.pop)
+        self.service = AIService()
+        self.service.api_url = 'http://ollama:11434/api/chat'
+
+    @staticmethod
+    def response(status_code, embeddings=None):
+        response = MagicMock(status_code=status_code, text='model is loading')
+        response.json.return_value = {'embeddings': embeddings}
+        return response
+
+    def test_retries_with_backoff(self):
+        responses = [self.response(503), self.response(200, [[1.0]]), self.response(200, [[1.0], [2.0]])]
+        with patch('services.ai_service.requests.post', side_effect=responses) as post, \
+                patch('services.ai_service.time.sleep') as sleep:
+            self.assertEqual(self.service.embed(['a', 'b']), [[1.0], [2.0]])
+        self.assertEqual(post.call_count, 3)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [1, 2])
+
+    def test_count_mismatch_raises_runtime_error(self):
+        with patch('services.ai_service.requests.post', return_value=self.response(200, [[1.0]])), \
+                patch('services.ai_service.time.sleep'):
+            with self.assertRaises(RuntimeError):
+                self.service.embed(['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.knowledge import KnowledgeBase
+from services.search_index import SearchIndex, CourseIndex
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        db = KnowledgeBase({"科目": "数据库", "章节": {
+            "第一章": {"mainConcepts": ["数据模型", "关系模型"], "mainContents": ["数据模型的组成要素"]},
+            "第二章": {"mainConcepts": ["事务", "ACID特性"], "mainContents": ["事务的隔离级别"]}
+        }}, version=1)
+        os_course = KnowledgeBase({"科目": "操作系统", "章节": {
+            "第一章": {"mainConcepts": ["进程模型"], "mainContents": []}
+        }}, version=1)
+
+        self.index = SearchIndex()
+        # SearchIndex 是进程级单例，测试结束后恢复原有索引
+        self.addCleanup(setattr, self.index, 'course_indexes', self.index.course_indexes)
+        self.index.course_indexes = {
+            '数据库': CourseIndex('数据库', db),
+            '操作系统': CourseIndex('操作系统', os_course)
+        }
+        patcher = patch.object(SearchIndex, 'refresh')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ranking_exact_prefix_substring(self):
+        result = self.index.search('数据模型', courses=['数据库'])
+        self.assertEqual([(r['content'], r['match']) for r in result['results']],
+                         [('数据模型', 'exact'), ('数据模型的组成要素', 'prefix')])
+
+        result = self.index.search('模型', courses=['数据库'])
+        self.assertEqual([r['content'] for r in result['results']], ['数据模型', '关系模型', '数据模型的组成要素'])
+
+    def test_concept_before_content(self):
+        result = self.index.search('事务', courses=['数据库'])
+        self.assertEqual([r['type'] for r in result['results']], ['concept', 'content'])
+
+    def test_latin_substring_and_case(self):
+        result = self.index.search('cid', courses=['数据库'])
+        self.assertEqual([r['content'] for r in result['results']], ['ACID特性'])
+
+    def test_cross_course_and_pagination(self):
+        result = self.index.search('模型', page=1, page_size=2)
+        self.assertEqual(result['total'], 4)
+        self.assertEqual(len(result['results']), 2)
+        self.assertIn('操作系统', {r['course'] for r in self.index.search('模型', page_size=10)['results']})
+
+        second = self.index.search('模型', page=2, page_size=2)
+        self.assertEqual(len(second['results']), 2)
+
+    def test_single_character_query(self):
+        result = self.index.search('务', courses=['数据库'])
+        self.assertEqual(result['total'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
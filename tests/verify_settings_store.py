@@ -0,0 +1,111 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.settings_service import SettingsStore, DEFAULT_SETTINGS, AI_SETTINGS_SAVED_KEY
+
+
+class TestSettingsStore(unittest.TestCase):
+    def setUp(self):
+        self.store = SettingsStore()
+        self.saved = (self.store.path, self.store.interval, self.store.data, self.store.stat,
+                      self.store.checked_at, self.store.subscribers, self.store.defaults)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store.path = os.path.join(self.temp_dir.name, 'settings.json')
+        self.store.data = None
+        self.store.stat = None
+        self.store.subscribers = {}
+        self.changes = []
+        self.store.subscribe('test', lambda old, new: self.changes.append(
+            (old.get('current_course'), new.get('current_course'))
+        ))
+
+    def tearDown(self):
+        (self.store.path, self.store.interval, self.store.data, self.store.stat,
+         self.store.checked_at, self.store.subscribers, self.store.defaults) = self.saved
+        self.temp_dir.cleanup()
+
+    def write_external(self, settings):
+        with open(self.store.path, 'w', encoding='utf-8') as f:
+            json.dump(settings, f, ensure_ascii=False)
+        # 确保与上次写入的 mtime/大小不同
+        os.utime(self.store.path, ns=(0, os.stat(self.store.path).st_mtime_ns + 1000))
+
+    def test_missing_or_corrupt_file_uses_defaults(self):
+        self.store.interval = 0
+        self.assertEqual(self.store.get('current_course'), DEFAULT_SETTINGS['current_course'])
+        self.assertTrue(os.path.exists(self.store.path))
+
+        with open(self.store.path, 'w', encoding='utf-8') as f:
+            f.write('{broken')
+        self.assertEqual(self.store.get('ollama_model'), DEFAULT_SETTINGS['ollama_model'])
+
+    def test_save_notifies_and_returns_copies(self):
+        self.store.interval = 60
+        settings = self.store.get()
+        settings['current_course'] = '操作系统'
+        self.assertEqual(self.store.get('current_course'), DEFAULT_SETTINGS['current_course'])
+
+        self.assertTrue(self.store.update(current_course='操作系统'))
+        self.assertEqual(self.store.get('current_course'), '操作系统')
+        self.assertEqual(self.changes, [(DEFAULT_SETTINGS['current_course'], '操作系统')])
+
+    def test_revalidates_external_writes_after_interval(self):
+        self.store.interval = 60
+        self.store.update(current_course='操作系统')
+        self.write_external({**self.store.get(), 'current_course': '统计学'})
+
+        # 检查间隔内不读取文件
+        self.assertEqual(self.store.get('current_course'), '操作系统')
+
+        self.store.interval = 0
+        self.assertEqual(self.store.get('current_course'), '统计学')
+        self.assertEqual(self.changes[-1], ('操作系统', '统计学'))
+
+    def test_new_process_applies_saved_ai_settings(self):
+        from flask import Flask
+        from app import register_settings_store
+        self.write_external({**DEFAULT_SETTINGS, 'ollama_model': 'saved-model',
+                             AI_SETTINGS_SAVED_KEY: '2025-01-01T00:00:00'})
+        app = Flask(__name__)
+        app.config.update(OLLAMA_MODEL='env-model', OLLAMA_API_URL='http://localhost:11434/api/generate',
+                          MODEL_CATALOG_ENABLED=False, SETTINGS_REVALIDATE_INTERVAL=60)
+        register_settings_store(app)
+        self.assertEqual(app.config['OLLAMA_MODEL'], 'saved-model')
+
+    def test_existing_file_without_saved_ai_settings_keeps_env(self):
+        from flask import Flask
+        from app import register_settings_store
+        # 随代码分发或旧版本写入的设置文件：没有在设置页面保存过 AI 设置
+        self.write_external({**DEFAULT_SETTINGS, 'ollama_api_url': 'http://127.0.0.1:11434/api/chat',
+                             'ollama_model': 'file-model'})
+        app = Flask(__name__)
+        app.config.update(OLLAMA_MODEL='env-model', OLLAMA_API_URL='http://host.docker.internal:11434/api/chat',
+                          MODEL_CATALOG_ENABLED=False, SETTINGS_REVALIDATE_INTERVAL=60)
+        register_settings_store(app)
+        self.assertEqual(app.config['OLLAMA_API_URL'], 'http://host.docker.internal:11434/api/chat')
+        self.assertEqual(app.config['OLLAMA_MODEL'], 'env-model')
+
+    def test_first_start_keeps_configured_ai_settings(self):
+        from flask import Flask
+        from app import register_settings_store
+        app = Flask(__name__)
+        app.config.update(OLLAMA_MODEL='env-model', OLLAMA_API_URL='http://host.docker.internal:11434/api/chat',
+                          MODEL_CATALOG_ENABLED=False, SETTINGS_REVALIDATE_INTERVAL=60)
+        register_settings_store(app)
+
+        self.assertEqual(app.config['OLLAMA_API_URL'], 'http://host.docker.internal:11434/api/chat')
+        self.assertEqual(app.config['OLLAMA_MODEL'], 'env-model')
+        with open(self.store.path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        self.assertEqual(saved['ollama_model'], 'env-model')
+        self.assertEqual(saved['current_course'], DEFAULT_SETTINGS['current_course'])
+
+
+if __name__ == '__main__':
+    unittest.main()
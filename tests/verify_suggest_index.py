@@ -0,0 +1,36 @@
+import unittest
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.knowledge import KnowledgeBase
+from services import suggest_index
+from services.suggest_index import CourseTrie
+
+
+class TestSuggestIndex(unittest.TestCase):
+    def setUp(self):
+        knowledge_base = KnowledgeBase({"科目": "数据库", "章节": {
+            "第一章": {"mainConcepts": ["数据库系统", "数据库", "BC 范式"], "mainContents": ["数据库的发展历史"]},
+            "第二章": {"mainConcepts": ["事务"], "mainContents": []}
+        }}, version=1)
+        self.trie = CourseTrie('数据库', knowledge_base)
+
+    def names(self, prefix):
+        return [self.trie.items[item_id][0] for item_id in self.trie.lookup(prefix)]
+
+    def test_prefix_ranking(self):
+        self.assertEqual(self.names('数据'), ['数据库', '数据库系统', '数据库的发展历史'])
+        self.assertEqual(self.names('bc范'), ['BC 范式'])
+        self.assertEqual(self.names('不存在'), [])
+
+    @unittest.skipIf(suggest_index.lazy_pinyin is None, 'pypinyin 未安装')
+    def test_pinyin_full_and_initials(self):
+        self.assertEqual(self.names('sjk')[:2], ['数据库', '数据库系统'])
+        self.assertEqual(self.names('shiwu'), ['事务'])
+
+
+if __name__ == '__main__':
+    unittest.main()
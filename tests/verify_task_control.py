@@ -0,0 +1,106 @@
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import time
+from flask import Flask
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services import task_service as task_module
+from services.task_store import TaskStore
+from services.task_service import TaskService, checkpoint, public_task
+
+
+class TestTaskControl(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = TaskStore(os.path.join(self.temp_dir.name, 'tasks.db'))
+        self.service = TaskService()
+        self.saved = (self.service.store, task_module.PAUSE_CHECK_INTERVAL)
+        self.service.store = self.store
+        task_module.PAUSE_CHECK_INTERVAL = 0.02
+        self.app = Flask(__name__)
+        self.processed = []
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.service.store, task_module.PAUSE_CHECK_INTERVAL = self.saved
+        self.release.set()
+        self.temp_dir.cleanup()
+
+    def batch(self, items, progress_callback=None):
+        for item in items:
+            if checkpoint():
+                break
+            self.processed.append(item)
+            self.release.wait(5)
+        return {'processed': list(self.processed)}
+
+    def submit(self, items):
+        with self.app.app_context():
+            return self.service.submit_task(self.batch, items)
+
+    def wait_for(self, task_id, statuses, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            task = self.store.get(task_id)
+            if task['status'] in statuses:
+                return task
+            time.sleep(0.01)
+        self.fail(f'任务未进入状态 {statuses}: {self.store.get(task_id)}')
+
+    def wait_processed(self, count):
+        deadline = time.time() + 5
+        while len(self.processed) < count and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_cancel_keeps_partial_results(self):
+        task_id = self.submit(['a', 'b', 'c', 'd'])
+        self.wait_processed(1)
+
+        self.assertTrue(self.service.control_task(task_id, 'cancel')['success'])
+        # 取消后不能再暂停
+        self.assertFalse(self.service.control_task(task_id, 'pause')['success'])
+        self.release.set()
+
+        task = self.wait_for(task_id, ('cancelled',))
+        self.assertEqual(task['result'], {'processed': ['a']})
+        self.assertIsNone(task['control'])
+        self.assertFalse(self.service.control_task(task_id, 'resume')['success'])
+
+    def test_pause_and_resume(self):
+        task_id = self.submit(['a', 'b', 'c'])
+        self.wait_processed(1)
+
+        self.service.control_task(task_id, 'pause')
+        self.release.set()
+        self.wait_for(task_id, ('paused',))
+        self.assertEqual(self.processed, ['a'])
+
+        self.service.control_task(task_id, 'resume')
+        task = self.wait_for(task_id, ('completed',))
+        self.assertEqual(task['result'], {'processed': ['a', 'b', 'c']})
+        statuses = [event['data'].get('status') for event in self.store.events(task_id=task_id)]
+        self.assertIn('paused', statuses)
+
+    def test_checkpoint_outside_task(self):
+        self.assertFalse(checkpoint())
+        self.assertFalse(self.service.control_task('missing', 'cancel')['success'])
+        self.assertFalse(self.service.control_task('missing', 'stop')['success'])
+
+
+    def test_public_task_hides_internal_fields(self):
+        self.store.create('import-1', 'import_syllabus', None, username='alice', dedup_key='import:统计学',
+                          payload={'args': ['/app/static/uploads/import_x.csv', '统计学', 'csv', False], 'kwargs': {}})
+        task = public_task(self.store.get('import-1'))
+        self.assertEqual((task['id'], task['kind'], task['status']), ('import-1', 'import_syllabus', 'pending'))
+        for field in ('payload', 'dedup_key', 'owner', 'username', 'heartbeat_at'):
+            self.assertNotIn(field, task)
+        self.assertIsNone(public_task(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import sys
+import os
+import sqlite3
+import tempfile
+import time
+from flask import Flask, session
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services import jobs
+from services import task_service as task_module
+from services.task_store import TaskStore
+from services.task_service import TaskService, exclusive
+
+
+class TestTaskDedup(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = TaskStore(os.path.join(self.temp_dir.name, 'tasks.db'))
+        self.service = TaskService()
+        self.saved = (self.service.store, task_module.LOCK_WAIT_INTERVAL)
+        self.service.store = self.store
+        task_module.LOCK_WAIT_INTERVAL = 0.02
+        self.app = Flask(__name__)
+        self.app.secret_key = 'test'
+        self.app.config['TASK_EXECUTION_MODE'] = 'worker'
+        self.order = []
+
+        @jobs.job('test_course_job', key=lambda course, chapter=None: f'{course}:{chapter}')
+        def course_job(course, chapter=None, progress_callback=None):
+            with exclusive(f'test:{course}') as waited:
+                self.order.append((chapter, 'start', waited))
+                time.sleep(0.2)
+                self.order.append((chapter, 'end', waited))
+            return {'chapter': chapter}
+
+    def tearDown(self):
+        jobs.JOBS.pop('test_course_job', None)
+        jobs.JOB_KEYS.pop('test_course_job', None)
+        self.service.store, task_module.LOCK_WAIT_INTERVAL = self.saved
+        self.temp_dir.cleanup()
+
+    def enqueue(self, *args, username='alice', key=None, **kwargs):
+        with self.app.test_request_context():
+            session['username'] = username
+            return self.service.enqueue_job('test_course_job', args, kwargs, idempotency_key=key,
+                                            from_user=True)
+
+    def test_derived_key_dedups_active_tasks_only(self):
+        first = self.enqueue('统计学', chapter='第一章')
+        again = self.enqueue('统计学', chapter='第一章', username='bob')
+        other = self.enqueue('统计学', chapter='第二章')
+        self.assertTrue(first['created'])
+        self.assertEqual(again, {'task_id': first['task_id'], 'created': False})
+        self.assertTrue(other['created'])
+
+        # 并发插入相同键时由唯一索引拦截
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.store.create('dup', 'test_course_job', None, dedup_key='test_course_job:统计学:第一章')
+
+        # 任务结束后可以重新提交
+        self.store.update(first['task_id'], status='completed')
+        self.assertTrue(self.enqueue('统计学', chapter='第一章')['created'])
+
+    def test_client_key_returns_finished_task(self):
+        first = self.enqueue('统计学', key='click-1')
+        self.store.update(first['task_id'], status='completed')
+        self.assertEqual(self.enqueue('统计学', key='click-1'), {'task_id': first['task_id'], 'created': False})
+        # 幂等键按用户区分
+        self.assertTrue(self.enqueue('统计学', key='click-1', username='bob')['created'])
+
+    def test_lock_takeover(self):
+        self.store.create('t1', 'job', 'host:1')
+        self.store.create('t2', 'job', 'host:1')
+        self.assertTrue(self.store.acquire_lock('course', 't1'))
+        self.assertTrue(self.store.acquire_lock('course', 't1'))
+        self.assertFalse(self.store.acquire_lock('course', 't2'))
+
+        # 持有任务结束后可以接管
+        self.store.update('t1', status='failed')
+        self.assertTrue(self.store.acquire_lock('course', 't2'))
+        # 只有持有者能释放
+        self.store.release_lock('course', 't1')
+        self.assertFalse(self.store.acquire_lock('course', 't1'))
+        self.store.release_lock('course', 't2')
+        self.assertTrue(self.store.acquire_lock('course', 't1'))
+
+    def test_exclusive_serializes_tasks(self):
+        self.app.config['TASK_EXECUTION_MODE'] = 'thread'
+        first = self.enqueue('统计学', chapter='第一章')['task_id']
+        second = self.enqueue('统计学', chapter='第二章')['task_id']
+
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            if all(self.store.get(tid)['status'] == 'completed' for tid in (first, second)):
+                break
+            time.sleep(0.02)
+
+        starts = [entry for entry in self.order if entry[1] == 'start']
+        self.assertEqual(len(self.order), 4)
+        # 两个任务不重叠：第一个结束后第二个才开始，且第二个等待过
+        self.assertEqual(self.order[1][1], 'end')
+        self.assertEqual([waited for _, _, waited in starts], [False, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
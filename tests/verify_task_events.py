@@ -0,0 +1,108 @@
+import unittest
+import sys
+import os
+import tempfile
+import threading
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.task_store import TaskStore
+from services.task_service import TaskService
+
+
+class TestTaskEvents(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'tasks.db')
+        self.store = TaskStore(self.path)
+        self.service = TaskService()
+        self.saved_store = self.service.store
+        self.service.store = self.store
+
+    def tearDown(self):
+        self.service.store = self.saved_store
+        self.temp_dir.cleanup()
+
+    def test_events_contain_only_changed_fields(self):
+        self.store.create('t1', 'batch_explain_all', 'host:1', username='alice')
+        self.store.update('t1', progress=10, details={'chapter': '第一章', 'concept': 'SQL'})
+        self.store.update('t1', status='completed', result={'success': True, 'results': list(range(100))})
+        self.store.heartbeat(['t1'])
+
+        events = self.store.events(task_id='t1')
+        self.assertEqual([event['data'].get('status') for event in events], ['pending', None, 'completed'])
+        self.assertEqual(events[1]['data'], {'progress': 10, 'details': {'chapter': '第一章', 'concept': 'SQL'}})
+        # 结果本身不推送，只通知已就绪
+        self.assertEqual(events[2]['data'], {'status': 'completed', 'has_result': True})
+
+        # Last-Event-ID 续传
+        after = self.store.events(task_id='t1', after_id=events[0]['id'])
+        self.assertEqual([event['id'] for event in after], [events[1]['id'], events[2]['id']])
+        self.assertEqual(self.store.last_event_id(task_id='t1'), events[2]['id'])
+
+    def test_user_events_and_stale_failure(self):
+        self.store.create('a1', 'job', 'host:1', username='alice')
+        self.store.create('b1', 'job', 'host:1', username='bob')
+        self.store.create('a2', 'job', 'host:2', username='alice')
+        self.assertEqual([event['task_id'] for event in self.store.events(username='alice')], ['a1', 'a2'])
+
+        conn = self.store._connect()
+        with conn:
+            conn.execute("UPDATE tasks SET heartbeat_at = 0 WHERE id = 'a2'")
+        self.store.mark_stale()
+        last = self.store.events(username='alice')[-1]
+        self.assertEqual((last['task_id'], last['data']['status']), ('a2', 'failed'))
+
+    def test_stream_wakes_on_update_and_stops_when_finished(self):
+        self.store.create('t1', 'job', 'host:1')
+        start = self.store.last_event_id(task_id='t1')
+
+        def finish():
+            self.store.update('t1', status='running', progress=50)
+            self.store.update('t1', status='completed', progress=100)
+
+        timer = threading.Timer(0.1, finish)
+        timer.start()
+        items = list(self.service.stream_events(task_id='t1', after_id=start, max_duration=5, poll_interval=2))
+        timer.join()
+
+        events = [item for item in items if item is not None]
+        self.assertEqual([data['status'] for _, _, data in events], ['running', 'completed'])
+
+    def test_stream_ends_after_max_duration(self):
+        self.store.create('t1', 'job', 'host:1')
+        start = self.store.last_event_id(task_id='t1')
+        items = list(self.service.stream_events(task_id='t1', after_id=start, max_duration=0.2, poll_interval=0.05))
+        self.assertTrue(items)
+        self.assertTrue(all(item is None for item in items))
+
+    def test_stream_delivers_update_landing_after_snapshot(self):
+        from flask import Flask
+        from routes import api_bp
+        app = Flask(__name__)
+        app.config.update(SSE_MAX_DURATION=0.5, SSE_POLL_INTERVAL=0.05)
+        app.register_blueprint(api_bp, url_prefix='/api')
+        self.store.create('t1', 'job', 'host:1')
+        self.store.update('t1', status='running')
+
+        get_task = self.service.get_task
+
+        def get_then_finish(task_id):
+            # 读取快照后任务立即结束
+            task = get_task(task_id)
+            self.store.update(task_id, status='completed', progress=100)
+            return task
+
+        self.service.get_task = get_then_finish
+        try:
+            body = app.test_client().get('/api/tasks/t1/events').get_data(as_text=True)
+        finally:
+            del self.service.get_task
+        self.assertIn('"status": "running"', body)
+        self.assertIn('event: end', body)
+        self.assertIn('"status": "completed"', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import sys
+import os
+import tempfile
+import time
+from flask import Flask, session
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services import jobs
+from services.task_store import TaskStore, QueueFull
+from services.task_service import TaskService
+
+
+class TestTaskQueue(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = TaskStore(os.path.join(self.temp_dir.name, 'tasks.db'))
+        self.service = TaskService()
+        self.saved_store = self.service.store
+        self.service.store = self.store
+        self.app = Flask(__name__)
+        self.app.secret_key = 'test'
+        self.app.config.update(TASK_EXECUTION_MODE='worker', TASK_QUEUE_MAX=3, TASK_QUEUE_MAX_PER_USER=2)
+
+        @jobs.job('test_noop')
+        def noop(value, progress_callback=None):
+            return {'value': value}
+
+    def tearDown(self):
+        jobs.JOBS.pop('test_noop', None)
+        self.service.store = self.saved_store
+        self.temp_dir.cleanup()
+
+    def enqueue(self, value, username='alice', from_user=True):
+        with self.app.test_request_context():
+            session['username'] = username
+            return self.service.enqueue_job('test_noop', (value,), from_user=from_user)['task_id']
+
+    def finish(self, task_id, duration):
+        """模拟已执行 duration 秒后完成的任务"""
+        now = time.time()
+        self.store.update(task_id, status='completed')
+        conn = self.store._connect()
+        with conn:
+            conn.execute("UPDATE tasks SET started_at = ?, updated_at = ? WHERE id = ?", (now - duration, now, task_id))
+
+    def test_per_user_and_global_limits(self):
+        self.enqueue(1)
+        self.enqueue(2)
+        with self.assertRaises(QueueFull) as raised:
+            self.enqueue(3)
+        self.assertGreaterEqual(raised.exception.retry_after, 5)
+
+        self.enqueue(3, username='bob')
+        with self.assertRaises(QueueFull):
+            self.enqueue(4, username='carol')
+        # 系统内部提交的任务不属于用户，不受上限限制
+        system = self.enqueue(4, username='carol', from_user=False)
+        self.assertIsNone(self.store.get(system)['username'])
+        self.assertEqual(self.store.stats()['pending'], 4)
+
+    def test_system_tasks_not_counted_for_user(self):
+        # 系统任务仍计入等待执行的总数，这里只验证用户上限
+        self.app.config['TASK_QUEUE_MAX'] = 10
+        with self.app.test_request_context():
+            session['username'] = 'alice'
+            warmups = [self.service.submit_task(lambda progress_callback=None: None) for _ in range(3)]
+        self.assertTrue(all(self.store.get(task_id)['username'] is None for task_id in warmups))
+        self.enqueue(1)
+        self.enqueue(2)
+
+    def test_queue_position_and_metrics(self):
+        for index in range(2):
+            done = self.enqueue(index)
+            self.store.update(done, status='running')
+            self.finish(done, 10)
+        running = self.enqueue('running', username='bob')
+        self.store.update(running, status='running')
+        first = self.enqueue('a')
+        second = self.enqueue('b')
+
+        # 唯一的执行槽约 10 秒后空出，第二个排队任务还要再等一个任务的执行时间
+        self.assertEqual(self.service.get_task(first)['queue']['position'], 1)
+        queue = self.service.get_task(second)['queue']
+        self.assertEqual(queue['position'], 2)
+        self.assertAlmostEqual(queue['estimated_wait'], 20, delta=1)
+        self.assertNotIn('queue', self.service.get_task(running))
+
+        metrics = self.store.queue_metrics()
+        self.assertEqual((metrics['depth'], metrics['running'], metrics['started']), (2, 1, 3))
+        self.assertEqual(metrics['depth_by_kind'], {'test_noop': 2})
+        self.assertEqual(metrics['avg_duration'], 10)
+        self.assertIsNotNone(metrics['avg_wait'])
+
+
+if __name__ == '__main__':
+    unittest.main()
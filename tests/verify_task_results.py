@@ -0,0 +1,72 @@
+import unittest
+import sys
+import os
+import tempfile
+import time
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.task_store import TaskStore
+
+
+class TestTaskResults(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = TaskStore(os.path.join(self.temp_dir.name, 'tasks.db'))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def finish(self, task_id, items=None, text=''):
+        self.store.create(task_id, 'batch_explain_all', 'host:1')
+        result = {'success': True, 'text': text}
+        if items is not None:
+            result['items'] = items
+        self.store.update(task_id, status='completed', result=result)
+
+    def test_items_stored_separately(self):
+        items = [{'concept': f'概念{i}', 'status': 'failed' if i % 3 == 0 else 'generated'} for i in range(10)]
+        self.finish('t1', items)
+
+        task = self.store.get('t1')
+        self.assertEqual(task['result'], {'success': True, 'text': '', 'items_count': 10})
+
+        page, total = self.store.results('t1', offset=4, limit=4)
+        self.assertEqual(total, 10)
+        self.assertEqual([item['concept'] for item in page], ['概念4', '概念5', '概念6', '概念7'])
+        failed, total = self.store.results('t1', status='failed')
+        self.assertEqual((total, [item['concept'] for item in failed]), (4, ['概念0', '概念3', '概念6', '概念9']))
+
+        # 再次写入结果时替换明细
+        self.store.update('t1', result={'success': True, 'items': items[:2]})
+        self.assertEqual(self.store.results('t1')[1], 2)
+        self.assertEqual(self.store.results('missing'), ([], 0))
+
+    def test_evicts_oldest_finished_tasks(self):
+        for index in range(4):
+            self.finish(f't{index}', [{'status': 'generated'}] * 3)
+            time.sleep(0.01)
+        self.store.create('running', 'batch_explain_all', 'host:1')
+
+        self.assertEqual(self.store.purge(max_finished=2), 2)
+        self.assertIsNone(self.store.get('t0'))
+        self.assertIsNone(self.store.get('t1'))
+        self.assertIsNotNone(self.store.get('t3'))
+        self.assertEqual(self.store.get('running')['status'], 'pending')
+        self.assertEqual(self.store.results('t0'), ([], 0))
+
+    def test_evicts_by_size_but_keeps_latest(self):
+        self.finish('small', text='x' * 100)
+        time.sleep(0.01)
+        self.finish('large', [{'text': 'y' * 5000}])
+
+        # 最近结束的任务即使超出上限也保留
+        self.assertEqual(self.store.purge(max_bytes=1000), 1)
+        self.assertIsNone(self.store.get('small'))
+        self.assertEqual(self.store.results('large')[1], 1)
+        self.assertEqual(self.store.purge(max_bytes=1000), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.task_store import TaskStore, STALE_AFTER
+
+
+class TestTaskStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'tasks.db')
+        self.store = TaskStore(self.path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_shared_between_store_instances(self):
+        self.store.create('t1', 'batch_explain_all', 'host:1')
+        self.store.update('t1', status='running', progress=40,
+                          details={'chapter': '第一章', 'concept': 'SQL'}, message='正在生成')
+
+        # 另一个进程打开同一数据库
+        other = TaskStore(self.path)
+        task = other.get('t1')
+        self.assertEqual((task['status'], task['progress'], task['kind']), ('running', 40, 'batch_explain_all'))
+        self.assertEqual(task['details'], {'chapter': '第一章', 'concept': 'SQL'})
+
+        other.update('t1', status='completed', result={'success': True, 'results': [{'concept': 'SQL'}]})
+        self.assertEqual(self.store.get('t1')['result']['results'], [{'concept': 'SQL'}])
+        self.assertIsNone(self.store.get('missing'))
+        self.assertFalse(self.store.update('missing', status='failed'))
+
+    def test_stale_tasks_fail(self):
+        self.store.create('alive', 'job', 'host:1')
+        self.store.create('dead', 'job', 'host:2')
+        self.store.create('done', 'job', 'host:2')
+        self.store.update('done', status='completed')
+
+        conn = self.store._connect()
+        with conn:
+            conn.execute("UPDATE tasks SET heartbeat_at = 0 WHERE id IN ('dead', 'done')")
+
+        self.store.heartbeat(['alive'])
+        task = self.store.get('dead')
+        self.assertEqual(task['status'], 'failed')
+        self.assertIn('心跳超时', task['error'])
+        self.assertEqual(self.store.get('alive')['status'], 'pending')
+        self.assertEqual(self.store.get('done')['status'], 'completed')
+        self.assertGreater(STALE_AFTER, 0)
+
+    def test_purge_keeps_active_tasks(self):
+        self.store.create('old-done', 'job', 'host:1')
+        self.store.update('old-done', status='completed')
+        self.store.create('old-running', 'job', 'host:1')
+        conn = self.store._connect()
+        with conn:
+            conn.execute("UPDATE tasks SET created_at = 0")
+
+        self.assertEqual(self.store.purge(), 1)
+        self.assertIsNotNone(self.store.get('old-running'))
+
+
+if __name__ == '__main__':
+    unittest.main()
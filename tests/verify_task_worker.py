@@ -0,0 +1,114 @@
+import unittest
+import sys
+import os
+import tempfile
+import time
+from flask import Flask
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services import jobs
+from services.task_store import TaskStore
+from services.task_service import TaskService, checkpoint
+from worker import Worker
+
+
+class TestTaskWorker(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = TaskStore(os.path.join(self.temp_dir.name, 'tasks.db'))
+        self.service = TaskService()
+        self.saved_store = self.service.store
+        self.service.store = self.store
+        self.app = Flask(__name__)
+        self.app.config['TASK_EXECUTION_MODE'] = 'worker'
+        self.calls = []
+
+        @jobs.job('test_echo')
+        def echo(text, repeat=1, progress_callback=None):
+            self.calls.append(text)
+            progress_callback({'percentage': 50, 'message': '处理中'})
+            return {'text': text * repeat}
+
+        @jobs.job('test_slow')
+        def slow(steps, progress_callback=None):
+            done = 0
+            for _ in range(steps):
+                if checkpoint():
+                    break
+                time.sleep(0.05)
+                done += 1
+            return {'done': done}
+
+    def tearDown(self):
+        jobs.JOBS.pop('test_echo', None)
+        jobs.JOBS.pop('test_slow', None)
+        self.service.store = self.saved_store
+        self.temp_dir.cleanup()
+
+    def enqueue(self, kind, *args, **kwargs):
+        with self.app.app_context():
+            return self.service.enqueue(kind, *args, **kwargs)
+
+    def wait_for(self, task_id, statuses, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            task = self.store.get(task_id)
+            if task['status'] in statuses:
+                return task
+            time.sleep(0.02)
+        self.fail(f'任务未进入状态 {statuses}: {self.store.get(task_id)}')
+
+    def test_web_tier_only_enqueues(self):
+        task_id = self.enqueue('test_echo', 'ab', repeat=2)
+        task = self.store.get(task_id)
+        self.assertEqual((task['status'], task['owner']), ('pending', None))
+        self.assertEqual(task['payload'], {'args': ['ab'], 'kwargs': {'repeat': 2}})
+        self.assertEqual(self.calls, [])
+        self.assertEqual(self.store.stats()['queued'], 1)
+
+        # 排队中的任务不做心跳超时检测
+        conn = self.store._connect()
+        with conn:
+            conn.execute("UPDATE tasks SET heartbeat_at = 0")
+        self.assertEqual(self.store.mark_stale(), 0)
+
+        with self.assertRaises(ValueError):
+            self.enqueue('no_such_job')
+
+    def test_claim_is_exclusive(self):
+        first = self.enqueue('test_echo', 'a')
+        second = self.enqueue('test_echo', 'b')
+        other = TaskStore(self.store.db_path)
+
+        self.assertEqual(self.store.claim('w1')['id'], first)
+        self.assertEqual(other.claim('w2')['id'], second)
+        self.assertIsNone(self.store.claim('w1'))
+        self.assertIsNone(self.store.claim('w1', kinds=['test_slow']))
+
+    def test_worker_runs_and_drains(self):
+        echo_id = self.enqueue('test_echo', 'x', repeat=3)
+        slow_id = self.enqueue('test_slow', 200)
+        cancelled_id = self.enqueue('test_echo', 'never')
+        self.assertTrue(self.service.control_task(cancelled_id, 'cancel')['success'])
+        self.assertEqual(self.store.get(cancelled_id)['status'], 'cancelled')
+
+        worker = Worker(self.app, concurrency=2, poll_interval=0.05, drain_timeout=0.3)
+        worker.start()
+        task = self.wait_for(echo_id, ('completed',))
+        self.assertEqual(task['result'], {'text': 'xxx'})
+        self.wait_for(slow_id, ('running',))
+
+        # 退出：停止领取，超时后请求取消，已完成部分保留
+        worker.stop()
+        self.assertTrue(worker.drain())
+        task = self.store.get(slow_id)
+        self.assertEqual(task['status'], 'cancelled')
+        self.assertGreater(task['result']['done'], 0)
+        self.assertLess(task['result']['done'], 200)
+        self.assertEqual(self.calls, ['x'])
+
+
+if __name__ == '__main__':
+    unittest.main()
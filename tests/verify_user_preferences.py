@@ -0,0 +1,88 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from extensions import db
+from models.user import UserPreference
+from services.preference_service import PreferenceService
+from services.settings_service import SettingsService, SettingsStore
+
+
+class TestUserPreferences(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///:memory:', SECRET_KEY='test',
+                               USER_PREFERENCE_CACHE_TTL=60)
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+
+        self.preferences = PreferenceService()
+        self.preferences.cache.clear()
+
+        store = SettingsStore()
+        self.saved = (store.path, store.data, store.stat, store.subscribers)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        store.path = os.path.join(self.temp_dir.name, 'settings.json')
+        store.data = None
+        store.subscribers = {}
+        store.update(current_course='数据库原理')
+
+    def tearDown(self):
+        store = SettingsStore()
+        store.path, store.data, store.stat, store.subscribers = self.saved
+        self.temp_dir.cleanup()
+        self.preferences.cache.clear()
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_users_have_independent_courses(self):
+        settings = SettingsService()
+        settings.set_current_course('操作系统', username='alice')
+        settings.set_current_course('统计学', username='bob')
+
+        self.assertEqual(settings.get_current_course('alice'), '操作系统')
+        self.assertEqual(settings.get_current_course('bob'), '统计学')
+        self.assertEqual(settings.get_current_course('carol'), '数据库原理')
+        # 用户切换课程不改写全局默认课程
+        self.assertEqual(settings.get_default_course(), '数据库原理')
+
+    def test_cache_and_update(self):
+        self.preferences.set('alice', 'current_course', '操作系统')
+        self.preferences.set('alice', 'current_course', '统计学')
+        self.assertEqual(UserPreference.query.count(), 1)
+
+        # 直接修改数据库，缓存有效期内仍返回缓存值
+        UserPreference.query.first().value = '"编译原理"'
+        db.session.commit()
+        self.assertEqual(self.preferences.get('alice', 'current_course'), '统计学')
+        self.preferences.cache.clear()
+        self.assertEqual(self.preferences.get('alice', 'current_course'), '编译原理')
+
+        self.assertTrue(self.preferences.delete('alice', 'current_course'))
+        self.assertIsNone(self.preferences.get('alice', 'current_course'))
+
+    def test_anonymous_and_global_scope(self):
+        settings = SettingsService()
+        self.assertFalse(self.preferences.set('anonymous', 'current_course', '操作系统'))
+        with self.app.test_request_context():
+            from flask import session
+            session['username'] = 'anonymous'
+            result = settings.set_current_course('操作系统')
+            self.assertTrue(result['success'])
+            self.assertEqual(settings.get_current_course(), '操作系统')
+            self.assertEqual(UserPreference.query.count(), 0)
+
+        settings.set_current_course('编译原理', scope='global')
+        self.assertEqual(settings.get_current_course('anonymous'), '编译原理')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,324 @@
+"""
+课程包工具 - 单文件、带索引、可内存映射的课程内容归档
+
+文件布局:
+    [头部 32 字节][条目数据 ...][索引 JSON]
+
+头部: 魔数 b'CPK1' | 格式版本(uint16) | 保留(uint16) | 索引偏移(uint64) | 索引长度(uint64) | 保留(8字节)
+索引: {"manifest": {...}, "entries": {名称: [偏移, 长度, sha256]}}
+
+读取时通过 mmap 直接按偏移切片，无需解包到磁盘。
+"""
+import os
+import sys
+import json
+import glob
+import mmap
+import struct
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone
+from flask import current_app
+
+PACK_MAGIC = b'CPK1'
+PACK_FORMAT_VERSION = 1
+PACK_EXTENSION = '.cpk'
+PACKS_DIR = 'data/packs'
+
+_HEADER = struct.Struct('<4sHHQQ8x')
+
+# 包内条目命名约定
+KNOWLEDGE_ENTRY = 'knowledge.json'
+QUESTION_BANK_ENTRY = 'question_bank.json'
+EXPLANATION_PREFIX = 'explanations/'
+
+
+class CoursePackError(Exception):
+    """课程包格式或校验错误"""
+
+
+def _log(level, message):
+    """在应用上下文中写日志，否则打印（命令行使用时）"""
+    try:
+        getattr(current_app.logger, level)(message)
+    except RuntimeError:
+        print(message)
+
+
+class CoursePackWriter:
+    """课程包写入器，条目按顺序追加，关闭时写入索引和头部"""
+
+    def __init__(self, path, manifest=None):
+        self.path = path
+        self.manifest = dict(manifest or {})
+        self.entries = {}
+        self._temp_path = f"{path}.tmp"
+        self._file = open(self._temp_path, 'wb')
+        self._file.write(b'\0' * _HEADER.size)
+
+    def add(self, name, data):
+        """添加一个条目（bytes 或 str）"""
+        if name in self.entries:
+            raise CoursePackError(f"重复的条目: {name}")
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        offset = self._file.tell()
+        self._file.write(data)
+        self.entries[name] = [offset, len(data), hashlib.sha256(data).hexdigest()]
+
+    def add_json(self, name, obj):
+        """添加一个 JSON 条目"""
+        self.add(name, json.dumps(obj, ensure_ascii=False, indent=2))
+
+    def close(self):
+        """写入索引与头部，并原子替换目标文件"""
+        self.manifest.setdefault('format_version', PACK_FORMAT_VERSION)
+        self.manifest.setdefault('created_at', datetime.now(timezone.utc).isoformat())
+        self.manifest['entry_count'] = len(self.entries)
+
+        index = json.dumps({
+            'manifest': self.manifest,
+            'entries': self.entries
+        }, ensure_ascii=False).encode('utf-8')
+
+        index_offset = self._file.tell()
+        self._file.write(index)
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(PACK_MAGIC, PACK_FORMAT_VERSION, 0, index_offset, len(index)))
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+
+    def abort(self):
+        """放弃写入"""
+        try:
+            self._file.close()
+        finally:
+            if os.path.exists(self._temp_path):
+                os.remove(self._temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class CoursePack:
+    """课程包读取器，基于 mmap 按需读取条目"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise CoursePackError(f"课程包为空: {path}")
+
+        try:
+            magic, version, _, index_offset, index_length = _HEADER.unpack_from(self._mmap, 0)
+            if magic != PACK_MAGIC:
+                raise CoursePackError(f"不是有效的课程包: {path}")
+            if version > PACK_FORMAT_VERSION:
+                raise CoursePackError(f"不支持的课程包版本: {version}")
+            if index_offset + index_length > len(self._mmap):
+                raise CoursePackError(f"课程包索引越界: {path}")
+
+            index = json.loads(self._mmap[index_offset:index_offset + index_length].decode('utf-8'))
+        except (struct.error, UnicodeDecodeError, json.JSONDecodeError) as e:
+            self.close()
+            raise CoursePackError(f"课程包索引损坏: {e}")
+        except CoursePackError:
+            self.close()
+            raise
+
+        self.manifest = index.get('manifest', {})
+        self.entries = index.get('entries', {})
+
+    @property
+    def course_name(self):
+        return self.manifest.get('course_name')
+
+    def names(self, prefix=''):
+        """列出条目名称"""
+        return [name for name in self.entries if name.startswith(prefix)]
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def read(self, name):
+        """读取条目的原始字节，不存在时返回 None"""
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        offset, length, _ = entry
+        return self._mmap[offset:offset + length]
+
+    def read_text(self, name):
+        """读取文本条目"""
+        data = self.read(name)
+        return data.decode('utf-8') if data is not None else None
+
+    def read_json(self, name):
+        """读取 JSON 条目"""
+        text = self.read_text(name)
+        return json.loads(text) if text is not None else None
+
+    def verify(self):
+        """校验所有条目的 sha256，返回损坏的条目名称列表"""
+        corrupted = []
+        for name, (offset, length, digest) in self.entries.items():
+            if hashlib.sha256(self._mmap[offset:offset + length]).hexdigest() != digest:
+                corrupted.append(name)
+        return corrupted
+
+    def close(self):
+        try:
+            if getattr(self, '_mmap', None) is not None:
+                self._mmap.close()
+        finally:
+            self._mmap = None
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class CoursePackRegistry:
+    """已挂载课程包注册表（进程级单例），按需扫描 data/packs 目录（两次扫描至少间隔 SCAN_INTERVAL 秒）"""
+
+    SCAN_INTERVAL = 1.0  # 两次目录扫描的最小间隔（秒）
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(CoursePackRegistry, cls).__new__(cls)
+                cls._instance._initialized = False
+            return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.packs = {}  # {path: (mtime_ns, size, CoursePack)}
+        self._dir_signature = None
+        self._last_scan = 0.0
+        self._refresh_lock = threading.Lock()
+        self._initialized = True
+
+    def refresh(self, force=False):
+        """目录变化时重新挂载课程包"""
+        if not force and time.monotonic() - self._last_scan < self.SCAN_INTERVAL:
+            return
+
+        with self._refresh_lock:
+            if not force and time.monotonic() - self._last_scan < self.SCAN_INTERVAL:
+                return
+
+            paths = sorted(glob.glob(os.path.join(PACKS_DIR, f'*{PACK_EXTENSION}')))
+            signature = []
+            for path in paths:
+                try:
+                    stat = os.stat(path)
+                    signature.append((path, stat.st_mtime_ns, stat.st_size))
+                except OSError:
+                    continue
+            signature = tuple(signature)
+            self._last_scan = time.monotonic()
+
+            if not force and signature == self._dir_signature:
+                return
+
+            mounted = {}
+            for path, mtime_ns, size in signature:
+                existing = self.packs.get(path)
+                if existing and existing[0] == mtime_ns and existing[1] == size:
+                    mounted[path] = existing
+                    continue
+                try:
+                    mounted[path] = (mtime_ns, size, CoursePack(path))
+                except (OSError, CoursePackError) as e:
+                    _log('error', f"挂载课程包 {path} 失败: {e}")
+
+            # 旧的 mmap 可能仍被并发读取，交由垃圾回收关闭
+            self.packs = mounted
+            self._dir_signature = signature
+
+    def find(self, name):
+        """在所有已挂载课程包中查找条目"""
+        self.refresh()
+        for _, _, pack in self.packs.values():
+            data = pack.read(name)
+            if data is not None:
+                return data
+        return None
+
+    def get_pack(self, course_name):
+        """根据课程名获取已挂载的课程包"""
+        self.refresh()
+        for _, _, pack in self.packs.values():
+            if pack.course_name == course_name:
+                return pack
+        return None
+
+
+def pack_filename(course_name):
+    """生成课程包文件名"""
+    safe_name = course_name.replace(' ', '_').replace('/', '_').replace('\\', '_')
+    return f"course_{safe_name}{PACK_EXTENSION}"
+
+
+def _print_info(path):
+    with CoursePack(path) as pack:
+        print(json.dumps(pack.manifest, ensure_ascii=False, indent=2))
+        print(f"条目数: {len(pack.entries)}")
+        corrupted = pack.verify()
+        print("校验通过" if not corrupted else f"校验失败: {corrupted}")
+        return 0 if not corrupted else 1
+
+
+def main(argv=None):
+    """命令行入口: python -m utils.course_pack export|import|info ..."""
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if len(argv) < 2 or argv[0] not in ('export', 'import', 'info'):
+        print("用法:\n"
+              "  python -m utils.course_pack export <课程名称> [输出文件]\n"
+              "  python -m utils.course_pack import <课程包文件> [--overwrite]\n"
+              "  python -m utils.course_pack info <课程包文件>")
+        return 2
+
+    command = argv[0]
+    if command == 'info':
+        return _print_info(argv[1])
+
+    from app import create_app
+    from services.course_service import CourseService
+
+    app = create_app()
+    with app.app_context():
+        course_service = CourseService()
+        if command == 'export':
+            output = argv[2] if len(argv) > 2 else pack_filename(argv[1])
+            result = course_service.export_course_pack(argv[1], output)
+        else:
+            result = course_service.import_course_pack(argv[1], overwrite='--overwrite' in argv)
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0 if result.get('success') else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Markdown渲染工具 - 将AI讲解的Markdown在服务端渲染为安全的HTML
+
+所有文本先转义再生成标签，输出中只会出现本模块生成的标签；
+Mermaid代码块保留为 <div class="mermaid"> 占位，由客户端渲染图表。
+"""
+import re
+import html
+
+# 渲染规则变化时递增，旧版本的HTML缓存会被重新渲染
+RENDERER_VERSION = 2
+VERSION_MARKER = f'<!-- md-renderer:v{RENDERER_VERSION} -->'
+
+_THINK_RE = re.compile(r'<think>.*?</think>\s*', re.DOTALL | re.IGNORECASE)
+_FENCE_RE = re.compile(r'^(```+|~~~+)\s*([\w+#.-]*)\s*$')
+_HEADING_RE = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+_HR_RE = re.compile(r'^(\*\s*){3,}$|^(-\s*){3,}$|^(_\s*){3,}$')
+_LIST_RE = re.compile(r'^(\s*)([-*+]|\d+[.)])\s+(.*)$')
+_TABLE_SEPARATOR_RE = re.compile(r'^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$')
+_BLOCKQUOTE_RE = re.compile(r'^\s*>\s?(.*)$')
+
+_CODE_SPAN_RE = re.compile(r'(`+)(.+?)\1')
+_BOLD_RE = re.compile(r'\*\*(.+?)\*\*|__(.+?)__')
+_ITALIC_RE = re.compile(r'(?<![*\w])\*(?![\s*])(.+?)(?<![\s*])\*(?![*\w])')
+_STRIKE_RE = re.compile(r'~~(.+?)~~')
+_LINK_RE = re.compile(r'\[([^\]]+)\]\(((?:[^()\s]|\([^()\s]*\))+)\)')  # URL中允许一层成对括号
+_BR_RE = re.compile(r'&lt;br\s*/?&gt;', re.IGNORECASE)
+_SAFE_URL_RE = re.compile(r'^(https?://|mailto:|/|#)', re.IGNORECASE)
+
+
+def render_markdown(text):
+    """渲染Markdown为HTML（带渲染器版本标记）"""
+    if not text:
+        return VERSION_MARKER
+
+    # 推理模型输出的思考过程不展示给学生
+    text = _THINK_RE.sub('', text.replace('\r\n', '\n'))
+    return VERSION_MARKER + '\n' + _render_blocks(text.split('\n'))
+
+
+def is_current_render(rendered):
+    """判断HTML缓存是否由当前版本的渲染器生成"""
+    return bool(rendered) and rendered.startswith(VERSION_MARKER)
+
+
+def _render_blocks(lines):
+    output = []
+    i = 0
+    total = len(lines)
+
+    while i < total:
+        line = lines[i]
+        stripped = line.strip()
+
+        if not stripped:
+            i += 1
+            continue
+
+        # 代码块
+        fence = _FENCE_RE.match(stripped)
+        if fence:
+            marker, lang = fence.group(1), fence.group(2).lower()
+            code_lines = []
+            i += 1
+            while i < total and not lines[i].strip().startswith(marker):
+                code_lines.append(lines[i])
+                i += 1
+            i += 1  # 跳过结束标记
+            code = html.escape('\n'.join(code_lines).strip('\n'))
+            if lang == 'mermaid':
+                output.append(f'<div class="mermaid">{code}</div>')
+            elif lang:
+                output.append(f'<pre><code class="language-{html.escape(lang)}">{code}</code></pre>')
+            else:
+                output.append(f'<pre><code>{code}</code></pre>')
+            continue
+
+        # 标题
+        heading = _HEADING_RE.match(stripped)
+        if heading:
+            level = len(heading.group(1))
+            output.append(f'<h{level}>{_render_inline(heading.group(2))}</h{level}>')
+            i += 1
+            continue
+
+        # 分隔线
+        if _HR_RE.match(stripped):
+            output.append('<hr>')
+            i += 1
+            continue
+
+        # 表格
+        if '|' in stripped and i + 1 < total and _TABLE_SEPARATOR_RE.match(lines[i + 1]):
+            header = _split_table_row(stripped)
+            rows = []
+            i += 2
+            while i < total and lines[i].strip() and '|' in lines[i]:
+                rows.append(_split_table_row(lines[i].strip()))
+                i += 1
+            output.append(_render_table(header, rows))
+            continue
+
+        # 引用
+        if _BLOCKQUOTE_RE.match(line):
+            quote_lines = []
+            while i < total and lines[i].strip() and _BLOCKQUOTE_RE.match(lines[i]):
+                quote_lines.append(_BLOCKQUOTE_RE.match(lines[i]).group(1))
+                i += 1
+            output.append(f'<blockquote>{_render_blocks(quote_lines)}</blockquote>')
+            continue
+
+        # 列表
+        if _LIST_RE.match(line):
+            items = []
+            while i < total:
+                match = _LIST_RE.match(lines[i])
+                if match:
+                    indent = len(match.group(1).expandtabs(4))
+                    ordered = match.group(2)[0].isdigit()
+                    items.append([indent, ordered, match.group(3)])
+                    i += 1
+                elif lines[i].strip() and lines[i].startswith((' ', '\t')) and items:
+                    # 列表项的续行
+                    items[-1][2] += '\n' + lines[i].strip()
+                    i += 1
+                else:
+                    break
+            output.append(_render_list(items))
+            continue
+
+        # 段落
+        paragraph = []
+        while i < total and lines[i].strip() and not _starts_block(lines, i):
+            paragraph.append(lines[i].strip())
+            i += 1
+        if not paragraph:
+            # 无法识别为其他块的行，按段落处理，避免死循环
+            paragraph.append(stripped)
+            i += 1
+        output.append(f'<p>{"<br>".join(_render_inline(p) for p in paragraph)}</p>')
+
+    return '\n'.join(output)
+
+
+def _starts_block(lines, i):
+    """判断某行是否开始一个新的块级元素"""
+    line = lines[i]
+    stripped = line.strip()
+    if _FENCE_RE.match(stripped) or _HEADING_RE.match(stripped) or _HR_RE.match(stripped):
+        return True
+    if _LIST_RE.match(line) or _BLOCKQUOTE_RE.match(line):
+        return True
+    return '|' in stripped and i + 1 < len(lines) and bool(_TABLE_SEPARATOR_RE.match(lines[i + 1]))
+
+
+def _split_table_row(row):
+    row = row.strip()
+    if row.startswith('|'):
+        row = row[1:]
+    if row.endswith('|'):
+        row = row[:-1]
+    return [cell.strip() for cell in row.split('|')]
+
+
+def _render_table(header, rows):
+    parts = ['<table class="table table-bordered table-striped"><thead><tr>']
+    parts.extend(f'<th>{_render_inline(cell)}</th>' for cell in header)
+    parts.append('</tr></thead><tbody>')
+    for row in rows:
+        parts.append('<tr>')
+        parts.extend(f'<td>{_render_inline(cell)}</td>' for cell in row)
+        parts.append('</tr>')
+    parts.append('</tbody></table>')
+    return ''.join(parts)
+
+
+def _render_list(items):
+    """根据缩进渲染（可嵌套的）列表"""
+    parts = []
+    stack = []  # [(indent, tag)]
+
+    for indent, ordered, text in items:
+        tag = 'ol' if ordered else 'ul'
+        while stack and indent < stack[-1][0]:
+            parts.append(f'</li></{stack.pop()[1]}>')
+
+        if not stack or indent > stack[-1][0]:
+            parts.append(f'<{tag}>')
+            stack.append((indent, tag))
+        else:
+            parts.append('</li>')
+            if stack[-1][1] != tag:
+                parts.append(f'</{stack.pop()[1]}><{tag}>')
+                stack.append((indent, tag))
+
+        parts.append('<li>' + '<br>'.join(_render_inline(t) for t in text.split('\n')))
+
+    while stack:
+        parts.append(f'</li></{stack.pop()[1]}>')
+    return ''.join(parts)
+
+
+def _render_inline(text):
+    """渲染行内元素：先提取代码片段，再转义并处理强调与链接"""
+    code_spans = []
+
+    def stash_code(match):
+        code_spans.append(f'<code>{html.escape(match.group(2).strip())}</code>')
+        return f'\x00{len(code_spans) - 1}\x00'
+
+    # 占位符使用 \x00 包裹，先去掉文本中原有的 \x00，避免伪造占位符
+    text = _CODE_SPAN_RE.sub(stash_code, text.replace('\x00', ''))
+    text = html.escape(text)
+
+    text = _BR_RE.sub('<br>', text)
+    text = _BOLD_RE.sub(lambda m: f'<strong>{m.group(1) or m.group(2)}</strong>', text)
+    text = _ITALIC_RE.sub(r'<em>\1</em>', text)
+    text = _STRIKE_RE.sub(r'<del>\1</del>', text)
+    text = _LINK_RE.sub(_render_link, text)
+
+    return re.sub(r'\x00(\d+)\x00', lambda m: code_spans[int(m.group(1))], text)
+
+
+def _render_link(match):
+    label, url = match.group(1), match.group(2)
+    if not _SAFE_URL_RE.match(html.unescape(url)):
+        return label
+    return f'<a href="{url}" target="_blank" rel="noopener noreferrer">{label}</a>'
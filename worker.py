@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+后台任务 worker - 从任务存储（data/tasks.db）中领取入队的任务并执行
+
+Web 进程配置 TASK_EXECUTION_MODE=worker 后只负责入队和查询状态，批量讲解、课程生成、
+试卷生成与批改等 AI 任务都由本进程执行，不再占用 Web 进程的线程，也不会随 gunicorn 回收 worker 而中断。
+
+用法:
+    python -m worker [--concurrency N]
+
+收到 SIGTERM/SIGINT 后停止领取新任务，等待执行中的任务完成（最长 WORKER_DRAIN_TIMEOUT 秒，
+超时后请求取消，支持取消的任务会保留已完成的部分）；再次收到信号时立即退出。
+"""
+import os
+import sys
+import signal
+import time
+import argparse
+import threading
+from app import create_app
+from services.jobs import JOBS, get_job
+from services.task_service import TaskService
+
+CANCEL_GRACE = 30.0  # 请求取消后等待任务停止的时间（秒）
+
+
+class Worker:
+    """任务 worker：concurrency 个线程各自循环领取并执行任务"""
+
+    def __init__(self, app, concurrency=None, poll_interval=None, drain_timeout=None):
+        self.app = app
+        self.concurrency = concurrency or app.config.get('WORKER_CONCURRENCY', 2)
+        self.poll_interval = poll_interval or app.config.get('WORKER_POLL_INTERVAL', 1.0)
+        self.drain_timeout = drain_timeout if drain_timeout is not None else app.config.get('WORKER_DRAIN_TIMEOUT', 300)
+        self.service = TaskService()
+        self.stopping = threading.Event()
+        self.threads = []
+
+    def start(self):
+        for index in range(self.concurrency):
+            thread = threading.Thread(target=self._loop, name=f'task-worker-{index}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _loop(self):
+        while not self.stopping.is_set():
+            try:
+                task = self.service.store.claim(self.service.owner, kinds=list(JOBS))
+            except Exception as e:
+                print(f"领取任务出错: {e}")
+                task = None
+            if task is None:
+                self.stopping.wait(self.poll_interval)
+                continue
+            self.run_task(task)
+
+    def run_task(self, task):
+        """执行一个已领取的任务"""
+        payload = task.get('payload') or {}
+        with self.app.app_context():
+            try:
+                func = get_job(task['kind'])
+            except ValueError as e:
+                self.service.update_task(task['id'], status='failed', error=str(e), message=f'任务失败: {e}')
+                return
+            print(f"开始执行任务 {task['id']}（{task['kind']}）")
+            self.service.run(task['id'], func, payload.get('args', []), payload.get('kwargs', {}))
+            print(f"任务 {task['id']} 结束")
+
+    def stop(self):
+        """停止领取新任务"""
+        self.stopping.set()
+
+    def drain(self):
+        """等待执行中的任务完成；超时后请求取消并再等待 CANCEL_GRACE 秒，返回是否全部结束"""
+        if not self._join(self.drain_timeout):
+            running = list(self.service.active)
+            print(f"等待超时，请求取消 {len(running)} 个执行中的任务")
+            for task_id in running:
+                self.service.store.request_control(task_id, 'cancel')
+            return self._join(CANCEL_GRACE)
+        return True
+
+    def _join(self, timeout):
+        deadline = time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        return not any(thread.is_alive() for thread in self.threads)
+
+    def wait(self):
+        """阻塞到收到停止信号（主线程需保持可响应信号）"""
+        while not self.stopping.wait(1.0):
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='后台任务 worker')
+    parser.add_argument('--concurrency', type=int, default=None, help='同时执行的任务数（默认 WORKER_CONCURRENCY）')
+    parser.add_argument('--migrate-courses', action='store_true',
+                        help='启动前把工作目录下旧版本的 course_*.json 迁移到 data/courses')
+    args = parser.parse_args(argv)
+
+    app = create_app(os.environ.get('FLASK_CONFIG', 'default'))
+    if args.migrate_courses:
+        from models.course import migrate_legacy_course_files
+        with app.app_context():
+            print(f"已迁移 {migrate_legacy_course_files()} 个课程文件")
+    if app.config.get('KNOWLEDGE_WATCH_ENABLED', True):
+        from models.knowledge import KnowledgeBaseWatcher
+        KnowledgeBaseWatcher().ensure_started(app.config.get('KNOWLEDGE_WATCH_INTERVAL'))
+    if app.config.get('MODEL_CATALOG_ENABLED', True):
+        from services.model_catalog import ModelCatalog
+        ModelCatalog().ensure_started(app.config['OLLAMA_API_URL'], app.config.get('MODEL_CATALOG_INTERVAL'))
+
+    worker = Worker(app, concurrency=args.concurrency)
+
+    def handle_signal(signum, frame):
+        if worker.stopping.is_set():
+            print("再次收到退出信号，立即退出")
+            os._exit(1)
+        print("正在退出：停止领取新任务，等待执行中的任务完成...")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    print(f"任务 worker 已启动（{worker.service.owner}，并发 {worker.concurrency}），任务类型: {', '.join(sorted(JOBS))}")
+    worker.start()
+    worker.wait()
+    drained = worker.drain()
+    print("worker 已退出" if drained else "仍有任务未结束，强制退出")
+    return 0 if drained else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())